@@ -0,0 +1,152 @@
+"""
+Benchmark do filtro de bloqueios: loop original (iterrows por bloqueio) vs
+índice compilado + junção vetorizada (core.block_index).
+
+Uso:
+    python -m benchmarks.bench_block_filter [--slots 30000] [--blocks 400] [--repeat 3]
+
+Além do tempo, confere que as duas versões produzem exatamente a mesma máscara,
+inclusive para horários com segundos na borda dos bloqueios (08:59:59, 11:00:30) e
+partindo das colunas já calculadas pelos geradores (core.time_columns).
+"""
+import argparse
+import random
+import time as _time
+from datetime import date, time, timedelta
+
+import numpy as np
+import pandas as pd
+
+from core.block_index import compile_block_index, blocked_mask, slot_arrays
+from core.time_columns import adicionar_colunas_tempo
+
+
+# ---------------- versão original (referência) ----------------
+def legacy_mask(df_slots, df_blocks, unidade_id=None):
+    df_slots = df_slots.copy()
+    df_slots['_temp_date'] = pd.to_datetime(df_slots['data'], dayfirst=True, errors='coerce').dt.date
+    mask_nat = df_slots['_temp_date'].isna()
+    if mask_nat.any():
+        df_slots.loc[mask_nat, '_temp_date'] = pd.to_datetime(df_slots.loc[mask_nat, 'data'], errors='coerce').dt.date
+    df_slots['_temp_time'] = pd.to_datetime(df_slots['horario'], format="%H:%M:%S", errors='coerce').dt.time
+    df_slots['profissional_id'] = pd.to_numeric(df_slots['profissional_id'], errors='coerce').fillna(0).astype(int)
+
+    mask_exclude = pd.Series([False] * len(df_slots), index=df_slots.index)
+    target_unit = int(unidade_id) if unidade_id else None
+
+    for _, block in df_blocks.iterrows():
+        block_units = block.get('units')
+        should_apply_block = False
+        if target_unit is None:
+            should_apply_block = True
+        elif isinstance(block_units, list) and len(block_units) > 0:
+            clean_units = []
+            for u in block_units:
+                try: clean_units.append(int(u))
+                except: pass
+            if target_unit in clean_units or 0 in clean_units:
+                should_apply_block = True
+        else:
+            legacy_uid = block.get('unidade_id')
+            try:
+                legacy_uid = int(legacy_uid) if legacy_uid is not None else 0
+            except:
+                legacy_uid = 0
+            if legacy_uid == 0 or legacy_uid == target_unit:
+                should_apply_block = True
+
+        if not should_apply_block:
+            continue
+
+        m_date = (df_slots['_temp_date'] >= block['date_start']) & (df_slots['_temp_date'] <= block['date_end'])
+        if not m_date.any(): continue
+
+        blk_start = block['time_start'] if pd.notnull(block.get('time_start')) else time(0, 0)
+        blk_end = block['time_end'] if pd.notnull(block.get('time_end')) else time(23, 59, 59)
+        m_time = (df_slots['_temp_time'] >= blk_start) & (df_slots['_temp_time'] <= blk_end)
+
+        blk_prof = int(block['professional_id']) if pd.notnull(block.get('professional_id')) else 0
+        m_prof = (df_slots['profissional_id'] == blk_prof) if blk_prof > 0 else True
+
+        mask_exclude = mask_exclude | (m_date & m_time & m_prof)
+
+    return mask_exclude.to_numpy()
+
+
+def vectorized_mask(df_slots, df_blocks, unidade_id=None):
+    index = compile_block_index(df_blocks, unidade_id=unidade_id)
+    dias, segundos, profs = slot_arrays(df_slots)
+    return blocked_mask(index, dias, segundos, profs)
+
+
+# ---------------- dados sintéticos ----------------
+def _horario_slot(rnd):
+    # ~10% com segundos, vários na borda de um bloqueio (hh:59:59, hh:00:xx)
+    if rnd.random() < 0.1:
+        return f"{rnd.randrange(7, 20):02d}:{rnd.choice([0, 59]):02d}:{rnd.choice([1, 29, 30, 31, 59]):02d}"
+    return f"{rnd.randrange(7, 20):02d}:{rnd.choice([0, 15, 30, 45]):02d}:00"
+
+
+def make_data(n_slots, n_blocks, n_profs=150, n_days=30, seed=42):
+    rnd = random.Random(seed)
+    base = date(2025, 12, 1)
+
+    slots = pd.DataFrame({
+        'data': [(base + timedelta(days=rnd.randrange(n_days))).strftime("%d-%m-%Y") for _ in range(n_slots)],
+        'horario': [_horario_slot(rnd) for _ in range(n_slots)],
+        'profissional_id': [rnd.randrange(1, n_profs + 1) for _ in range(n_slots)],
+    })
+
+    blocks = []
+    for i in range(n_blocks):
+        d0 = base + timedelta(days=rnd.randrange(n_days))
+        d1 = d0 + timedelta(days=rnd.choice([0, 0, 1, 6, 14]))
+        h0 = rnd.randrange(7, 18)
+        com_horario = rnd.random() < 0.7
+        blocks.append({
+            'id': i,
+            'professional_id': rnd.randrange(1, n_profs + 1) if rnd.random() < 0.98 else 0,
+            'date_start': d0,
+            'date_end': d1,
+            'time_start': time(h0, 0) if com_horario else None,
+            'time_end': time(min(h0 + rnd.randrange(1, 4), 23), 0, rnd.choice([0, 0, 30])) if com_horario else None,
+            'units': rnd.choice([[], ["12"], [12, 3], [0], ["3"]]),
+        })
+    return slots, pd.DataFrame(blocks)
+
+
+def _best_of(fn, repeat):
+    melhor = float("inf")
+    for _ in range(repeat):
+        t0 = _time.perf_counter()
+        out = fn()
+        melhor = min(melhor, _time.perf_counter() - t0)
+    return melhor, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=30000)
+    parser.add_argument("--blocks", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df_slots, df_blocks = make_data(args.slots, args.blocks)
+    df_int = adicionar_colunas_tempo(df_slots)  # como chega dos geradores
+
+    for unidade in (None, 12):
+        t_old, m_old = _best_of(lambda: legacy_mask(df_slots, df_blocks, unidade), args.repeat)
+        t_new, m_new = _best_of(lambda: vectorized_mask(df_slots, df_blocks, unidade), args.repeat)
+        m_int = vectorized_mask(df_int, df_blocks, unidade)
+        iguais = np.array_equal(m_old, m_new) and np.array_equal(m_old, m_int)
+        print(
+            f"unidade={unidade!s:>4} slots={args.slots} blocos={args.blocks} "
+            f"bloqueados={int(m_new.sum())} | original={t_old*1000:.1f} ms "
+            f"vetorizado={t_new*1000:.1f} ms speedup={t_old / t_new:.1f}x | mesma máscara: {iguais}"
+        )
+        if not iguais:
+            raise SystemExit("ERRO: as máscaras divergem")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark de build_matrices: versão original (groupby + iterrows + strings
+"||SEP||"/"||ITEM||" re-parseadas por format_cell no template) vs células
+estruturadas (CellEntry) montadas com groupby/unstack (core.utils).
+
+Uso:
+    python -m benchmarks.bench_build_matrices [--slots 20000] [--salas 40] [--repeat 3]
+
+Além do tempo (matrizes e matrizes + HTML), confere que o HTML do mapa semanal
+sai byte a byte igual nas duas versões. Rodar a partir da raiz do projeto (templates/).
+"""
+import argparse
+import random
+import re
+import time as _time
+from datetime import date, timedelta
+
+import pandas as pd
+
+from core.utils import build_matrices, fmt_time, periodo_from_time, render_html_from_template, sort_natural, to_time
+
+
+# ---------------- versão original (referência) ----------------
+def legacy_build_matrices(df, include_taxa=True):
+    df = df.copy()
+    df["data"] = pd.to_datetime(df["data"]).dt.date
+    df["time"] = df["horario"].apply(to_time)
+    df["periodo"] = df["time"].apply(periodo_from_time)
+
+    day_names = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado"]
+    df["dia_pt"] = df["data"].apply(lambda d: day_names[d.weekday()] if d.weekday() < 6 else "")
+
+    def montar_matriz(subdf, salas):
+        if not salas: return None
+        mat = pd.DataFrame("", index=salas, columns=day_names)
+        group_cols = ["sala", "dia_pt", "especialidade", "nome_profissional"]
+        subdf_grouped = (
+            subdf.groupby(group_cols)
+                 .agg(start=("time", "min"), end=("time", "max"),
+                      real_appts=("agendamento_id", lambda x: (x > 0).sum()),
+                      total_slots=("horario", "count"))
+                 .reset_index()
+        )
+        for _, r in subdf_grouped.iterrows():
+            horario_str = f"{fmt_time(r['start'])}-{fmt_time(r['end'])}"
+            if include_taxa:
+                taxa_val = (r["real_appts"] / r["total_slots"] * 100) if r["total_slots"] > 0 else 0
+                low_flag = "||LOW||" if taxa_val < 50 else ""
+                item = f"{r['especialidade']}||SEP||{r['nome_profissional']}||SEP||{horario_str}||SEP||{taxa_val:.0f}{low_flag}"
+            else:
+                item = f"{r['especialidade']}||SEP||{r['nome_profissional']}||SEP||{horario_str}"
+            prev = mat.at[r["sala"], r["dia_pt"]]
+            mat.at[r["sala"], r["dia_pt"]] = (prev + "||ITEM||" + item) if prev else item
+        return mat
+
+    matrices = {
+        "Manhã": montar_matriz(df[df["periodo"] == "Manhã"], sort_natural(df[df["periodo"] == "Manhã"]["sala"].unique())),
+        "Tarde": montar_matriz(df[df["periodo"] == "Tarde"], sort_natural(df[df["periodo"] == "Tarde"]["sala"].unique()))
+    }
+    occupancy = {"Manhã": [], "Tarde": []}
+    for periodo, m in matrices.items():
+        if m is None:
+            occupancy[periodo] = [0]*6
+            continue
+        for dia in day_names:
+            filled = m[dia].apply(lambda v: isinstance(v, str) and v.strip() != "").sum()
+            occupancy[periodo].append(int(round((filled / len(m.index)) * 100)) if len(m.index) else 0)
+    return matrices, occupancy, day_names
+
+
+# ---------------- dados sintéticos ----------------
+def make_data(n_slots, n_salas, n_profs=120, seed=42):
+    rnd = random.Random(seed)
+    base = date(2025, 12, 1)
+    profs = [(f"Dr(a). Profissional {i}", f"Especialidade {i % 17}") for i in range(n_profs)]
+    linhas = []
+    for _ in range(n_slots):
+        nome, esp = rnd.choice(profs)
+        linhas.append({
+            "data": (base + timedelta(days=rnd.randrange(6))).strftime("%Y-%m-%d"),
+            "horario": f"{rnd.randrange(7, 20):02d}:{rnd.choice([0, 15, 30, 45]):02d}:00",
+            "sala": f"CONSULTÓRIO {rnd.randrange(1, n_salas + 1)}",
+            "especialidade": esp,
+            "nome_profissional": nome,
+            "agendamento_id": rnd.choice([0, 0, rnd.randrange(1, 10**6)]),
+        })
+    return pd.DataFrame(linhas)
+
+
+def _best_of(fn, repeat):
+    melhor = float("inf")
+    for _ in range(repeat):
+        t0 = _time.perf_counter()
+        out = fn()
+        melhor = min(melhor, _time.perf_counter() - t0)
+    return melhor, out
+
+
+def _html(resultado):
+    matrices, occ, days = resultado
+    html = render_html_from_template("UNIDADE", matrices, occ, days, "01-12-2025", "07-12-2025",
+                                     "templates/semanal2.html", cell_font_size_px=9)
+    return re.sub(r"\d{2}/\d{2}/\d{4} \d{2}:\d{2}", "", html)  # carimbo "Gerado:"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=20000)
+    parser.add_argument("--salas", type=int, default=40)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_data(args.slots, args.salas)
+
+    for include_taxa in (False, True):
+        t_old, _ = _best_of(lambda: legacy_build_matrices(df, include_taxa), args.repeat)
+        t_new, _ = _best_of(lambda: build_matrices(df, include_taxa), args.repeat)
+        print(f"matrizes include_taxa={include_taxa!s:5} slots={args.slots} | original={t_old*1000:.1f} ms "
+              f"estruturado={t_new*1000:.1f} ms speedup={t_old / t_new:.1f}x")
+
+    t_old, h_old = _best_of(lambda: _html(legacy_build_matrices(df, False)), args.repeat)
+    t_new, h_new = _best_of(lambda: _html(build_matrices(df, False)), args.repeat)
+    iguais = h_old == h_new
+    print(f"matrizes + HTML semanal        | original={t_old*1000:.1f} ms estruturado={t_new*1000:.1f} ms "
+          f"speedup={t_old / t_new:.1f}x | HTML idêntico: {iguais}")
+    if not iguais:
+        raise SystemExit("ERRO: o HTML diverge")
+
+
+if __name__ == "__main__":
+    main()
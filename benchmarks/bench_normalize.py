@@ -0,0 +1,210 @@
+"""
+Benchmark de normalize_and_validate: versão original (parse_time_cell por linha,
+dois casts de texto, duas cópias e amostras to_dict a cada chamada) vs parse
+vetorizado em inteiros + texto normalizado por valor distinto (core.normalize_df).
+
+Uso:
+    python -m benchmarks.bench_normalize [--linhas 30000] [--repeat 3]
+
+Além do tempo, confere que as duas versões devolvem o mesmo DataFrame limpo
+(exceto as colunas novas 'dia_ord'/'segundo'/'minuto'), inclusive para horários
+com segundos ('08:15:30', '2025-12-01T13:15:45').
+"""
+import argparse
+import random
+import re
+import time as _time
+from datetime import datetime
+
+import pandas as pd
+
+from core.normalize_df import normalize_and_validate
+from core.time_columns import adicionar_colunas_tempo
+
+
+# ---------------- versão original (referência) ----------------
+def legacy_normalize(df):
+    df = df.copy()
+    diag = {}
+
+    # Trim strings e normalizar colunas de texto
+    text_cols = ['nome_profissional', 'nome_fantasia', 'especialidade', 'sala']
+    for c in text_cols:
+        if c in df.columns:
+            df[c] = df[c].astype(str).fillna('').str.strip()
+            # optionally uppercase
+            # df[c] = df[c].str.upper()
+
+    # agendamento_id -> inteiro quando possível
+    if 'agendamento_id' in df.columns:
+        before = df['agendamento_id'].dtype
+        df['agendamento_id'] = pd.to_numeric(df['agendamento_id'], errors='coerce').astype('Int64')
+        diag['agendamento_id_before_dtype'] = str(before)
+        diag['agendamento_id_nulls'] = int(df['agendamento_id'].isna().sum())
+    else:
+        diag['agendamento_id_present'] = False
+
+    # DATA: tentar parse com dayfirst True (DD-MM-YYYY)
+    if 'data' in df.columns:
+        before = df['data'].dtype
+        # Primeira tentativa: formato dd-mm-YYYY
+        df['data_parsed'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
+        # Segunda tentativa: ISO fallback
+        mask_na = df['data_parsed'].isna()
+        if mask_na.any():
+            df.loc[mask_na, 'data_parsed'] = pd.to_datetime(df.loc[mask_na, 'data'], errors='coerce')
+        # Extrair só a data
+        df['data'] = df['data_parsed'].dt.date
+        diag['data_before_dtype'] = str(before)
+        diag['data_parse_nulls'] = int(df['data_parsed'].isna().sum())
+        df.drop(columns=['data_parsed'], inplace=True)
+    else:
+        diag['data_present'] = False
+
+    # HORARIO: tentar extrair horário - exemplos aceitos: '08:00', '08:00:00', '2025-12-01T08:00:00', '08h00'
+    def parse_time_cell(x):
+        if pd.isna(x):
+            return None
+        if isinstance(x, datetime):
+            return x.time()
+        s = str(x).strip()
+        if s == '':
+            return None
+        # caso seja 'HH:MM' ou 'HH:MM:SS'
+        try:
+            return datetime.strptime(s, "%H:%M:%S").time()
+        except:
+            try:
+                return datetime.strptime(s, "%H:%M").time()
+            except:
+                pass
+        # extrair padrão com regex HH:MM possivelmente dentro de datetime string
+        m = re.search(r"(\d{1,2}:\d{2}(?::\d{2})?)", s)
+        if m:
+            tstr = m.group(1)
+            try:
+                return datetime.strptime(tstr, "%H:%M:%S").time()
+            except:
+                try:
+                    return datetime.strptime(tstr, "%H:%M").time()
+                except:
+                    return None
+        # capturar formatos com 'h' como 08h30
+        m2 = re.search(r"(\d{1,2})\s*h\s*(\d{2})", s)
+        if m2:
+            try:
+                hh = int(m2.group(1)); mm = int(m2.group(2))
+                return datetime.strptime(f"{hh:02d}:{mm:02d}", "%H:%M").time()
+            except:
+                return None
+        return None
+
+    if 'horario' in df.columns:
+        df['horario_parsed'] = df['horario'].apply(parse_time_cell)
+        diag['horario_nulls'] = int(df['horario_parsed'].isna().sum())
+        df['horario'] = df['horario_parsed']
+        df.drop(columns=['horario_parsed'], inplace=True)
+    else:
+        diag['horario_present'] = False
+
+    # Padronizar 'nome_fantasia' (unidade) removendo espaços duplos
+    if 'nome_fantasia' in df.columns:
+        df['nome_fantasia'] = df['nome_fantasia'].replace('', pd.NA).astype('string')
+        df['nome_fantasia'] = df['nome_fantasia'].str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    # Remover linhas sem data/hora/agendamento_id - mas primeiro reportar quantos
+    missing_date = df['data'].isna().sum() if 'data' in df.columns else None
+    missing_time = df['horario'].isna().sum() if 'horario' in df.columns else None
+    missing_id = df['agendamento_id'].isna().sum() if 'agendamento_id' in df.columns else None
+    diag['missing_date_count'] = int(missing_date) if missing_date is not None else None
+    diag['missing_time_count'] = int(missing_time) if missing_time is not None else None
+    diag['missing_id_count'] = int(missing_id) if missing_id is not None else None
+
+    # Opcional: remover rows completamente sem data ou id (comente se preferir inspecionar)
+    df_clean = df.copy()
+    # manter linhas com data e agendamento_id
+    if 'data' in df_clean.columns and 'agendamento_id' in df_clean.columns:
+        df_clean = df_clean[df_clean['data'].notna() & df_clean['agendamento_id'].notna()]
+    elif 'data' in df_clean.columns:
+        df_clean = df_clean[df_clean['data'].notna()]
+
+    # Garantir colunas de texto existam e sejam string
+    for c in ['nome_profissional','especialidade','sala','nome_fantasia']:
+        if c in df_clean.columns:
+            df_clean[c] = df_clean[c].astype(str).fillna('').str.strip()
+
+    diag['rows_before'] = int(len(df))
+    diag['rows_after'] = int(len(df_clean))
+
+    # mostrar amostras de linhas problemáticas (até 10)
+    problems = {}
+    if missing_date and missing_date > 0:
+        problems['sample_missing_date'] = df[df['data'].isna()].head(10).to_dict(orient='records')
+    if missing_time and missing_time > 0:
+        problems['sample_missing_time'] = df[df['horario'].isna()].head(10).to_dict(orient='records')
+    if missing_id and missing_id > 0:
+        problems['sample_missing_id'] = df[df['agendamento_id'].isna()].head(10).to_dict(orient='records')
+
+    diag['sample_problems'] = problems
+    return df_clean, diag
+
+
+# ---------------- dados sintéticos ----------------
+def make_data(n, seed=42):
+    rnd = random.Random(seed)
+    horarios = ["08:00:00", "08:30", "2025-12-01T13:15:00", "14h45", "", None, "25:00",
+                "08:15:30", "2025-12-01T13:15:45", "23:59:59"]
+    datas = ["01-12-2025", "2025-12-02", "03-12-2025", None, "xx"]
+    fantasias = ["UNIDADE  CENTRO", " UNIDADE NORTE ", "", None]
+    linhas = []
+    for _ in range(n):
+        linhas.append({
+            "data": rnd.choice(datas) if rnd.random() < 0.05 else f"{rnd.randrange(1, 29):02d}-12-2025",
+            "horario": rnd.choice(horarios) if rnd.random() < 0.05 else f"{rnd.randrange(7, 20):02d}:{rnd.choice([0, 15, 30, 45]):02d}:00",
+            "sala": f" CONSULTÓRIO {rnd.randrange(1, 40)} ",
+            "especialidade": rnd.choice(["CARDIOLOGIA", "PEDIATRIA ", None]),
+            "nome_profissional": f"Dr(a). Profissional {rnd.randrange(120)}",
+            "nome_fantasia": rnd.choice(fantasias),
+            "agendamento_id": rnd.choice([0, None, "abc", rnd.randrange(1, 10**6)]),
+        })
+    return pd.DataFrame(linhas)
+
+
+def _best_of(fn, repeat):
+    melhor = float("inf")
+    for _ in range(repeat):
+        t0 = _time.perf_counter()
+        out = fn()
+        melhor = min(melhor, _time.perf_counter() - t0)
+    return melhor, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=30000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_data(args.linhas)
+    df_int = adicionar_colunas_tempo(df)  # como chega dos geradores (parse já feito após a união)
+
+    t_old, (ref, _) = _best_of(lambda: legacy_normalize(df), args.repeat)
+    t_new, (novo, _) = _best_of(lambda: normalize_and_validate(df), args.repeat)
+    t_int, (novo_int, _) = _best_of(lambda: normalize_and_validate(df_int), args.repeat)
+    t_diag, _ = _best_of(lambda: normalize_and_validate(df_int, diagnostics=True), args.repeat)
+    t_renorm, (renorm, _) = _best_of(lambda: normalize_and_validate(novo_int), args.repeat)  # já tipado
+    print(f"linhas={args.linhas} | original={t_old*1000:.1f} ms vetorizado={t_new*1000:.1f} ms "
+          f"(speedup={t_old / t_new:.1f}x) | com dia_ord/minuto={t_int*1000:.1f} ms "
+          f"(speedup={t_old / t_int:.1f}x) | diagnostics=True={t_diag*1000:.1f} ms "
+          f"| já normalizado={t_renorm*1000:.1f} ms")
+
+    for nome, out in (("vetorizado", novo), ("com dia_ord/minuto", novo_int), ("já normalizado", renorm)):
+        try:
+            pd.testing.assert_frame_equal(ref, out.drop(columns=["dia_ord", "segundo", "minuto"]), check_dtype=False)
+        except AssertionError as e:
+            raise SystemExit(f"ERRO: {nome} diverge do original\n{e}")
+    print("Resultado idêntico ao original: True")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Orçamento de import: importar os módulos do core não pode fazer nenhuma
+requisição HTTP (nem abrir socket), e o tempo de import é reportado.
+
+Uso:
+    python -m benchmarks.check_import_budget [--modulo core.map_generator] [--max-segundos 10]
+
+Sai com código 1 se houver qualquer tentativa de rede durante o import
+ou se o tempo passar do limite. Cada módulo é importado em um interpretador novo.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+_SONDA = r"""
+import json, socket, sys, time
+import requests
+
+tentativas = []
+
+def _bloquear(nome):
+    def _f(*args, **kwargs):
+        tentativas.append(nome)
+        raise OSError(f"rede bloqueada durante o import ({nome})")
+    return _f
+
+socket.socket.connect = _bloquear("socket.connect")
+socket.create_connection = _bloquear("socket.create_connection")
+requests.Session.request = _bloquear("requests.Session.request")
+
+t0 = time.perf_counter()
+erro = None
+try:
+    __import__(sys.argv[1])
+except Exception as e:
+    erro = f"{type(e).__name__}: {e}"
+print(json.dumps({"segundos": time.perf_counter() - t0, "rede": tentativas, "erro": erro}))
+"""
+
+MODULOS_PADRAO = ["core.api_client", "core.map_generator", "core.gerar_mapas_wrapper", "core.cli"]
+
+
+def medir(modulo):
+    proc = subprocess.run(
+        [sys.executable, "-c", _SONDA, modulo],
+        capture_output=True, text=True,
+    )
+    linhas = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+    if not linhas:
+        return {"segundos": None, "rede": [], "erro": proc.stderr.strip()[-500:] or "sem saída"}
+    return json.loads(linhas[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulo", action="append", help="Módulo a importar (pode repetir)")
+    parser.add_argument("--max-segundos", type=float, default=10.0)
+    args = parser.parse_args()
+
+    falhou = False
+    for modulo in args.modulo or MODULOS_PADRAO:
+        r = medir(modulo)
+        ok = not r["rede"] and not r["erro"] and r["segundos"] is not None and r["segundos"] <= args.max_segundos
+        tempo = f"{r['segundos']:.2f} s" if r["segundos"] is not None else "-"
+        print(f"{'OK ' if ok else 'ERRO'} {modulo}: import em {tempo} | chamadas de rede: {len(r['rede'])}"
+              + (f" | {r['erro']}" if r["erro"] else ""))
+        falhou |= not ok
+
+    if falhou:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Checagem do elenco da varredura de ociosos (core.roster): um profissional sem nenhum
+agendamento, com grade só às terças, tem que aparecer no mapa diário de terça gerado
+logo depois do mapa de segunda — a varredura completa da segunda aprende o elenco pela
+semana inteira, não só pelo dia do mapa.
+
+Uso:
+    python -m benchmarks.check_roster_sweep
+
+Roda contra o benchmarks.feegow_standin numa thread (semana que vem, então com vagas
+futuras), com caches em pasta temporária. Sai com código 1 se o profissional faltar.
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parent.parent
+PROFISSIONAL_TERCA = 9999
+
+
+def _dados_com_ocioso_de_terca():
+    from benchmarks.feegow_standin import DadosSinteticos
+
+    dados = DadosSinteticos(unidades=1, profissionais=12, salas=4, dias=42, densidade_bloqueios=0)
+    unidade = next(iter(dados.unidades))
+    sala = next(s["id"] for s in dados.salas if s["unidade_id"] == unidade and s["id"] % 1000 != 900)
+    prof = {
+        "profissional_id": PROFISSIONAL_TERCA,
+        "nome": "PROFISSIONAL SÓ DE TERÇA",
+        "tratamento": "Dra.",
+        "especialidades": [{"especialidade_id": 1, "nome_especialidade": "ESPECIALIDADE 01"}],
+    }
+    dados.profissionais.append(prof)
+    dados._prof_por_id[PROFISSIONAL_TERCA] = prof
+    dados.grade[PROFISSIONAL_TERCA] = {1: list(range(8 * 60, 12 * 60, 30))}  # só terça
+    dados.lotacao[PROFISSIONAL_TERCA] = (unidade, sala)
+    return dados, dados.unidades[unidade]
+
+
+def main():
+    from benchmarks.feegow_standin import iniciar
+
+    dados, unidade = _dados_com_ocioso_de_terca()
+    hoje = date.today()
+    segunda = hoje + timedelta(days=7 - hoje.weekday())  # semana que vem: todas as vagas são futuras
+    terca = segunda + timedelta(days=1)
+
+    servidor = iniciar(dados)
+    try:
+        with tempfile.TemporaryDirectory(prefix="feegow_roster_") as tmp:
+            os.environ.update(
+                FEEGOW_BASE_URL=servidor.url, FEEGOW_ACCESS_TOKEN="benchmark",
+                FEEGOW_CACHE_PATH=f"{tmp}/cache.sqlite", FEEGOW_SNAPSHOT_PATH=f"{tmp}/snapshots.sqlite",
+                FEEGOW_PDF_CACHE_PATH=f"{tmp}/pdf", FEEGOW_METRICS_PATH="", FEEGOW_PROFILE_DIR=f"{tmp}/profiles",
+            )
+            os.chdir(RAIZ)  # templates com caminho relativo
+            from core import map_generator
+
+            # Os profissionais que chegam à normalização são os que vão para o mapa
+            vistos = {}
+            normalizar = map_generator.normalize_and_validate
+
+            def normalizar_e_registrar(df, *args, **kwargs):
+                vistos[dia_atual] = set(df["profissional_id"].astype(int))
+                return normalizar(df, *args, **kwargs)
+
+            map_generator.normalize_and_validate = normalizar_e_registrar
+            for dia_atual in (segunda, terca):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    resultado = map_generator.generate_daily_maps(
+                        dia_atual.strftime("%d-%m-%Y"), unidade_id=unidade, output_dir=f"{tmp}/out")
+                print(f"{dia_atual:%d-%m-%Y}: ociosos sondados={resultado.metricas.get('ociosos_sondados')} "
+                      f"fora do elenco={resultado.metricas.get('ociosos_fora_do_elenco')}")
+    finally:
+        servidor.parar()
+
+    if PROFISSIONAL_TERCA not in vistos.get(terca, set()):
+        print(f"FALHOU: o profissional só de terça ({PROFISSIONAL_TERCA}) ficou fora do mapa de {terca:%d-%m-%Y}")
+        return 1
+    print(f"OK: o profissional só de terça está no mapa de {terca:%d-%m-%Y}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
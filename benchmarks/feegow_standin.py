@@ -0,0 +1,428 @@
+"""
+Servidor HTTP local que imita a API Feegow, com dados sintéticos reprodutíveis.
+
+Serve os endpoints que o core.api_client consome, com os mesmos formatos de JSON:
+    appoints/search, appoints/available-schedule, lock/list, professional/list,
+    specialties/list, company/list-local, patient/search
+Os dados saem de um gerador com semente, parametrizado por unidades, profissionais,
+salas, dias e densidade de bloqueios; latência e respostas 429 (com Retry-After)
+podem ser injetadas para exercitar o limitador.
+
+Uso:
+    python -m benchmarks.feegow_standin --unidades 4 --profissionais 120 --dias 56 --porta 8765 \\
+        --latencia-ms 80 --jitter-ms 40 --taxa-429 0.02
+    FEEGOW_BASE_URL=http://127.0.0.1:8765 FEEGOW_ACCESS_TOKEN=x python -m core.cli maps --week 08-12-2025
+
+Em código (benchmarks): iniciar(DadosSinteticos(...)) devolve o servidor já rodando
+numa thread, com .url, .stats() e .parar().
+"""
+import argparse
+import json
+import random
+import threading
+import time as _time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Status de agendamento e pesos (1/7/2/3/4 entram nos mapas; 6/11 = desmarcado/cancelado)
+_STATUS = (1, 7, 2, 3, 4, 6, 11)
+_PESOS_STATUS = (30, 25, 15, 10, 5, 10, 5)
+_TURNOS = {"manha": (8 * 60, 12 * 60), "tarde": (13 * 60, 18 * 60)}
+
+
+def _hhmmss(minuto):
+    return f"{minuto // 60:02d}:{minuto % 60:02d}:00"
+
+
+def _data(texto):
+    """'DD-MM-AAAA' ou 'AAAA-MM-DD' → date (None se vazio/inválido)."""
+    for formato in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(texto).strip(), formato).date()
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _int(valor, padrao=0):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return padrao
+
+
+# ==========================================================
+# DADOS SINTÉTICOS
+# ==========================================================
+class DadosSinteticos:
+    """
+    Empresa fictícia: `unidades` unidades com `salas` consultórios cada (mais um laboratório),
+    `profissionais` com grade semanal fixa (turno, duração da consulta, dias) numa sala da
+    unidade, e `dias` dias de agendamentos a partir de `inicio` (padrão: segunda-feira de
+    4 semanas atrás). `ocupacao` é a fração dos horários da grade com agendamento e
+    `densidade_bloqueios` a chance de um dia de um profissional ter bloqueio.
+    """
+
+    def __init__(self, unidades=2, profissionais=30, salas=8, dias=56, densidade_bloqueios=0.03,
+                 ocupacao=0.6, especialidades=12, inicio=None, semente=42):
+        self.semente = semente
+        rnd = random.Random(semente)
+        if inicio is None:
+            hoje = date.today()
+            inicio = hoje - timedelta(days=hoje.weekday() + 28)
+        self.inicio = inicio
+        self.fim = inicio + timedelta(days=max(1, dias) - 1)
+
+        # ---------------- dimensões ----------------
+        self.unidades = {10 + u: f"UNIDADE {u + 1:02d}" for u in range(unidades)}
+        self.salas = []
+        for uid in self.unidades:
+            for k in range(1, salas + 1):
+                self.salas.append({"id": uid * 1000 + k, "local": f"CONSULTÓRIO {k}", "unidade_id": uid})
+            self.salas.append({"id": uid * 1000 + 900, "local": "LABORATÓRIO", "unidade_id": uid})
+        self.especialidades = [{"especialidade_id": s, "nome": f"ESPECIALIDADE {s:02d}"}
+                               for s in range(1, especialidades + 1)]
+
+        salas_por_unidade = {uid: [s["id"] for s in self.salas if s["unidade_id"] == uid and s["id"] % 1000 != 900]
+                             for uid in self.unidades}
+        self.profissionais = []
+        self.grade = {}  # profissional → {weekday: [minutos]}
+        self.lotacao = {}  # profissional → (unidade, sala)
+        for i in range(profissionais):
+            pid = 1000 + i
+            uid = rnd.choice(list(self.unidades))
+            specs = rnd.sample(range(1, especialidades + 1), k=min(especialidades, rnd.choice((1, 1, 2))))
+            self.profissionais.append({
+                "profissional_id": pid,
+                "nome": f"PROFISSIONAL {i + 1:04d}",
+                "tratamento": rnd.choice(("Dr.", "Dra.")),
+                "especialidades": [{"especialidade_id": s, "nome_especialidade": f"ESPECIALIDADE {s:02d}"} for s in specs],
+            })
+            self.lotacao[pid] = (uid, rnd.choice(salas_por_unidade[uid]))
+            ini, fim = _TURNOS[rnd.choice(list(_TURNOS))]
+            passo = rnd.choice((15, 20, 30))
+            horarios = list(range(ini, fim, passo))
+            dias_semana = sorted(rnd.sample(range(6), k=rnd.randint(2, 5)))
+            self.grade[pid] = {d: horarios for d in dias_semana}
+
+        # ---------------- agendamentos e bloqueios ----------------
+        self.agendamentos_por_dia = {}
+        self.ocupados = {}  # (profissional, date) → {minuto}
+        self.bloqueios = []
+        self.pacientes = {}
+        agendamento_id = 1
+        dia = self.inicio
+        while dia <= self.fim:
+            do_dia = []
+            for prof in self.profissionais:
+                pid = prof["profissional_id"]
+                horarios = self.grade[pid].get(dia.weekday())
+                if not horarios:
+                    continue
+                uid, lid = self.lotacao[pid]
+                sid = prof["especialidades"][0]["especialidade_id"]
+                for minuto in horarios:
+                    if rnd.random() >= ocupacao:
+                        continue
+                    paciente_id = rnd.randint(1, max(1, profissionais * 40))
+                    status = rnd.choices(_STATUS, _PESOS_STATUS)[0]
+                    do_dia.append({
+                        "agendamento_id": agendamento_id,
+                        "data": dia.strftime("%d-%m-%Y"),
+                        "horario": _hhmmss(minuto),
+                        "paciente_id": paciente_id,
+                        "profissional_id": pid,
+                        "especialidade_id": sid if rnd.random() > 0.05 else None,
+                        "procedimento_id": rnd.randint(1, 50),
+                        "local_id": lid,
+                        "status_id": status,
+                        "unidade_id": uid,
+                        "nome_fantasia": self.unidades[uid],
+                    })
+                    self.pacientes.setdefault(paciente_id, f"PACIENTE {paciente_id:06d}")
+                    if status not in (6, 11):
+                        self.ocupados.setdefault((pid, dia), set()).add(minuto)
+                    agendamento_id += 1
+
+                if rnd.random() < densidade_bloqueios:
+                    dia_todo = rnd.random() < 0.4
+                    h0 = horarios[len(horarios) // 2]
+                    self.bloqueios.append({
+                        "id": len(self.bloqueios) + 1,
+                        "professional_id": pid,
+                        "date_start": dia.isoformat(),
+                        "date_end": dia.isoformat(),
+                        "time_start": None if dia_todo else _hhmmss(h0),
+                        "time_end": None if dia_todo else _hhmmss(min(h0 + 120, 23 * 60)),
+                        "units": [str(uid)],
+                        "description": "Bloqueio sintético",
+                    })
+            self.agendamentos_por_dia[dia] = do_dia
+            dia += timedelta(days=1)
+
+        # Feriado ocasional para todas as unidades (professional_id 0, units [0])
+        for dia in (self.inicio + timedelta(days=d) for d in range(dias)):
+            if rnd.random() < densidade_bloqueios / 4:
+                self.bloqueios.append({
+                    "id": len(self.bloqueios) + 1, "professional_id": 0,
+                    "date_start": dia.isoformat(), "date_end": dia.isoformat(),
+                    "time_start": None, "time_end": None, "units": [0], "description": "Feriado sintético",
+                })
+
+        # Índices para as respostas (os bloqueios gerados são de um dia só)
+        self._prof_por_id = {p["profissional_id"]: p for p in self.profissionais}
+        self._bloqueios_por_dia = {}
+        for b in self.bloqueios:
+            self._bloqueios_por_dia.setdefault(b["date_start"], []).append(b)
+
+    def resumo(self):
+        return {
+            "periodo": f"{self.inicio:%d-%m-%Y} a {self.fim:%d-%m-%Y}",
+            "unidades": len(self.unidades),
+            "salas": len(self.salas),
+            "profissionais": len(self.profissionais),
+            "agendamentos": sum(len(v) for v in self.agendamentos_por_dia.values()),
+            "bloqueios": len(self.bloqueios),
+        }
+
+    # ---------------- respostas ----------------
+    def agendamentos(self, corpo):
+        d0, d1 = _data(corpo.get("data_start")), _data(corpo.get("data_end"))
+        if d0 is None or d1 is None:
+            return 400, {"success": False, "content": "data_start e data_end são obrigatórios"}
+        uid = _int(corpo.get("unidade_id"))
+        linhas = []
+        dia = max(d0, self.inicio)
+        while dia <= min(d1, self.fim):
+            linhas.extend(a for a in self.agendamentos_por_dia.get(dia, ()) if not uid or a["unidade_id"] == uid)
+            dia += timedelta(days=1)
+        return 200, {"success": True, "content": linhas}
+
+    def _bloqueado(self, pid, uid, dia, minuto):
+        for b in self._bloqueios_por_dia.get(dia.isoformat(), ()):
+            if b["professional_id"] not in (0, pid):
+                continue
+            unidades = {_int(u) for u in b["units"]}
+            if unidades and 0 not in unidades and uid not in unidades:
+                continue
+            if b["time_start"] is None or b["time_start"] <= _hhmmss(minuto) < b["time_end"]:
+                return True
+        return False
+
+    def horarios_disponiveis(self, corpo, agora=None):
+        """Vagas livres só de hoje em diante (e de hoje, só após a hora atual), como a API real."""
+        pid = _int(corpo.get("profissional_id"))
+        uid = _int(corpo.get("unidade_id"))
+        d0, d1 = _data(corpo.get("data_start")), _data(corpo.get("data_end"))
+        if pid not in self.grade or d0 is None or d1 is None:
+            return 200, {"success": True, "content": []}
+        sid = _int(corpo.get("especialidade_id"))
+        if sid and sid not in {e["especialidade_id"] for e in self._prof_por_id[pid]["especialidades"]}:
+            return 200, {"success": True, "content": []}
+        unidade_prof, lid = self.lotacao[pid]
+        if uid and uid != unidade_prof:
+            return 200, {"success": True, "content": []}
+
+        agora = agora or datetime.now()
+        hoje, minuto_agora = agora.date(), agora.hour * 60 + agora.minute
+        por_data = {}
+        dia = max(d0, hoje)
+        while dia <= d1:
+            ocupados = self.ocupados.get((pid, dia), ())
+            livres = [_hhmmss(m) for m in self.grade[pid].get(dia.weekday(), ())
+                      if m not in ocupados and (dia > hoje or m >= minuto_agora)
+                      and not self._bloqueado(pid, unidade_prof, dia, m)]
+            if livres:
+                por_data[dia.isoformat()] = livres
+            dia += timedelta(days=1)
+        if not por_data:
+            return 200, {"success": True, "content": []}
+        return 200, {"success": True, "content": {"profissional_id": {str(pid): {"local_id": {str(lid): por_data}}}}}
+
+    def lista_bloqueios(self, corpo):
+        d0, d1 = _data(corpo.get("date_start")), _data(corpo.get("date_end"))
+        if d0 is None or d1 is None:
+            return 400, {"success": False, "content": "date_start e date_end são obrigatórios"}
+        uid, pid = _int(corpo.get("unidade_id")), _int(corpo.get("profissional_id"))
+        linhas = []
+        for b in self.bloqueios:
+            if b["date_end"] < d0.isoformat() or b["date_start"] > d1.isoformat():
+                continue
+            if pid and b["professional_id"] not in (0, pid):
+                continue
+            unidades = {_int(u) for u in b["units"]}
+            if uid and unidades and 0 not in unidades and uid not in unidades:
+                continue
+            linhas.append(b)
+        return 200, {"success": True, "content": linhas}
+
+    def paciente(self, corpo):
+        paciente_id = _int(corpo.get("paciente_id"))
+        nome = self.pacientes.get(paciente_id)
+        if nome is None:
+            return 404, {"success": False, "content": "Paciente não encontrado"}
+        return 200, {"success": True, "content": [{"paciente_id": paciente_id, "id": paciente_id, "nome": nome}]}
+
+
+# ==========================================================
+# SERVIDOR HTTP
+# ==========================================================
+class ServidorFeegow(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, dados, host="127.0.0.1", porta=0, latencia_ms=0.0, jitter_ms=0.0,
+                 taxa_429=0.0, retry_after_s=1, semente=0):
+        super().__init__((host, porta), _Handler)
+        self.dados = dados
+        self.latencia_s = latencia_ms / 1000
+        self.jitter_s = jitter_ms / 1000
+        self.taxa_429 = float(taxa_429)
+        self.retry_after_s = retry_after_s
+        self._rnd = random.Random(semente)
+        self._lock = threading.Lock()
+        self._contadores = {}
+        self.respostas_429 = 0
+        self._thread = None
+        self.rotas = {
+            "appoints/search": dados.agendamentos,
+            "appoints/available-schedule": dados.horarios_disponiveis,
+            "lock/list": dados.lista_bloqueios,
+            "professional/list": lambda corpo: (200, {"success": True, "content": dados.profissionais}),
+            "specialties/list": lambda corpo: (200, {"success": True, "content": dados.especialidades}),
+            "company/list-local": lambda corpo: (200, {"success": True, "content": dados.salas}),
+            "patient/search": dados.paciente,
+        }
+
+    @property
+    def url(self):
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def _sortear(self):
+        """(atraso em s, responder 429?) para uma requisição."""
+        with self._lock:
+            atraso = self.latencia_s + (self._rnd.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+            return atraso, self._rnd.random() < self.taxa_429
+
+    def _contar(self, rota, status):
+        with self._lock:
+            por_rota = self._contadores.setdefault(rota, {})
+            por_rota[status] = por_rota.get(status, 0) + 1
+            if status == 429:
+                self.respostas_429 += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requisicoes": sum(sum(v.values()) for v in self._contadores.values()),
+                "respostas_429": self.respostas_429,
+                "por_rota": {rota: dict(v) for rota, v in self._contadores.items()},
+            }
+
+    def limpar_stats(self):
+        with self._lock:
+            self._contadores.clear()
+            self.respostas_429 = 0
+
+    def iniciar_em_thread(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="feegow-standin", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como a API real atrás do pool do requests
+
+    def _responder(self, status, corpo, cabecalhos=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, str(valor))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _tratar(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        bruto = self.rfile.read(tamanho) if tamanho else b""
+        servidor = self.server
+        caminho = self.path.split("?", 1)[0].rstrip("/")
+
+        if caminho.endswith("/_stats"):
+            return self._responder(200, servidor.stats())
+        rota = next((r for r in servidor.rotas if caminho.endswith("/" + r)), None)
+        if rota is None:
+            return self._responder(404, {"success": False, "content": f"rota desconhecida: {caminho}"})
+        try:
+            corpo = json.loads(bruto) if bruto else {}
+        except ValueError:
+            servidor._contar(rota, 400)
+            return self._responder(400, {"success": False, "content": "JSON inválido"})
+
+        atraso, limitar = servidor._sortear()
+        if atraso:
+            _time.sleep(atraso)
+        if limitar:
+            servidor._contar(rota, 429)
+            return self._responder(429, {"success": False, "content": "Too Many Requests"},
+                                   {"Retry-After": servidor.retry_after_s})
+        status, resposta = servidor.rotas[rota](corpo or {})
+        servidor._contar(rota, status)
+        self._responder(status, resposta)
+
+    do_GET = _tratar
+    do_POST = _tratar
+
+    def log_message(self, formato, *args):
+        pass  # silencioso: milhares de requisições por benchmark
+
+
+def iniciar(dados=None, **kwargs):
+    """Sobe o servidor numa thread (porta 0 = livre) e devolve-o; .url vai em FEEGOW_BASE_URL."""
+    return ServidorFeegow(dados or DadosSinteticos(), **kwargs).iniciar_em_thread()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--unidades", type=int, default=2)
+    parser.add_argument("--profissionais", type=int, default=30)
+    parser.add_argument("--salas", type=int, default=8, help="Consultórios por unidade")
+    parser.add_argument("--dias", type=int, default=56)
+    parser.add_argument("--inicio", type=_data, help="Primeiro dia dos dados (DD-MM-AAAA); padrão: 4 semanas atrás")
+    parser.add_argument("--densidade-bloqueios", type=float, default=0.03)
+    parser.add_argument("--ocupacao", type=float, default=0.6)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-429", type=float, default=0.0, help="Fração das requisições respondidas com 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Segundos do cabeçalho Retry-After nos 429")
+    args = parser.parse_args()
+
+    t0 = _time.perf_counter()
+    dados = DadosSinteticos(unidades=args.unidades, profissionais=args.profissionais, salas=args.salas,
+                            dias=args.dias, densidade_bloqueios=args.densidade_bloqueios, ocupacao=args.ocupacao,
+                            inicio=args.inicio, semente=args.semente)
+    print(f"Dados gerados em {_time.perf_counter() - t0:.1f} s: {dados.resumo()}")
+
+    servidor = ServidorFeegow(dados, host=args.host, porta=args.porta, latencia_ms=args.latencia_ms,
+                              jitter_ms=args.jitter_ms, taxa_429=args.taxa_429, retry_after_s=args.retry_after,
+                              semente=args.semente)
+    print(f"Servindo em {servidor.url}  (FEEGOW_BASE_URL={servidor.url}; estatísticas em {servidor.url}/_stats)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"\n{servidor.stats()}")
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
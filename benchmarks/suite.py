@@ -0,0 +1,443 @@
+"""
+Suíte de benchmarks: geração de mapas ponta a ponta e as etapas pesadas isoladas,
+em tamanhos pequeno/medio/grande, offline (servidor sintético ou cassete gravado).
+
+Casos:
+    generate_weekly_maps, generate_daily_maps   processo novo por repetição (frio), contra o
+                                                benchmarks.feegow_standin numa thread (ou um cassete)
+    normalize_and_validate, _remove_blocked_slots, build_matrices, calcular_moda_intervalos
+                                                no próprio processo, com os dados sintéticos do tamanho
+
+Para cada caso: tempo de parede (melhor e mediana das repetições), pico de memória
+(RSS máximo do processo filho nos ponta a ponta; tracemalloc nos isolados) e chamadas
+HTTP à API, mais as linhas que saem da normalização e os PDFs gerados (ponta a ponta) ou
+uma medida da saída de cada função (isolados: linhas restantes, entradas nas matrizes,
+pares com intervalo). O resultado vai para um JSON e é comparado com o baseline: piora
+acima do limite (tempo, memória ou chamadas), linhas, PDFs ou saída diferentes, ou
+baseline ausente saem com código 1.
+
+Datas: a semana e o dia medidos são fixos dentro dos dados sintéticos (a 2ª semana do
+período, já passada), então chamadas, linhas e PDFs não dependem do dia da execução.
+O baseline versionado (benchmarks/baseline.json) traz só essas métricas determinísticas;
+tempo e memória dependem da máquina — para compará-los, grave um baseline local completo.
+Com --cassete, o "hoje" da geração é o momento gravado no cassete (relogio.json, ver
+core.relogio), então a reprodução vale em qualquer dia.
+
+Uso:
+    python -m benchmarks.suite                                   # pequeno e medio, compara com o baseline
+    python -m benchmarks.suite --tamanhos pequeno medio grande --repeticoes 5
+    python -m benchmarks.suite --salvar-baseline --baseline .cache/bench/baseline_local.json
+                                                                 # baseline completo desta máquina
+    python -m benchmarks.suite --baseline .cache/bench/baseline_local.json   # compara tempo/memória também
+    python -m benchmarks.suite --tamanhos pequeno medio grande --salvar-baseline deterministico
+                                                                 # regrava o baseline versionado
+    python -m benchmarks.suite --casos build_matrices normalize_and_validate --limite-tempo 0.15
+    python -m benchmarks.suite --cassete fixtures/semana --semana 08-12-2025 --dia 09-12-2025 \\
+        --unidade "OURO VERDE"                                   # ponta a ponta a partir de um cassete
+
+Rodar a partir da raiz do projeto. Os caches em disco (respostas, grades gravadas, PDFs,
+métricas) ficam numa pasta temporária por execução, então o .cache do projeto não é tocado.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time as _time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+TAMANHOS = {
+    "pequeno": dict(unidades=2, profissionais=30, salas=6, dias=42),
+    "medio": dict(unidades=4, profissionais=120, salas=10, dias=56),
+    "grande": dict(unidades=8, profissionais=400, salas=15, dias=84),
+}
+CASOS_PONTA_A_PONTA = ("generate_weekly_maps", "generate_daily_maps")
+CASOS_ISOLADOS = ("normalize_and_validate", "_remove_blocked_slots", "build_matrices", "calcular_moda_intervalos")
+CASOS = CASOS_PONTA_A_PONTA + CASOS_ISOLADOS
+
+BASELINE_PADRAO = RAIZ / "benchmarks" / "baseline.json"
+SAIDA_PADRAO = RAIZ / ".cache" / "bench" / "resultados.json"
+
+
+METRICAS_EXATAS = ("linhas", "pdfs", "saida")  # determinísticas: qualquer diferença falha
+METRICAS_DETERMINISTICAS = ("chamadas_api",) + METRICAS_EXATAS
+
+
+def _semana_medida(dados):
+    """Segunda-feira da 2ª semana dos dados sintéticos: passada (inclusive os espelhos D+7/D+14)."""
+    return dados.inicio + timedelta(days=7)
+
+
+# ==========================================================
+# DADOS DOS CASOS ISOLADOS
+# ==========================================================
+def _df_semana(dados, segunda):
+    """Agendamentos + vagas livres da grade na semana, já com nomes (como o df antes da normalização)."""
+    linhas = []
+    salas = {s["id"]: s["local"] for s in dados.salas}
+    esp = {e["especialidade_id"]: e["nome"] for e in dados.especialidades}
+    profs = {p["profissional_id"]: p for p in dados.profissionais}
+    for k in range(7):
+        dia = segunda + timedelta(days=k)
+        for a in dados.agendamentos_por_dia.get(dia, ()):
+            if a["status_id"] in (1, 7, 2, 3, 4):
+                linhas.append(a)
+        for pid, grade in dados.grade.items():
+            ocupados = dados.ocupados.get((pid, dia), ())
+            uid, lid = dados.lotacao[pid]
+            for m in grade.get(dia.weekday(), ()):
+                if m not in ocupados:
+                    linhas.append({
+                        "agendamento_id": 0, "status_id": 0, "data": dia.strftime("%d-%m-%Y"),
+                        "horario": f"{m // 60:02d}:{m % 60:02d}:00", "profissional_id": pid,
+                        "especialidade_id": profs[pid]["especialidades"][0]["especialidade_id"], "local_id": lid,
+                    })
+    df = pd.DataFrame(linhas)
+    df["especialidade_id"] = pd.to_numeric(df["especialidade_id"], errors="coerce").fillna(0).astype(int)
+    df["especialidade"] = df["especialidade_id"].map(esp).fillna("Especialidade")
+    df["sala"] = df["local_id"].map(salas).fillna("Indefinido")
+    df["nome_profissional"] = df["profissional_id"].map(lambda p: profs[p]["nome"])
+    uid_sala = {s["id"]: s["unidade_id"] for s in dados.salas}
+    df["unidade"] = df["local_id"].map(uid_sala).map(dados.unidades)
+    return df
+
+
+def _df_bloqueios(dados, inicio, fim):
+    """Bloqueios do período no formato de core.api_client.list_blocks (datas e horários já convertidos)."""
+    _, resposta = dados.lista_bloqueios({"date_start": inicio.isoformat(), "date_end": fim.isoformat()})
+    df = pd.DataFrame(resposta["content"])
+    if df.empty:
+        return df
+    for col in ["date_start", "date_end"]:
+        df[col] = pd.to_datetime(df[col], errors="coerce").dt.date
+    for col in ["time_start", "time_end"]:
+        df[col] = pd.to_datetime(df[col], format="%H:%M:%S", errors="coerce").dt.time
+    return df
+
+
+def _df_intervalos(dados):
+    """Entrada do relatório de grade: todos os agendamentos do período (fase do histórico)."""
+    linhas = [a for dia in dados.agendamentos_por_dia.values() for a in dia]
+    df = pd.DataFrame(linhas)
+    df["especialidade_id"] = pd.to_numeric(df["especialidade_id"], errors="coerce").fillna(0).astype(int)
+    return pd.DataFrame({
+        "profissional_id": df["profissional_id"],
+        "especialidade_id": df["especialidade_id"],
+        "horario_full": pd.to_datetime(df["data"] + " " + df["horario"], format="%d-%m-%Y %H:%M:%S"),
+    })
+
+
+def _entradas_matrizes(resultados):
+    """Total de entradas (profissional/horário) em todas as células das matrizes."""
+    return sum(len(celula) for matrices, _, _ in resultados for df in matrices.values()
+               for coluna in df.columns for celula in df[coluna])
+
+
+def _funcoes_isoladas(dados):
+    """
+    caso → (função sem argumentos, linhas de entrada, medida da saída). A medida é o que o
+    baseline compara: muda se a função passar a devolver outra coisa. Cada chamada trabalha
+    numa cópia.
+    """
+    from core.block_index import BlockSnapshot
+    from core.map_generator import _remove_blocked_slots
+    from core.normalize_df import normalize_and_validate
+    from core.schedule_templates import calcular_moda_intervalos
+    from core.utils import build_matrices
+
+    segunda = _semana_medida(dados)
+    domingo = segunda + timedelta(days=6)
+    ini_str, fim_str = segunda.strftime("%d-%m-%Y"), domingo.strftime("%d-%m-%Y")
+    df = _df_semana(dados, segunda)
+    df_final, _ = normalize_and_validate(df)
+    bloqueios = _df_bloqueios(dados, segunda, domingo)
+    intervalos = _df_intervalos(dados)
+
+    def remover_bloqueados():
+        # Snapshot novo por chamada: inclui a compilação do índice, como numa geração
+        return _remove_blocked_slots(df.copy(), ini_str, fim_str, bloqueios=BlockSnapshot(bloqueios, ini_str, fim_str))
+
+    def matrizes():
+        return [build_matrices(grupo, include_taxa=False) for _, grupo in df_final.groupby("unidade")]
+
+    return {
+        "normalize_and_validate": (lambda: normalize_and_validate(df), len(df), lambda r: len(r[0])),
+        "_remove_blocked_slots": (remover_bloqueados, len(df), len),
+        "build_matrices": (matrizes, len(df_final), _entradas_matrizes),
+        "calcular_moda_intervalos": (lambda: calcular_moda_intervalos(intervalos.copy()), len(intervalos), len),
+    }
+
+
+def _medir_isolado(func, repeticoes):
+    """(tempos, pico de memória em MB, resultado da chamada de aquecimento)."""
+    tempos = []
+    with contextlib.redirect_stdout(io.StringIO()):  # os DEBUG de bloqueio não poluem a saída
+        resultado = func()  # aquecimento (imports, caches de registro)
+        for _ in range(repeticoes):
+            t0 = _time.perf_counter()
+            func()
+            tempos.append(_time.perf_counter() - t0)
+        tracemalloc.start()
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return tempos, pico / 1024 / 1024, resultado
+
+
+# ==========================================================
+# PONTA A PONTA (processo filho por repetição)
+# ==========================================================
+def _executar_filho(spec):
+    """Roda uma geração num processo novo e imprime o resultado em JSON (uso interno)."""
+    from core.cache import set_cache_backend
+    set_cache_backend("memory")
+    from core import map_generator
+    from core.metrics import get_api_metrics
+
+    os.chdir(RAIZ)  # templates com caminho relativo
+    gerar = getattr(map_generator, spec["caso"])
+    t0 = _time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        resultado = gerar(spec["data"], unidade_id=spec.get("unidade"), output_dir=spec["pasta_saida"])
+    segundos = _time.perf_counter() - t0
+    chamadas = sum(ep["chamadas"] for ep in get_api_metrics().snapshot()["endpoints"].values())
+    etapas = {e["etapa"]: e["segundos"] for e in resultado.metricas.get("etapas", [])}
+    normalizacao = [e for e in resultado.metricas.get("etapas", []) if e["etapa"] == "normalizacao"]
+    print(json.dumps({
+        "segundos": segundos,
+        "memoria_pico_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KB no Linux
+        "chamadas_api": chamadas,
+        "linhas": normalizacao[0]["linhas_saida"] if normalizacao else 0,
+        "pdfs": len([k for k in resultado if k != "warning"]),
+        "aviso": resultado.get("warning"),
+        "etapas": etapas,
+    }))
+
+
+def _medir_ponta_a_ponta(caso, data, unidade, ambiente, repeticoes):
+    execucoes = []
+    for _ in range(repeticoes):
+        with tempfile.TemporaryDirectory(prefix="feegow_bench_") as tmp:
+            env = dict(os.environ, **ambiente,
+                       FEEGOW_CACHE_PATH=f"{tmp}/cache.sqlite", FEEGOW_SNAPSHOT_PATH=f"{tmp}/snapshots.sqlite",
+                       FEEGOW_PDF_CACHE_PATH=f"{tmp}/pdf", FEEGOW_METRICS_PATH="",
+                       FEEGOW_PROFILE_DIR=f"{tmp}/profiles")
+            env.setdefault("FEEGOW_ACCESS_TOKEN", "benchmark")
+            spec = {"caso": caso, "data": data, "unidade": unidade, "pasta_saida": f"{tmp}/out"}
+            proc = subprocess.run([sys.executable, "-m", "benchmarks.suite", "--_filho", json.dumps(spec)],
+                                  cwd=RAIZ, env=env, capture_output=True, text=True)
+            if proc.returncode != 0:
+                raise RuntimeError(f"{caso} falhou:\n{proc.stderr[-3000:]}")
+            execucoes.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return execucoes
+
+
+# ==========================================================
+# COMPARAÇÃO COM O BASELINE
+# ==========================================================
+def comparar(atual, baseline, limite_tempo, limite_memoria, limite_chamadas, folga_s=0.005, folga_mb=5.0):
+    """
+    Lista de (caso, métrica, base, atual, variação, regrediu) dos casos presentes nos dois.
+    Métricas ausentes no baseline (ex.: tempo no baseline versionado) não são comparadas.
+    """
+    linhas = []
+    for nome, r in atual["casos"].items():
+        b = baseline.get("casos", {}).get(nome)
+        if b is None:
+            continue
+        for metrica, limite, folga in (("segundos", limite_tempo, folga_s),
+                                       ("memoria_pico_mb", limite_memoria, folga_mb),
+                                       ("chamadas_api", limite_chamadas, 0),
+                                       *((m, None, 0) for m in METRICAS_EXATAS)):
+            base, novo = b.get(metrica), r.get(metrica)
+            if base is None or novo is None:
+                continue
+            variacao = (novo - base) / base if base else (0.0 if novo == base else float("inf"))
+            if limite is None:
+                regrediu = novo != base
+            else:
+                regrediu = variacao > limite and novo - base > folga
+            linhas.append((nome, metrica, base, novo, variacao, regrediu))
+    return linhas
+
+
+def _para_baseline(resultados, modo):
+    """Baseline a gravar: completo (desta máquina) ou só as métricas determinísticas (versionado)."""
+    if modo == "completo":
+        return resultados
+    return {
+        "semente": resultados["semente"],
+        "fonte": resultados["fonte"],
+        "casos": {nome: {m: r[m] for m in METRICAS_DETERMINISTICAS if m in r}
+                  for nome, r in resultados["casos"].items()},
+    }
+
+
+def _imprimir_comparacao(linhas):
+    if not linhas:
+        print("\nSem casos em comum com o baseline.")
+        return
+    largura = max(len(c) for c, *_ in linhas)
+    print(f"\n{'caso'.ljust(largura)}  {'métrica':<16} {'baseline':>10} {'atual':>10} {'variação':>9}")
+    for caso, metrica, base, novo, variacao, regrediu in linhas:
+        marca = "  << REGRESSÃO" if regrediu else ""
+        print(f"{caso.ljust(largura)}  {metrica:<16} {base:>10.3f} {novo:>10.3f} {variacao:>+8.1%}{marca}")
+
+
+# ==========================================================
+# EXECUÇÃO
+# ==========================================================
+def executar(args):
+    from benchmarks.feegow_standin import DadosSinteticos, iniciar
+
+    casos = [c for c in CASOS if c in set(args.casos)]
+    resultados = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "fonte": "cassete" if args.cassete else "standin",
+        "semente": args.semente,
+        "repeticoes": args.repeticoes,
+        "casos": {},
+    }
+
+    def registrar(nome, tempos, memoria, chamadas=None, extra=None):
+        resultados["casos"][nome] = {
+            "segundos": min(tempos),
+            "segundos_mediana": statistics.median(tempos),
+            "memoria_pico_mb": round(memoria, 2),
+            **({"chamadas_api": chamadas} if chamadas is not None else {}),
+            **(extra or {}),
+        }
+        print(f"  {nome:<45} {min(tempos):8.3f} s (mediana {statistics.median(tempos):.3f})  "
+              f"{memoria:8.1f} MB" + (f"  {chamadas} chamadas" if chamadas is not None else ""))
+
+    def ponta_a_ponta(sufixo, ambiente, semana, dia, unidade_semana, unidade_dia):
+        for caso, data, unidade in (("generate_weekly_maps", semana, unidade_semana),
+                                    ("generate_daily_maps", dia, unidade_dia)):
+            if caso not in casos:
+                continue
+            execucoes = _medir_ponta_a_ponta(caso, data, unidade, ambiente, args.repeticoes)
+            registrar(f"{caso}/{sufixo}", [e["segundos"] for e in execucoes],
+                      max(e["memoria_pico_mb"] for e in execucoes), execucoes[0]["chamadas_api"],
+                      {"linhas": execucoes[0]["linhas"], "pdfs": execucoes[0]["pdfs"], "etapas": execucoes[0]["etapas"]})
+
+    if args.cassete:
+        if not (args.semana and args.dia):
+            raise SystemExit("ERRO: com --cassete, informe --semana e --dia (as datas gravadas)")
+        from core.cassette import ARQUIVO_RELOGIO
+        if not (Path(args.cassete) / ARQUIVO_RELOGIO).exists() and not os.getenv("FEEGOW_HOJE"):
+            # Sem o momento gravado, "hoje" seria o dia da execução e as chaves não bateriam
+            raise SystemExit(f"ERRO: cassete sem {ARQUIVO_RELOGIO} (gravado antes do relógio): regrave-o "
+                             f"ou defina FEEGOW_HOJE com o dia e a hora da gravação")
+        print(f"[cassete] {args.cassete}")
+        ambiente = {"FEEGOW_CASSETTE_MODE": "replay", "FEEGOW_CASSETTE_PATH": str(Path(args.cassete).resolve())}
+        ponta_a_ponta("cassete", ambiente, args.semana, args.dia, args.unidade, args.unidade)
+
+    for tamanho in args.tamanhos:
+        t0 = _time.perf_counter()
+        dados = DadosSinteticos(**TAMANHOS[tamanho], semente=args.semente)
+        print(f"[{tamanho}] dados em {_time.perf_counter() - t0:.1f} s: {dados.resumo()}")
+
+        if not args.cassete and any(c in casos for c in CASOS_PONTA_A_PONTA):
+            servidor = iniciar(dados, latencia_ms=args.latencia_ms)
+            try:
+                ambiente = {"FEEGOW_BASE_URL": servidor.url, "FEEGOW_RATE_LIMIT_RPS": str(args.rps)}
+                segunda = _semana_medida(dados)
+                quarta = segunda + timedelta(days=2)
+                ponta_a_ponta(tamanho, ambiente, segunda.strftime("%d-%m-%Y"), quarta.strftime("%d-%m-%Y"),
+                              None, next(iter(dados.unidades.values())))
+            finally:
+                servidor.parar()
+
+        if any(c in casos for c in CASOS_ISOLADOS):
+            funcoes = _funcoes_isoladas(dados)
+            for caso in CASOS_ISOLADOS:
+                if caso in casos:
+                    func, linhas, medida = funcoes[caso]
+                    tempos, memoria, resultado = _medir_isolado(func, args.repeticoes)
+                    registrar(f"{caso}/{tamanho}", tempos, memoria,
+                              extra={"linhas_entrada": linhas, "saida": int(medida(resultado))})
+
+    saida = Path(args.saida)
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultados, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\nResultados: {saida}")
+
+    baseline_path = Path(args.baseline)
+    if args.salvar_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline = _para_baseline(resultados, args.salvar_baseline)
+        baseline_path.write_text(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline ({args.salvar_baseline}) gravado: {baseline_path}")
+        return 0
+    if args.sem_baseline:
+        print("Comparação com o baseline desativada (--sem-baseline)")
+        return 0
+    if not baseline_path.exists():
+        print(f"FALHOU: sem baseline em {baseline_path} (grave um com --salvar-baseline ou use --sem-baseline)")
+        return 1
+
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    if baseline.get("semente", args.semente) != args.semente:
+        print(f"FALHOU: baseline gravado com --semente {baseline['semente']} (esta execução: {args.semente})")
+        return 1
+    linhas = comparar(resultados, baseline, args.limite_tempo, args.limite_memoria, args.limite_chamadas)
+    _imprimir_comparacao(linhas)
+    sem_referencia = sorted(set(resultados["casos"]) - set(baseline.get("casos", {})))
+    if sem_referencia:
+        print(f"\nSem baseline (não comparados): {', '.join(sem_referencia)}")
+    regressoes = [l for l in linhas if l[-1]]
+    if regressoes:
+        print(f"\nFALHOU: {len(regressoes)} regressão(ões) acima do limite "
+              f"(tempo {args.limite_tempo:.0%}, memória {args.limite_memoria:.0%}, chamadas {args.limite_chamadas:.0%}; "
+              f"linhas e PDFs exatos)")
+        return 1
+    print("\nOK: nenhuma regressão acima do limite")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", nargs="+", choices=list(TAMANHOS), default=["pequeno", "medio"])
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), default=list(CASOS))
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--saida", default=str(SAIDA_PADRAO), help="JSON com os resultados desta execução")
+    parser.add_argument("--baseline", default=str(BASELINE_PADRAO), help="JSON de referência para a comparação")
+    parser.add_argument("--salvar-baseline", nargs="?", const="completo", choices=("completo", "deterministico"),
+                        help="Grava os resultados como novo baseline (completo, padrão; ou deterministico: "
+                             "só chamadas, linhas e PDFs, como o versionado)")
+    parser.add_argument("--sem-baseline", action="store_true", help="Só mede e grava os resultados, sem comparar")
+    parser.add_argument("--limite-tempo", type=float, default=0.25, help="Piora máxima de tempo (fração; 0.25 = +25%%)")
+    parser.add_argument("--limite-memoria", type=float, default=0.25, help="Piora máxima do pico de memória (fração)")
+    parser.add_argument("--limite-chamadas", type=float, default=0.0, help="Aumento máximo de chamadas à API (fração)")
+    parser.add_argument("--latencia-ms", type=float, default=0.0, help="Latência injetada no servidor sintético")
+    parser.add_argument("--rps", type=float, default=0, help="Taxa do limitador nos ponta a ponta (0 = sem limite de taxa)")
+    parser.add_argument("--cassete", help="Pasta de um cassete gravado (core.cassette) para os ponta a ponta")
+    parser.add_argument("--semana", help="Segunda-feira gravada no cassete (DD-MM-AAAA)")
+    parser.add_argument("--dia", help="Dia gravado no cassete (DD-MM-AAAA)")
+    parser.add_argument("--unidade", help="Unidade dos ponta a ponta com cassete (padrão: todas no semanal)")
+    parser.add_argument("--_filho", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args._filho:
+        _executar_filho(json.loads(args._filho))
+        return 0
+    return executar(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
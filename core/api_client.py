@@ -1,16 +1,34 @@
+import contextvars
+import copy
 import requests
 import pandas as pd
 import os
 import yaml
 import string
+import threading
+import time as _time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Union
+from urllib.parse import urlsplit, urlunsplit
 from dotenv import load_dotenv
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from datetime import datetime, timedelta, time, date
 from dateutil.parser import parse as date_parse
-import streamlit as st
+
+from core.cache import cache_data, cache_resource, get_secret, erro_fatal
+from core import relogio
+from core.cassette import ARQUIVO_RELOGIO, Cassette
+from core.disk_cache import DiskCache, make_cache_key
+from core.metrics import configurar_exportacao, get_api_metrics
+from core.pdf_cache import PdfCache
+from core.rate_limiter import STATUS_SOBRECARGA, RateLimiter, segundos_retry_after
+from core.roster import ProfUnitRoster
+from core.snapshot_store import SnapshotStore
+from core.stages import contar_chamada_api
+from core.time_columns import ordinal_dia
 
 # Carrega variáveis de ambiente locais (.env) se existirem
 load_dotenv()
@@ -22,78 +40,219 @@ API_CONFIG_FILE = current_dir.parent / "api_config.yaml"
 # ==========================================================
 # CARREGA CONFIGURAÇÃO DA API
 # ==========================================================
-@st.cache_resource
+@cache_resource
 def load_api_config():
     try:
         with open(API_CONFIG_FILE, 'r', encoding='utf-8') as f:
             cfg = yaml.safe_load(f)
             return cfg
     except FileNotFoundError:
-        st.error(f"Arquivo de configuração não encontrado em: {API_CONFIG_FILE}")
-        st.stop()
+        erro_fatal(f"Arquivo de configuração não encontrado em: {API_CONFIG_FILE}")
 
 # ==========================================================
-# PARÂMETROS GLOBAIS DA API
+# PARÂMETROS GLOBAIS DA API (carregados no primeiro uso)
 # ==========================================================
-cfg = load_api_config()
-globals_cfg = cfg.get("globals", {})
-timeout = globals_cfg.get("timeout_seconds", 15)
-method_default = globals_cfg.get("method", "GET")
-global_headers = globals_cfg.get("headers", {})
-auth_cfg = globals_cfg.get("auth", {})
+# Importar este módulo não lê configuração nem abre sessão HTTP: tudo é montado
+# sob demanda (e cacheado) por get_api_settings() / get_session().
+@cache_resource
+def get_api_settings():
+    cfg = load_api_config() or {}
+    globals_cfg = cfg.get("globals", {}) or {}
+
+    # Exportação periódica das métricas por endpoint (core.metrics), se configurada
+    metrics_cfg = globals_cfg.get("metrics", {}) or {}
+    pasta_metricas = os.getenv("FEEGOW_METRICS_PATH", metrics_cfg.get("export_path"))
+    if pasta_metricas and not Path(pasta_metricas).is_absolute():
+        pasta_metricas = current_dir.parent / pasta_metricas
+    configurar_exportacao(pasta_metricas, metrics_cfg.get("export_interval_seconds", 60))
+
+    # Servidor alternativo (ex.: benchmarks/feegow_standin.py): troca só esquema e host das URLs
+    base_url = (os.getenv("FEEGOW_BASE_URL") or globals_cfg.get("base_url") or "").strip()
 
-# ======== CONVERTE endpoints(lista) → dict ========
-endpoints_list = cfg.get("endpoints", [])
-ENDPOINTS = {ep["name"]: ep for ep in endpoints_list}
+    return SimpleNamespace(
+        cfg=cfg,
+        globals_cfg=globals_cfg,
+        timeout=globals_cfg.get("timeout_seconds", 15),
+        concurrency=int(globals_cfg.get("concurrency", 5) or 1),
+        method_default=globals_cfg.get("method", "GET"),
+        global_headers=globals_cfg.get("headers", {}),
+        auth_cfg=globals_cfg.get("auth", {}),
+        base_url=base_url,
+        # ======== CONVERTE endpoints(lista) → dict ========
+        ENDPOINTS={ep["name"]: {**ep, "url": trocar_base_url(ep["url"], base_url)} for ep in cfg.get("endpoints", [])},
+    )
+
+def trocar_base_url(url, base_url):
+    """'https://api.feegow.com/v1/api/x' + 'http://127.0.0.1:8765' → 'http://127.0.0.1:8765/v1/api/x'."""
+    if not base_url:
+        return url
+    partes, base = urlsplit(url), urlsplit(base_url)
+    return urlunsplit((base.scheme, base.netloc, base.path.rstrip("/") + partes.path, partes.query, partes.fragment))
 
 # ==========================================================
-# CONFIGURAÇÃO DE SESSÃO STREAMLIT
+# CONFIGURAÇÃO DE SESSÃO HTTP
 # ==========================================================
-@st.cache_resource
+@cache_resource
+def get_rate_limiter():
+    """
+    Limitador global de requisições (core.rate_limiter), ou None se desativado.
+    FEEGOW_RATE_LIMIT_RPS sobrepõe requests_per_second (0 = sem limite de taxa, só o de concorrência).
+    """
+    rl_cfg = get_api_settings().globals_cfg.get("rate_limit", {}) or {}
+    if not rl_cfg.get("enabled", False):
+        return None
+    return RateLimiter(
+        taxa=float(os.getenv("FEEGOW_RATE_LIMIT_RPS") or rl_cfg.get("requests_per_second", 8)),
+        rajada=float(rl_cfg.get("burst", 16)),
+        max_concorrencia=int(rl_cfg.get("max_concurrency", 8)),
+        min_concorrencia=int(rl_cfg.get("min_concurrency", 1)),
+        max_pausa_s=float(rl_cfg.get("max_retry_after_seconds", 60)),
+    )
+
+@cache_resource
 def get_session():
+    settings = get_api_settings()
     session = requests.Session()
 
+    # Com o limitador ativo, 429/5xx são repetidos em request_endpoint (que vê cada resposta,
+    # ajusta a concorrência e respeita Retry-After); o urllib3 fica só com falhas de conexão.
+    # respect_retry_after_header também é desligado: ligado, o urllib3 repete sozinho
+    # todo 429/503 que traga Retry-After, mesmo com status_forcelist vazio.
+    com_limitador = get_rate_limiter() is not None
     retry_strategy = Retry(
-        total=globals_cfg.get("retries", 3),
-        backoff_factor=globals_cfg.get("backoff_factor", 1),
-        status_forcelist=[429, 500, 502, 503, 504],
+        total=settings.globals_cfg.get("retries", 3),
+        backoff_factor=settings.globals_cfg.get("backoff_factor", 1),
+        status_forcelist=[] if com_limitador else [429, 500, 502, 503, 504],
+        respect_retry_after_header=not com_limitador,
         allowed_methods=["GET", "POST", "PUT", "DELETE", "HEAD"]
     )
 
-    adapter = HTTPAdapter(max_retries=retry_strategy)
+    # pool_maxsize acompanha a concorrência para que as threads do lote não disputem conexões
+    adapter = HTTPAdapter(max_retries=retry_strategy, pool_maxsize=max(10, settings.concurrency))
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
     return session
 
-session = get_session()
-retry_strategy = Retry(
-    total=globals_cfg.get("retries", 3),
-    backoff_factor=globals_cfg.get("backoff_factor", 1),
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["GET", "POST", "PUT", "DELETE", "HEAD"]
-)
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session.mount("https://", adapter)
-session.mount("http://", adapter)
+def __getattr__(name):
+    """Compatibilidade: `api_client.globals_cfg`, `.ENDPOINTS`, `.session` etc. resolvidos sob demanda."""
+    if name == "session":
+        return get_session()
+    settings = get_api_settings()
+    if hasattr(settings, name):
+        return getattr(settings, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ==========================================================
+# CACHE PERSISTENTE EM DISCO (compartilhado entre processos)
+# ==========================================================
+@cache_resource
+def get_disk_cache():
+    cache_cfg = get_api_settings().globals_cfg.get("cache", {}) or {}
+    if not cache_cfg.get("enabled", False):
+        return None
+
+    path = Path(os.getenv("FEEGOW_CACHE_PATH", cache_cfg.get("path", ".cache/feegow_cache.sqlite")))
+    if not path.is_absolute():
+        path = current_dir.parent / path
+
+    try:
+        return DiskCache(
+            path,
+            max_bytes=int(cache_cfg.get("max_size_mb", 200)) * 1024 * 1024,
+            touch_interval_s=float(cache_cfg.get("touch_interval_seconds", 60)),
+        )
+    except Exception as e:
+        print(f"[CACHE ERROR] não foi possível abrir {path}: {e}")
+        return None
+
+@cache_resource
+def get_snapshot_store():
+    """Histórico gravado da grade (core.snapshot_store), ou None se desativado."""
+    snap_cfg = get_api_settings().globals_cfg.get("snapshots", {}) or {}
+    if not snap_cfg.get("enabled", False):
+        return None
+
+    path = Path(os.getenv("FEEGOW_SNAPSHOT_PATH", snap_cfg.get("path", ".cache/grade_snapshots.sqlite")))
+    if not path.is_absolute():
+        path = current_dir.parent / path
+
+    try:
+        return SnapshotStore(path, corte_hora=int(snap_cfg.get("cutoff_hour", 6)))
+    except Exception as e:
+        print(f"[SNAPSHOT ERROR] não foi possível abrir {path}: {e}")
+        return None
+
+@cache_resource
+def get_pdf_cache():
+    """Cache de PDFs renderizados (core.pdf_cache), ou None se desativado."""
+    pdf_cfg = get_api_settings().globals_cfg.get("pdf_cache", {}) or {}
+    if not pdf_cfg.get("enabled", False):
+        return None
+
+    path = os.getenv("FEEGOW_PDF_CACHE_PATH", pdf_cfg.get("path"))
+    if path:
+        path = Path(path)
+        if not path.is_absolute():
+            path = current_dir.parent / path
+
+    try:
+        return PdfCache(
+            path,
+            max_memoria_bytes=int(pdf_cfg.get("memory_mb", 64)) * 1024 * 1024,
+            max_disco_bytes=int(pdf_cfg.get("disk_mb", 500)) * 1024 * 1024,
+        )
+    except Exception as e:
+        print(f"[PDF CACHE ERROR] não foi possível abrir {path}: {e}")
+        return PdfCache(None)
+
+@cache_resource
+def get_cassette():
+    """
+    Cassete HTTP (core.cassette) em gravação ou reprodução, ou None (modo "off").
+    FEEGOW_CASSETTE_MODE / FEEGOW_CASSETTE_PATH sobrepõem globals.cassette.
+    """
+    cas_cfg = get_api_settings().globals_cfg.get("cassette", {}) or {}
+    modo = (os.getenv("FEEGOW_CASSETTE_MODE") or cas_cfg.get("mode") or "off").strip().lower()
+    if modo == "off":
+        return None
+
+    path = Path(os.getenv("FEEGOW_CASSETTE_PATH", cas_cfg.get("path", ".cache/cassettes")))
+    if not path.is_absolute():
+        path = current_dir.parent / path
+    if modo == "replay" and not path.is_dir():
+        erro_fatal(f"Cassete não encontrado em: {path}")
+    cassette = Cassette(path, modo, momento=relogio.agora(usar_cassete=False) if modo == "record" else None)
+    if cassette.reproduzindo and cassette.momento is None:
+        print(f"[CASSETE] {path} sem {ARQUIVO_RELOGIO}: só reproduz no dia em que foi gravado")
+    return cassette
+
+@cache_resource
+def get_roster():
+    """Elenco profissional → unidade da varredura de ociosos (core.roster), ou None se desativado."""
+    roster_cfg = get_api_settings().globals_cfg.get("roster", {}) or {}
+    if not roster_cfg.get("enabled", False):
+        return None
+    return ProfUnitRoster(get_disk_cache(), sweep_hours=float(roster_cfg.get("sweep_hours", 24)))
 
 # ==========================================================
 # EXTRAÇÃO DE DADOS DA API
 # ==========================================================
 def build_headers(endpoint_cfg, has_payload=False):
-    headers = dict(global_headers)
+    settings = get_api_settings()
+    headers = dict(settings.global_headers)
     headers.update(endpoint_cfg.get("headers", {}))
     if not has_payload:
         headers.pop("Content-Type", None)
 
-    auth = endpoint_cfg.get("auth", auth_cfg)
+    auth = endpoint_cfg.get("auth", settings.auth_cfg)
     if auth and auth.get("type") == "env_header":
         env_name = auth.get("env_var")
-        token = st.secrets.get(env_name, os.getenv(env_name))
+        token = get_secret(env_name)
         
         # CORREÇÃO: Acesso seguro ao dicionário aninhado
         if not token:
-            api_sec = st.secrets.get("api", {})
+            api_sec = get_secret("api", {})
             token = api_sec.get("token") if isinstance(api_sec, dict) else None
 
         if not token:
@@ -135,10 +294,47 @@ def fill_body_template(template: dict, context: dict):
                 body[k] = v
     return body
 
+def _request_limitado(method, url, headers, json_payload):
+    """
+    Uma requisição HTTP passando pelo limitador global (quando ativo): espera token e
+    vaga de concorrência, informa o status ao limitador e repete 429/5xx com backoff
+    exponencial (ou o Retry-After, que pausa todas as requisições do processo).
+    Retorna (resposta, número de repetições).
+    """
+    settings = get_api_settings()
+    session = get_session()
+    limiter = get_rate_limiter()
+    if limiter is None:
+        resp = session.request(method, url, headers=headers, json=json_payload, timeout=settings.timeout)
+        return resp, _repeticoes_urllib3(resp)
+
+    tentativas = max(0, int(settings.globals_cfg.get("retries", 3)))
+    backoff = float(settings.globals_cfg.get("backoff_factor", 1))
+    for tentativa in range(tentativas + 1):
+        with limiter.slot():
+            try:
+                resp = session.request(method, url, headers=headers, json=json_payload, timeout=settings.timeout)
+            except requests.RequestException:
+                limiter.registrar(None)
+                raise
+        retry_after = resp.headers.get("Retry-After")
+        limiter.registrar(resp.status_code, retry_after)
+        if resp.status_code not in STATUS_SOBRECARGA or tentativa == tentativas:
+            break
+        # Com Retry-After a pausa já é global (adquirir espera); sem ele, recuo exponencial desta thread
+        if segundos_retry_after(retry_after) is None:
+            _time.sleep(backoff * (2 ** tentativa))
+    return resp, tentativa + _repeticoes_urllib3(resp)
+
+def _repeticoes_urllib3(resp):
+    """Repetições feitas pelo Retry do urllib3 dentro de uma resposta (0 se indisponível)."""
+    retries = getattr(getattr(resp, "raw", None), "retries", None)
+    return len(getattr(retries, "history", ()) or ())
+
 def request_endpoint(ep_cfg, global_context=None):
     url = ep_cfg["url"]
-    method = ep_cfg.get("method", method_default).upper()
-    headers = build_headers(ep_cfg)
+    settings = get_api_settings()
+    method = ep_cfg.get("method", settings.method_default).upper()
     needs_body = ep_cfg.get("needs_body", False)
     body_template = ep_cfg.get("body_template", {})
 
@@ -151,7 +347,7 @@ def request_endpoint(ep_cfg, global_context=None):
                 ctx[k] = ctx[k].strftime("%d-%m-%Y")
 
         if "data_start" not in ctx or "data_end" not in ctx:
-            today = datetime.now().date().strftime("%d-%m-%Y")
+            today = relogio.hoje().strftime("%d-%m-%Y")
             ctx.setdefault("data_start", today)
             ctx.setdefault("data_end", today)
         
@@ -159,27 +355,110 @@ def request_endpoint(ep_cfg, global_context=None):
 
     real_method = "POST" if needs_body and ep_cfg.get("use_post_for_body", False) else method
 
+    nome = ep_cfg.get("name", url)
+    metricas = get_api_metrics()
+
+    # Cassete em reprodução: responde do arquivo gravado, sem rede, token nem cache em disco
+    cassette = get_cassette()
+    if cassette is not None and cassette.reproduzindo:
+        contar_chamada_api()
+        registro = cassette.reproduzir(nome, json_payload)
+        if registro is None:
+            metricas.registrar_chamada(nome, 0.0, "sem_gravacao", erro=True)
+            return {"error": True, "text": f"cassete: sem gravação para {nome} {json_payload}"}
+        status = registro.get("status")
+        if registro.get("error"):
+            metricas.registrar_chamada(nome, 0.0, status, erro=True)
+            return {"error": True, "text": registro["error"]}
+        metricas.registrar_chamada(nome, 0.0, status)
+        return registro.get("json")
+
+    # Cache em disco: só para endpoints com TTL declarado no api_config.yaml.
+    # Gravando cassete, a leitura é pulada para toda requisição passar pela API e ser gravada.
+    cache_ttl = ep_cfg.get("cache_ttl_seconds")
+    disk_cache = get_disk_cache() if cache_ttl else None
+    cache_key = None
+    if disk_cache is not None:
+        cache_key = make_cache_key(nome, url, json_payload)
+        cached = disk_cache.get(cache_key) if cassette is None else None
+        metricas.registrar_cache(nome, cached is not None)
+        if cached is not None:
+            contar_chamada_api(cache=True)
+            return cached
+
+    headers = build_headers(ep_cfg)
+    contar_chamada_api()
+    t0 = _time.perf_counter()
+    resp, repeticoes = None, 0
     try:
-        resp = session.request(real_method, url, headers=headers, json=json_payload, timeout=timeout)
+        resp, repeticoes = _request_limitado(real_method, url, headers, json_payload)
         resp.raise_for_status()
-        return resp.json() if resp.text else {}
+        result = resp.json() if resp.text else {}
     except Exception as e:
+        status = resp.status_code if resp is not None else type(e).__name__
+        metricas.registrar_chamada(nome, _time.perf_counter() - t0, status, len(resp.content or b"") if resp is not None else 0,
+                                   repeticoes, erro=True)
+        # Falhas sem resposta (conexão) não vão para o cassete
+        if cassette is not None and resp is not None:
+            cassette.gravar(nome, real_method, url, json_payload, resp.status_code, None, erro=str(e))
         # Mantém seu log de erro original
         return {"error": True, "text": str(e)}
+    metricas.registrar_chamada(nome, _time.perf_counter() - t0, resp.status_code, len(resp.content or b""), repeticoes)
+    if cassette is not None:
+        cassette.gravar(nome, real_method, url, json_payload, resp.status_code, result)
+
+    # Respostas de erro nunca são gravadas
+    if disk_cache is not None and not (isinstance(result, dict) and result.get("error")):
+        disk_cache.set(cache_key, ep_cfg.get("name", url), result, cache_ttl)
+    return result
 
 # ==========================================================
 # Helpers internos
 # ==========================================================
+# Single-flight: chamadas idênticas (endpoint + contexto canônico) feitas ao mesmo tempo,
+# por sessões ou threads diferentes, esperam a mesma requisição em vez de repeti-la.
+_EM_VOO = {}
+_EM_VOO_LOCK = threading.Lock()
+_COALESCIDAS = {}
+
 def _call_endpoint(name: str, context: dict = None):
-    ep_cfg = ENDPOINTS.get(name)
+    ep_cfg = get_api_settings().ENDPOINTS.get(name)
     if not ep_cfg:
         raise RuntimeError(f"Endpoint não encontrado: {name}")
 
-    result = request_endpoint(ep_cfg, global_context=context or {})
-    if result and "error" in result:
-        print(f"[API ERROR] {name}: {result}")
-        return None
-    return result
+    chave = make_cache_key(name, ep_cfg.get("url", ""), context or {})
+    with _EM_VOO_LOCK:
+        futuro = _EM_VOO.get(chave)
+        lider = futuro is None
+        if lider:
+            futuro = _EM_VOO[chave] = Future()
+        else:
+            _COALESCIDAS[name] = _COALESCIDAS.get(name, 0) + 1
+
+    if not lider:
+        get_api_metrics().registrar_coalescida(name)
+        # Cópia: cada seguidor recebe seu próprio JSON (os parsers só leem, mas o líder
+        # e os demais seguidores compartilham o original)
+        return copy.deepcopy(futuro.result())
+
+    try:
+        result = request_endpoint(ep_cfg, global_context=context or {})
+        if result and "error" in result:
+            print(f"[API ERROR] {name}: {result}")
+            result = None
+        futuro.set_result(result)
+        return result
+    except BaseException as e:
+        futuro.set_exception(e)
+        raise
+    finally:
+        with _EM_VOO_LOCK:
+            _EM_VOO.pop(chave, None)
+
+def single_flight_stats():
+    """Chamadas coalescidas por endpoint e requisições em voo agora."""
+    with _EM_VOO_LOCK:
+        return {"coalescidas": sum(_COALESCIDAS.values()), "por_endpoint": dict(_COALESCIDAS), "em_voo": len(_EM_VOO)}
 
 def _normalize_df(data, nested_key=None):
     if data is None:
@@ -192,14 +471,95 @@ def _normalize_df(data, nested_key=None):
         return pd.json_normalize(data)
     except Exception:
         return pd.DataFrame(data)
-    
+
+def _executar_em_lote(func, lista_kwargs, max_workers=None, on_progress=None):
+    """
+    Executa func(**kwargs) para cada item de lista_kwargs em um pool de threads
+    limitado por `globals.concurrency`.
+    Cada item é isolado: uma exceção vira None na posição correspondente e é logada.
+    Retorna os resultados na mesma ordem da entrada.
+    """
+    lista_kwargs = list(lista_kwargs)
+    if not lista_kwargs:
+        return []
+
+    workers = max(1, min(int(max_workers or get_api_settings().concurrency), len(lista_kwargs)))
+    nome_func = getattr(func, "__name__", str(func))
+
+    def _seguro(kw):
+        try:
+            return func(**kw)
+        except Exception as e:
+            print(f"[LOTE ERROR] {nome_func}({kw}): {e}")
+            return None
+
+    resultados = [None] * len(lista_kwargs)
+
+    if workers == 1:
+        for i, kw in enumerate(lista_kwargs):
+            resultados[i] = _seguro(kw)
+            if on_progress: on_progress(i + 1, len(lista_kwargs))
+        return resultados
+
+    # Propaga o contexto do Streamlit para as threads (evita avisos de "missing ScriptRunContext")
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        st_ctx = get_script_run_ctx(suppress_warning=True)
+    except Exception:
+        st_ctx = None
+
+    def _init_thread():
+        if st_ctx is not None:
+            add_script_run_ctx(threading.current_thread(), st_ctx)
+
+    # Cada tarefa roda numa cópia do contexto de quem submeteu: a etapa corrente
+    # (core.stages) continua contando as chamadas feitas nas threads
+    with ThreadPoolExecutor(max_workers=workers, initializer=_init_thread) as pool:
+        futuros = {pool.submit(contextvars.copy_context().run, _seguro, kw): i for i, kw in enumerate(lista_kwargs)}
+        for concluidos, fut in enumerate(as_completed(futuros), start=1):
+            resultados[futuros[fut]] = fut.result()
+            if on_progress: on_progress(concluidos, len(lista_kwargs))
+
+    return resultados
+
 # ==========================================================
 # API PÚBLICA PARA O STREAMLIT
 # ==========================================================
-@st.cache_data(ttl=30)
-def fetch_agendamentos(unidade_id=None, start_date=None, end_date=None):
+def _parse_data(d):
+    """Converte date/datetime/'DD-MM-YYYY'/'YYYY-MM-DD' em date (None se não reconhecer)."""
+    if d is None or d == "":
+        return None
+    if isinstance(d, datetime):
+        return d.date()
+    if isinstance(d, date):
+        return d
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(str(d).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+# Âncora das fatias (uma segunda-feira): com chunk_days=7 as fatias coincidem com semanas Seg–Dom,
+# então consultas sobrepostas geram as mesmas fatias internas e reaproveitam o cache.
+_CHUNK_EPOCH = date(2024, 1, 1)
+
+def _dividir_periodo(dt_start, dt_end, chunk_days):
+    """Divide [dt_start, dt_end] em fatias alinhadas a múltiplos de chunk_days (bordas recortadas)."""
+    chunk_days = max(1, int(chunk_days))
+    fatias = []
+    atual = dt_start
+    while atual <= dt_end:
+        offset = (atual - _CHUNK_EPOCH).days % chunk_days
+        fim_fatia = min(atual + timedelta(days=chunk_days - 1 - offset), dt_end)
+        fatias.append((atual, fim_fatia))
+        atual = fim_fatia + timedelta(days=1)
+    return fatias
+
+def _fetch_agendamentos_fatia(unidade_id=None, start_date=None, end_date=None):
     """
-    Busca agendamentos no período via API.
+    Uma única chamada ao endpoint de agendamentos.
+    Retorna None em caso de erro da API (para não confundir falha com "dia sem agendamentos").
     """
     ctx = {}
     if start_date: ctx['data_start'] = start_date
@@ -207,22 +567,175 @@ def fetch_agendamentos(unidade_id=None, start_date=None, end_date=None):
     if unidade_id: ctx['unidade_id'] = unidade_id
 
     raw = _call_endpoint('appointments', context=ctx)
-    df = _normalize_df(raw, nested_key='content')
+    if raw is None:
+        return None
+    return _normalize_df(raw, nested_key='content')
+
+# ==========================================================
+# CACHE DE AGENDAMENTOS POR DIA (compartilhado entre sessões)
+# ==========================================================
+# Chave: (unidade canônica ou None = todas, date). Qualquer período é respondido
+# a partir dos dias já em cache e só os dias faltantes vão para a API.
+_AGENDA_DIA_CACHE = {}
+_AGENDA_DIA_LOCK = threading.Lock()
+_AGENDA_DIA_MAX_ENTRADAS = 5000
+
+def _canonical_unidade(unidade_id):
+    """None/''/0/'Todas' → None; '12', 12.0, np.int64(12) → 12."""
+    if unidade_id is None:
+        return None
+    try:
+        if pd.isna(unidade_id):
+            return None
+    except (TypeError, ValueError):
+        pass
+    try:
+        valor = int(float(str(unidade_id).strip()))
+    except ValueError:
+        return None
+    return valor or None
+
+def _agenda_dia_ttl():
+    return float(get_api_settings().ENDPOINTS.get('appointments', {}).get('cache_ttl_seconds', 30))
+
+def _agenda_dia_get(unidade, dia, agora):
+    item = _AGENDA_DIA_CACHE.get((unidade, dia))
+    if item is None or item[0] < agora:
+        return None
+    return item[1]
+
+def _agenda_dia_lookup(unidade, dia, agora):
+    """Procura o dia no cache da unidade; se não houver, filtra o dia cacheado de 'todas as unidades'."""
+    with _AGENDA_DIA_LOCK:
+        df = _agenda_dia_get(unidade, dia, agora)
+        if df is not None or unidade is None:
+            return df
+        df_todas = _agenda_dia_get(None, dia, agora)
+
+    if df_todas is None:
+        return None
+    if df_todas.empty or 'unidade_id' not in df_todas.columns:
+        return df_todas.iloc[0:0]
+    return df_todas[pd.to_numeric(df_todas['unidade_id'], errors='coerce') == unidade]
+
+def _agenda_dia_store(unidade, dt_start, dt_end, df, agora):
+    """Quebra o resultado de uma fatia por dia e grava cada dia (inclusive os vazios)."""
+    if df is None:
+        return
+
+    if not df.empty and 'data' in df.columns:
+        dias = pd.to_datetime(df['data'], format="%d-%m-%Y", errors='coerce')
+        mask_nat = dias.isna()
+        if mask_nat.any():
+            dias[mask_nat] = pd.to_datetime(df.loc[mask_nat, 'data'], errors='coerce')
+        # Linhas sem data reconhecível ficam no primeiro dia da fatia para não se perderem
+        dias = dias.dt.date.where(dias.notna(), dt_start)
+        grupos = {d: g for d, g in df.groupby(dias.values, sort=False)}
+    else:
+        grupos = {}
+
+    vazio = df.iloc[0:0]
+    expira = agora + _agenda_dia_ttl()
+    with _AGENDA_DIA_LOCK:
+        dia = dt_start
+        while dia <= dt_end:
+            _AGENDA_DIA_CACHE[(unidade, dia)] = (expira, grupos.get(dia, vazio))
+            dia += timedelta(days=1)
+
+        if len(_AGENDA_DIA_CACHE) > _AGENDA_DIA_MAX_ENTRADAS:
+            for chave in [k for k, v in _AGENDA_DIA_CACHE.items() if v[0] < agora]:
+                del _AGENDA_DIA_CACHE[chave]
+            excesso = len(_AGENDA_DIA_CACHE) - _AGENDA_DIA_MAX_ENTRADAS
+            for chave in sorted(_AGENDA_DIA_CACHE, key=lambda k: _AGENDA_DIA_CACHE[k][0])[:max(0, excesso)]:
+                del _AGENDA_DIA_CACHE[chave]
+
+def limpar_cache_agendamentos():
+    with _AGENDA_DIA_LOCK:
+        _AGENDA_DIA_CACHE.clear()
+
+def _agrupar_dias_consecutivos(dias):
+    """[d1, d2, d3, d7] → [(d1, d3), (d7, d7)]"""
+    blocos = []
+    for dia in sorted(dias):
+        if blocos and dia == blocos[-1][1] + timedelta(days=1):
+            blocos[-1][1] = dia
+        else:
+            blocos.append([dia, dia])
+    return [tuple(b) for b in blocos]
+
+def fetch_agendamentos(unidade_id=None, start_date=None, end_date=None):
+    """
+    Busca agendamentos no período via API.
+    Usa um cache por dia (datas e unidade canonicalizadas): dias já em cache são
+    reaproveitados e apenas os faltantes são buscados, em fatias (`chunk_days` do
+    endpoint 'appointments') paralelas. Pedidos de uma unidade também são
+    atendidos filtrando o dia de "todas as unidades", quando disponível.
+    O resultado é unido e deduplicado por agendamento_id.
+    """
+    dt_start = _parse_data(start_date)
+    dt_end = _parse_data(end_date)
+    unidade = _canonical_unidade(unidade_id)
+
+    # Sem período completo (ou formato desconhecido): chamada única, como a API espera
+    if dt_start is None or dt_end is None or dt_end < dt_start:
+        df = _fetch_agendamentos_fatia(unidade_id=unidade, start_date=start_date, end_date=end_date)
+        return df if df is not None else pd.DataFrame()
+
+    agora = _time.time()
+    por_dia = {}
+    faltantes = []
+    dia = dt_start
+    while dia <= dt_end:
+        df_dia = _agenda_dia_lookup(unidade, dia, agora)
+        if df_dia is None:
+            faltantes.append(dia)
+        else:
+            por_dia[dia] = df_dia
+        dia += timedelta(days=1)
+
+    if faltantes:
+        chunk_days = get_api_settings().ENDPOINTS.get('appointments', {}).get('chunk_days', 7)
+        pedidos = [
+            {
+                'unidade_id': unidade,
+                'start_date': ini.strftime("%d-%m-%Y"),
+                'end_date': fim.strftime("%d-%m-%Y"),
+            }
+            for bloco_ini, bloco_fim in _agrupar_dias_consecutivos(faltantes)
+            for ini, fim in _dividir_periodo(bloco_ini, bloco_fim, chunk_days)
+        ]
+
+        for pedido, df_fatia in zip(pedidos, _executar_em_lote(_fetch_agendamentos_fatia, pedidos)):
+            ini = _parse_data(pedido['start_date'])
+            fim = _parse_data(pedido['end_date'])
+            # Fatia com erro não entra no cache (será tentada de novo na próxima consulta)
+            _agenda_dia_store(unidade, ini, fim, df_fatia, agora)
+            if df_fatia is not None:
+                por_dia[ini] = df_fatia
+
+    # Monta em ordem cronológica (dias do cache e fatias novas intercalados)
+    frames = [por_dia[d] for d in sorted(por_dia) if por_dia[d] is not None and not por_dia[d].empty]
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    if 'agendamento_id' in df.columns:
+        df = df.drop_duplicates(subset=['agendamento_id']).reset_index(drop=True)
     return df
 
-@st.cache_data(ttl=3600)
+@cache_data(ttl=3600)
 def list_profissionals():
     raw = _call_endpoint('list-professional')
     df = _normalize_df(raw, nested_key='content')
     return df
 
-@st.cache_data(ttl=3600)
+@cache_data(ttl=3600)
 def list_especialidades():
     raw = _call_endpoint("list-specialties")
     df = _normalize_df(raw, nested_key="content")
     return df
 
-@st.cache_data(ttl=3600)
+@cache_data(ttl=3600)
 def list_salas(unidade_id=None):
     raw = _call_endpoint("list-local")
     df = _normalize_df(raw, nested_key="content")
@@ -237,7 +750,7 @@ def list_salas(unidade_id=None):
     df['local'] = df['local'].map(salas_map_cambui).fillna(df['local'])
     return df
 
-@st.cache_data(ttl=3600)    
+@cache_data(ttl=3600)    
 def list_unidades():
     """
     Extrai a lista de unidades baseada no histórico de agendamentos.
@@ -246,7 +759,7 @@ def list_unidades():
     from datetime import datetime, timedelta
     
     # Define um período amplo para garantir que tragamos dados das unidades
-    today = datetime.now()
+    today = relogio.agora()
     start_date = (today - timedelta(days=10)).strftime("%d-%m-%Y")
     end_date = today.strftime("%d-%m-%Y")
     
@@ -276,7 +789,7 @@ def list_unidades():
             
     return df
 
-#@st.cache_data(ttl=300)
+@cache_data(ttl=300)
 def list_blocks(unidade_id=None, start_date=None, end_date=None, profissional_id=None):
     """
     Busca bloqueios de agenda.
@@ -295,7 +808,7 @@ def list_blocks(unidade_id=None, start_date=None, end_date=None, profissional_id
         if isinstance(d_input, datetime): return d_input.date()
         return d_input
 
-    dt_start = parse_to_date(start_date, date.today())
+    dt_start = parse_to_date(start_date, relogio.hoje())
     dt_end = parse_to_date(end_date, dt_start + timedelta(days=30))
 
     # Converte para ISO (obrigatório da API)
@@ -335,13 +848,13 @@ def list_blocks(unidade_id=None, start_date=None, end_date=None, profissional_id
 # ===================================
 # CONSULTA DE PACIENTES
 # ===================================
-@st.cache_data(ttl=600)
+@cache_data(ttl=600)
 def get_patient_by_id(patient_id):
     patient_id = int(patient_id)
     
     ep_cfg = {
         "name": "patient-search",
-        "url": "https://api.feegow.com/v1/api/patient/search",
+        "url": trocar_base_url("https://api.feegow.com/v1/api/patient/search", get_api_settings().base_url),
         "method": "GET",
         "needs_body": True,
         "body_template": {"paciente_id": patient_id},
@@ -372,7 +885,7 @@ def get_patient_name_by_id(patient_id):
         return paciente.get('nome')
     return None
 
-@st.cache_data(ttl=30)
+@cache_data(ttl=30)
 def fetch_agendamentos_completos(start_date, end_date, unidade_id=None):
     """
     Retorna agendamentos completos (com joins).
@@ -433,10 +946,7 @@ def fetch_agendamentos_completos(start_date, end_date, unidade_id=None):
 
     return df
 
-def fetch_horarios_disponiveis(unidade_id, data_start, data_end, profissional_id, tipo='E', especialidade_id=None, procedimento_id=None):
-    """
-    Busca slots livres garantindo tipos numéricos e chaves limpas.
-    """
+def _contexto_horarios(unidade_id, data_start, data_end, profissional_id, tipo='E', especialidade_id=None, procedimento_id=None):
     # Criamos o contexto apenas com o essencial
     def format_if_date(d):
         if isinstance(d, (date, datetime)):
@@ -456,9 +966,18 @@ def fetch_horarios_disponiveis(unidade_id, data_start, data_end, profissional_id
         ctx['especialidade_id'] = int(especialidade_id)
     elif tipo == 'P' and procedimento_id:
         ctx['procedimento_id'] = int(procedimento_id)
+    return ctx
 
+def fetch_horarios_disponiveis(unidade_id, data_start, data_end, profissional_id, tipo='E', especialidade_id=None, procedimento_id=None):
+    """
+    Busca slots livres garantindo tipos numéricos e chaves limpas.
+    """
+    ctx = _contexto_horarios(unidade_id, data_start, data_end, profissional_id, tipo, especialidade_id, procedimento_id)
     raw = _call_endpoint('available-schedule', context=ctx)
-    
+    return _parse_horarios(raw)
+
+def _parse_horarios(raw):
+    """Achata o retorno de available-schedule (profissional → local → data → horários) em linhas."""
     lista_final = []
     if isinstance(raw, dict) and 'content' in raw:
         content = raw['content']
@@ -477,49 +996,161 @@ def fetch_horarios_disponiveis(unidade_id, data_start, data_end, profissional_id
                                     "profissional_id": int(p_id),
                                     "local_id": int(l_id)
                                 })
-                            
+
     return pd.DataFrame(lista_final)
 
+def fetch_horarios_disponiveis_lote(pedidos, max_workers=None, on_progress=None):
+    """
+    Busca horários disponíveis de vários profissionais de uma vez, em paralelo.
+
+    Cada pedido é um dict com os argumentos de `fetch_horarios_disponiveis`
+    (unidade_id, data_start, data_end, profissional_id, especialidade_id, ...) e,
+    opcionalmente, 'extras': dict de colunas fixas a injetar nas linhas daquele pedido.
+    Falhas de um pedido não afetam os demais. Retorna um único DataFrame concatenado.
+    """
+    chamadas = []
+    extras = []
+    for pedido in pedidos:
+        kw = dict(pedido)
+        extras.append(kw.pop('extras', None) or {})
+        chamadas.append(kw)
+
+    resultados = _executar_em_lote(fetch_horarios_disponiveis, chamadas, max_workers=max_workers, on_progress=on_progress)
+
+    frames = []
+    for df, cols in zip(resultados, extras):
+        if df is None or df.empty:
+            continue
+        for col, valor in cols.items():
+            df[col] = valor
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+# ==========================================================
+# SONDAGEM DE OCIOSOS POR SEMANA
+# ==========================================================
+# A grade de quem não tem agendamento (varredura complementar) é consultada pela semana
+# inteira (Seg–Dom) e guardada por (unidade, profissional, especialidade, segunda-feira):
+# o semanal e os diários da mesma semana reaproveitam a mesma sondagem.
+# TTL = cache_ttl_seconds do endpoint available-schedule.
+_OCIOSOS_SEMANA_CACHE = {}
+_OCIOSOS_SEMANA_LOCK = threading.Lock()
+_OCIOSOS_SEMANA_MAX_ENTRADAS = 20000
+
+def _ociosos_semana_ttl():
+    return float(get_api_settings().ENDPOINTS.get('available-schedule', {}).get('cache_ttl_seconds', 120))
+
+def _fetch_horarios_semana(**kw):
+    """Uma consulta de grade; None em caso de erro da API (falha não é cacheada como "sem grade")."""
+    raw = _call_endpoint('available-schedule', context=_contexto_horarios(**kw))
+    if raw is None:
+        return None
+    return _parse_horarios(raw)
+
+def limpar_cache_ociosos():
+    with _OCIOSOS_SEMANA_LOCK:
+        _OCIOSOS_SEMANA_CACHE.clear()
+
+def fetch_horarios_ociosos_lote(pedidos, max_workers=None, on_progress=None, varredura=None):
+    """
+    Mesmo contrato de `fetch_horarios_disponiveis_lote`, para a varredura de ociosos:
+    cada pedido é respondido pela grade da semana dele (cacheada; as faltantes são
+    buscadas em paralelo) recortada para [data_start, data_end]. Pedidos que
+    atravessam mais de uma semana vão direto para a API.
+    `varredura` (dict opcional) recebe o que a sondagem cobriu antes do recorte, para o
+    elenco (core.roster): 'profissionais' com horário em alguma semana consultada (inteira),
+    'ultimo_dia' coberto e 'erros' (consultas que falharam).
+    """
+    agora = _time.time()
+    planos = []      # (chave da semana ou None, kwargs diretos, extras, ini, fim)
+    faltantes = {}   # chave → kwargs da consulta da semana
+    for pedido in pedidos:
+        kw = dict(pedido)
+        extras = kw.pop('extras', None) or {}
+        ini, fim = _parse_data(kw.get('data_start')), _parse_data(kw.get('data_end'))
+        if ini is None or fim is None or fim < ini or (ini - timedelta(days=ini.weekday())) != (fim - timedelta(days=fim.weekday())):
+            planos.append((None, kw, extras, ini, fim))
+            continue
+
+        segunda = ini - timedelta(days=ini.weekday())
+        chave = (_canonical_unidade(kw.get('unidade_id')), int(kw['profissional_id']), int(kw.get('especialidade_id') or 0), segunda)
+        planos.append((chave, kw, extras, ini, fim))
+        with _OCIOSOS_SEMANA_LOCK:
+            item = _OCIOSOS_SEMANA_CACHE.get(chave)
+        if (item is None or item[0] < agora) and chave not in faltantes:
+            faltantes[chave] = dict(kw, data_start=segunda, data_end=segunda + timedelta(days=6))
+
+    diretos = [kw for chave, kw, _, _, _ in planos if chave is None]
+    chamadas = list(faltantes.values()) + diretos
+    resultados = _executar_em_lote(_fetch_horarios_semana, chamadas, max_workers=max_workers, on_progress=on_progress)
+
+    semanas = {}
+    expira = agora + _ociosos_semana_ttl()
+    with _OCIOSOS_SEMANA_LOCK:
+        for chave, df in zip(faltantes, resultados):
+            if df is not None:
+                _OCIOSOS_SEMANA_CACHE[chave] = (expira, df)
+            semanas[chave] = df
+        for chave, _, _, _, _ in planos:
+            if chave is not None and chave not in semanas:
+                item = _OCIOSOS_SEMANA_CACHE.get(chave)
+                semanas[chave] = item[1] if item is not None else None
+        if len(_OCIOSOS_SEMANA_CACHE) > _OCIOSOS_SEMANA_MAX_ENTRADAS:
+            for chave in [k for k, v in _OCIOSOS_SEMANA_CACHE.items() if v[0] < agora]:
+                del _OCIOSOS_SEMANA_CACHE[chave]
+    respostas_diretas = iter(resultados[len(faltantes):])
+
+    frames = []
+    if varredura is not None:
+        varredura.update(profissionais=set(), ultimo_dia=None, erros=0)
+    for chave, kw, extras, ini, fim in planos:
+        if chave is None:
+            df = next(respostas_diretas)
+            ultimo_dia = fim
+        else:
+            df = semanas.get(chave)
+            ultimo_dia = chave[3] + timedelta(days=6)
+        if varredura is not None:
+            _anotar_varredura(varredura, kw, df, ultimo_dia)
+        if chave is not None and df is not None and not df.empty:
+            dias = ordinal_dia(df['data'])
+            df = df[(dias >= ini.toordinal()) & (dias <= fim.toordinal())]
+        if df is None or df.empty:
+            continue
+        df = df.copy()
+        for col, valor in extras.items():
+            df[col] = valor
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+def _anotar_varredura(varredura, kw, df, ultimo_dia):
+    if df is None:
+        varredura['erros'] += 1
+        return
+    if not df.empty:
+        varredura['profissionais'].add(int(kw['profissional_id']))
+    if ultimo_dia is not None and (varredura['ultimo_dia'] is None or ultimo_dia > varredura['ultimo_dia']):
+        varredura['ultimo_dia'] = ultimo_dia
+
 def get_main_specialty_id(profissional_id):
     """
     Busca o ID da primeira especialidade vinculada ao profissional.
     Útil para preencher o requisito obrigatório da API de disponibilidade.
+    Consulta O(1) no registro de dimensões (core.registry), montado uma vez por atualização.
     """
-    # Usa a função que já existe no seu projeto para listar profissionais
-    # Se ela retorna um DataFrame, filtramos ele.
-    df_prof = list_profissionals() 
-    
-    if df_prof.empty:
-        return None
-        
-    # Garante tipos compatíveis
-    profissional_id = int(profissional_id)
-    
-    # Filtra o profissional
-    prof_data = df_prof[df_prof['profissional_id'] == profissional_id]
-    
-    if prof_data.empty:
-        return None
-    
-    # Tenta extrair o especialidade_id
-    # O formato depende de como o 'list_profissionals' normaliza os dados.
-    # Geralmente vem numa coluna 'especialidade_id' ou dentro de uma lista 'especialidades'
-    
+    from core.registry import get_registry
+
     try:
-        # Opção A: Se o dataframe já tem a coluna direta (seu código atual faz merge, então deve ter)
-        if 'especialidade_id' in prof_data.columns:
-            return int(prof_data.iloc[0]['especialidade_id'])
-            
-        # Opção B: Se estiver aninhado (lista de dicts)
-        if 'especialidades' in prof_data.columns:
-            specs = prof_data.iloc[0]['especialidades']
-            if isinstance(specs, list) and len(specs) > 0:
-                return int(specs[0]['especialidade_id'])
-                
+        return get_registry().main_specialty(profissional_id)
     except Exception as e:
         print(f"Erro ao extrair especialidade: {e}")
-        
-    return None
+        return None
 
 # Evita que o código rode sozinho ao importar
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from core.time_columns import ORDINAL_EPOCH, coluna_dia_ord, coluna_segundo
+
+# ==========================================================
+# ÍNDICE COMPILADO DE BLOQUEIOS DE AGENDA
+# ==========================================================
+# Cada bloqueio vale para um intervalo de datas e, em cada dia, para uma faixa de horário.
+# Na compilação ele é expandido uma única vez em intervalos diários [início, fim] (em segundos),
+# agrupados por (profissional, dia) ou só por dia (bloqueios globais), e os intervalos de um
+# mesmo grupo são fundidos. Cada grupo ocupa uma faixa própria de uma chave inteira
+# (grupo * 86400 + segundo do dia), então a consulta dos slots vira um único searchsorted.
+
+SEGUNDOS_DIA = 86400
+_ORDINAL_EPOCH = ORDINAL_EPOCH
+_FATOR_PROF = 1_000_000  # > qualquer ordinal de data: separa (profissional, dia) na chave
+
+
+def _to_int_set(units):
+    """Normaliza a lista de unidades do bloqueio (['12'], [12], ['0']) para um set de int."""
+    out = set()
+    if isinstance(units, (list, tuple, set, np.ndarray)):
+        for u in units:
+            try:
+                out.add(int(u))
+            except (TypeError, ValueError):
+                pass
+    return out
+
+
+def _legacy_unit(valor):
+    try:
+        return int(valor) if valor is not None else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+def _bloqueio_se_aplica(units, legacy_uid, target_unit):
+    """Mesma regra do filtro original: lista 'units' (0 = todas) ou coluna antiga unidade_id."""
+    if target_unit is None:
+        return True
+    if isinstance(units, (list, tuple, set, np.ndarray)) and len(units) > 0:
+        clean = _to_int_set(units)
+        return target_unit in clean or 0 in clean
+    legacy = _legacy_unit(legacy_uid)
+    return legacy == 0 or legacy == target_unit
+
+
+def _time_to_seconds(t, default):
+    if isinstance(t, str):
+        t = pd.to_datetime(t, format="%H:%M:%S", errors="coerce")
+    if t is None or (not hasattr(t, "hour")) or pd.isna(t):
+        return default
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+def _coalesce(starts, ends):
+    """Funde intervalos [s, e] sobrepostos (entradas já ordenadas por início)."""
+    if len(starts) == 0:
+        return starts, ends
+    max_end = np.maximum.accumulate(ends)
+    novo = np.empty(len(starts), dtype=bool)
+    novo[0] = True
+    novo[1:] = starts[1:] > max_end[:-1]
+    idx = np.flatnonzero(novo)
+    fim_grupo = np.append(idx[1:], len(starts)) - 1
+    return starts[idx], max_end[fim_grupo]
+
+
+class BlockIndex:
+    """Intervalos de bloqueio fundidos, prontos para consulta vetorizada."""
+
+    __slots__ = ("global_starts", "global_ends", "prof_starts", "prof_ends", "n_blocks")
+
+    def __init__(self, global_starts, global_ends, prof_starts, prof_ends, n_blocks):
+        self.global_starts = global_starts
+        self.global_ends = global_ends
+        self.prof_starts = prof_starts
+        self.prof_ends = prof_ends
+        self.n_blocks = n_blocks
+
+    @property
+    def empty(self):
+        return len(self.global_starts) == 0 and len(self.prof_starts) == 0
+
+
+def compile_block_index(df_blocks, unidade_id=None):
+    """
+    Compila o DataFrame de `list_blocks` em um BlockIndex para a unidade alvo
+    (None = aplica todos os bloqueios, como no mapa geral).
+    """
+    vazio = np.empty(0, dtype=np.int64)
+    if df_blocks is None or df_blocks.empty:
+        return BlockIndex(vazio, vazio, vazio, vazio, 0)
+
+    target_unit = int(unidade_id) if unidade_id else None
+    n = len(df_blocks)
+
+    def col(nome):
+        return df_blocks[nome].tolist() if nome in df_blocks.columns else [None] * n
+
+    aplica = np.fromiter(
+        (_bloqueio_se_aplica(u, l, target_unit) for u, l in zip(col("units"), col("unidade_id"))),
+        dtype=bool, count=n,
+    )
+
+    ds = pd.to_datetime(pd.Series(col("date_start")), errors="coerce")
+    de = pd.to_datetime(pd.Series(col("date_end")), errors="coerce")
+    valido = aplica & ds.notna().to_numpy() & de.notna().to_numpy()
+    if not valido.any():
+        return BlockIndex(vazio, vazio, vazio, vazio, 0)
+
+    d0 = ds.to_numpy()[valido].astype("datetime64[D]").astype(np.int64) + _ORDINAL_EPOCH
+    d1 = de.to_numpy()[valido].astype("datetime64[D]").astype(np.int64) + _ORDINAL_EPOCH
+    t0 = np.array([_time_to_seconds(t, 0) for t in col("time_start")], dtype=np.int64)[valido]
+    t1 = np.array([_time_to_seconds(t, SEGUNDOS_DIA - 1) for t in col("time_end")], dtype=np.int64)[valido]
+    prof = pd.to_numeric(pd.Series(col("professional_id")), errors="coerce").fillna(0).astype(np.int64).to_numpy()[valido]
+
+    # Expande cada bloqueio em um intervalo por dia
+    n_dias = np.clip(d1 - d0 + 1, 0, None)
+    rep = np.repeat(np.arange(len(d0)), n_dias)
+    offset = np.arange(rep.size) - np.repeat(np.cumsum(n_dias) - n_dias, n_dias)
+    dia = d0[rep] + offset
+    ini, fim, pr = t0[rep], t1[rep], prof[rep]
+    ok = fim >= ini
+    dia, ini, fim, pr = dia[ok], ini[ok], fim[ok], pr[ok]
+
+    def montar(grupo, ini, fim):
+        starts = grupo * SEGUNDOS_DIA + ini
+        ends = grupo * SEGUNDOS_DIA + fim
+        ordem = np.argsort(starts, kind="stable")
+        return _coalesce(starts[ordem], ends[ordem])
+
+    glob = pr <= 0
+    g_starts, g_ends = montar(dia[glob], ini[glob], fim[glob])
+    p_starts, p_ends = montar(pr[~glob] * _FATOR_PROF + dia[~glob], ini[~glob], fim[~glob])
+
+    return BlockIndex(g_starts, g_ends, p_starts, p_ends, int(valido.sum()))
+
+
+class BlockSnapshot:
+    """
+    Bloqueios de um período, buscados uma única vez por geração de mapa e
+    repassados explicitamente a todas as etapas de filtro. O índice compilado
+    é memorizado por unidade.
+    """
+
+    def __init__(self, df_blocks, start_date=None, end_date=None):
+        self.df = df_blocks if df_blocks is not None else pd.DataFrame()
+        self.start_date = start_date
+        self.end_date = end_date
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    @property
+    def empty(self):
+        return self.df.empty
+
+    def index(self, unidade_id=None):
+        chave = int(unidade_id) if unidade_id else None
+        with self._lock:
+            idx = self._indices.get(chave)
+            if idx is None:
+                idx = compile_block_index(self.df, unidade_id=chave)
+                self._indices[chave] = idx
+        return idx
+
+
+def _hits(starts, ends, keys, valid):
+    if len(starts) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    pos = np.searchsorted(starts, keys, side="right") - 1
+    hit = pos >= 0
+    hit &= keys <= ends[np.clip(pos, 0, None)]
+    return hit & valid
+
+
+def blocked_mask(index, day_ordinals, seconds, profs):
+    """
+    Máscara booleana dos slots bloqueados.
+    day_ordinals/seconds usam -1 para data/horário não reconhecidos (nunca bloqueados).
+    """
+    day_ordinals = np.asarray(day_ordinals, dtype=np.int64)
+    seconds = np.asarray(seconds, dtype=np.int64)
+    profs = np.asarray(profs, dtype=np.int64)
+    valid = (day_ordinals >= 0) & (seconds >= 0)
+
+    mask = _hits(index.global_starts, index.global_ends, day_ordinals * SEGUNDOS_DIA + seconds, valid)
+    prof_keys = (profs * _FATOR_PROF + day_ordinals) * SEGUNDOS_DIA + seconds
+    mask |= _hits(index.prof_starts, index.prof_ends, prof_keys, valid & (profs > 0))
+    return mask
+
+
+def slot_arrays(df_slots):
+    """
+    Extrai (ordinal do dia, segundo do dia, profissional) dos slots. Usa as colunas
+    inteiras 'dia_ord'/'segundo' (core.time_columns) quando já calculadas; senão faz o
+    parse de 'data'/'horario'. Os segundos do horário são mantidos (08:15:30 ≠ 08:15:00),
+    como na comparação original por datetime.time.
+    """
+    dias = coluna_dia_ord(df_slots).astype(np.int64)
+    segundos = coluna_segundo(df_slots).astype(np.int64)
+
+    if "profissional_id" in df_slots.columns:
+        profs = pd.to_numeric(df_slots["profissional_id"], errors="coerce").fillna(0).astype(np.int64).to_numpy()
+    else:
+        profs = np.zeros(len(df_slots), dtype=np.int64)
+
+    return dias, segundos, profs
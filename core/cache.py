@@ -0,0 +1,222 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import threading
+import time
+from datetime import timedelta
+
+# ==========================================================
+# CACHE / SEGREDOS COM BACKEND PLUGÁVEL (STREAMLIT OU PROCESSO)
+# ==========================================================
+# O core usava st.cache_data / st.cache_resource / st.secrets direto, o que só
+# funciona de verdade dentro do app. Estes decoradores escolhem o backend na hora
+# da chamada:
+#   - "streamlit": delega para st.cache_data / st.cache_resource (comportamento do app);
+#   - "memory":    cache em memória do próprio processo, com TTL (CLI, cron, scripts).
+# Padrão ("auto"): streamlit se houver runtime do Streamlit ativo, senão memory.
+# Pode ser fixado por FEEGOW_CACHE_BACKEND ou por set_cache_backend().
+
+_BACKENDS = ("auto", "streamlit", "memory")
+_backend = os.getenv("FEEGOW_CACHE_BACKEND", "auto").strip().lower() or "auto"
+
+
+def set_cache_backend(nome):
+    """Fixa o backend de cache ("auto", "streamlit" ou "memory")."""
+    global _backend
+    nome = (nome or "auto").strip().lower()
+    if nome not in _BACKENDS:
+        raise ValueError(f"Backend de cache inválido: {nome!r} (use {', '.join(_BACKENDS)})")
+    _backend = nome
+
+
+def em_streamlit():
+    """True se estamos rodando dentro de um app Streamlit (runtime ativo)."""
+    try:
+        from streamlit.runtime import exists
+        return exists()
+    except Exception:
+        return False
+
+
+def _backend_ativo():
+    if _backend == "auto":
+        return "streamlit" if em_streamlit() else "memory"
+    return _backend
+
+
+def _ttl_segundos(ttl):
+    if ttl is None:
+        return None
+    if isinstance(ttl, timedelta):
+        return ttl.total_seconds()
+    return float(ttl)
+
+
+def _chave(args, kwargs):
+    chave = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(chave)
+        return chave
+    except TypeError:
+        # Argumento não hashável (DataFrame, lista, dict...): digest do conteúdo, como o
+        # st.cache_data. repr() não serve: o pandas/numpy truncam a representação e dois
+        # argumentos diferentes dariam a mesma chave.
+        return ("sha256", hash_conteudo(chave))
+
+
+def hash_conteudo(obj):
+    """SHA-256 (hex) do conteúdo de `obj`; TypeError se houver algo que não dá para hashear."""
+    h = hashlib.sha256()
+    _atualizar_digest(h, obj)
+    return h.hexdigest()
+
+
+def _atualizar_digest(h, obj):
+    """Alimenta `h` com o conteúdo de `obj` (tipo incluso); TypeError se não der para hashear."""
+    h.update(type(obj).__qualname__.encode())
+    pd = sys.modules.get("pandas")  # só olha para pandas/numpy se já foram importados
+    np = sys.modules.get("numpy")
+    if pd is not None and isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+        try:
+            h.update(pd.util.hash_pandas_object(obj, index=not isinstance(obj, pd.Index)).to_numpy().tobytes())
+            h.update(repr(obj.dtypes if isinstance(obj, pd.DataFrame) else obj.dtype).encode())
+            if isinstance(obj, pd.DataFrame):
+                _atualizar_digest(h, list(obj.columns))
+            else:
+                _atualizar_digest(h, obj.name)
+            return
+        except TypeError:
+            pass  # células não hasheáveis (listas, dicts): cai no pickle abaixo
+    elif np is not None and isinstance(obj, np.ndarray) and obj.dtype != object:
+        h.update(f"{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+        return
+    elif isinstance(obj, (list, tuple)):
+        h.update(str(len(obj)).encode())
+        for item in obj:
+            _atualizar_digest(h, item)
+        return
+    elif isinstance(obj, dict):
+        h.update(str(len(obj)).encode())
+        for k, v in sorted(obj.items(), key=lambda kv: repr(kv[0])):
+            _atualizar_digest(h, k)
+            _atualizar_digest(h, v)
+        return
+    elif isinstance(obj, (set, frozenset)):
+        h.update(str(len(obj)).encode())
+        for d in sorted(hash_conteudo(item) for item in obj):
+            h.update(d.encode())
+        return
+
+    try:
+        h.update(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception as e:
+        raise TypeError(f"argumento não hashável para o cache: {type(obj).__name__} ({e})") from e
+
+
+class _MemoriaTTL:
+    """Memoização por argumentos com TTL, segura entre threads."""
+
+    def __init__(self, ttl, copiar):
+        self.ttl = _ttl_segundos(ttl)
+        self.copiar = copiar  # cache_data devolve cópia (como o Streamlit); cache_resource, o próprio objeto
+        self._dados = {}
+        self._lock = threading.Lock()
+
+    def chamar(self, func, args, kwargs):
+        chave = _chave(args, kwargs)
+        agora = time.monotonic()
+        with self._lock:
+            item = self._dados.get(chave)
+        if item is not None and (item[0] is None or item[0] > agora):
+            valor = item[1]
+        else:
+            resultado = func(*args, **kwargs)
+            valor = pickle.dumps(resultado, protocol=pickle.HIGHEST_PROTOCOL) if self.copiar else resultado
+            expira = agora + self.ttl if self.ttl is not None else None
+            with self._lock:
+                self._dados[chave] = (expira, valor)
+        return pickle.loads(valor) if self.copiar else valor
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+
+
+def _decorador(st_decorador, copiar, ttl, st_kwargs):
+    def envolver(func):
+        memoria = _MemoriaTTL(ttl, copiar)
+        versao_st = []  # criada só no primeiro uso com o Streamlit (evita avisos de "no runtime" no import)
+
+        def com_streamlit():
+            if not versao_st:
+                import streamlit as st
+                versao_st.append(getattr(st, st_decorador)(ttl=ttl, **st_kwargs)(func))
+            return versao_st[0]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _backend_ativo() == "streamlit":
+                return com_streamlit()(*args, **kwargs)
+            return memoria.chamar(func, args, kwargs)
+
+        def clear():
+            if versao_st:
+                versao_st[0].clear()
+            memoria.clear()
+
+        wrapper.clear = clear
+        return wrapper
+
+    return envolver
+
+
+def cache_data(func=None, *, ttl=None, **st_kwargs):
+    """Equivalente a st.cache_data (resultado copiado a cada leitura)."""
+    if func is not None:
+        return _decorador("cache_data", True, ttl, st_kwargs)(func)
+    return _decorador("cache_data", True, ttl, st_kwargs)
+
+
+def cache_resource(func=None, *, ttl=None, **st_kwargs):
+    """Equivalente a st.cache_resource (mesmo objeto compartilhado)."""
+    if func is not None:
+        return _decorador("cache_resource", False, ttl, st_kwargs)(func)
+    return _decorador("cache_resource", False, ttl, st_kwargs)
+
+
+# ==========================================================
+# SEGREDOS E ERROS FATAIS
+# ==========================================================
+def get_secret(nome, padrao=None):
+    """
+    Lê um segredo: no app, st.secrets primeiro e depois a variável de ambiente;
+    fora dele, a variável de ambiente primeiro (.streamlit/secrets.toml ainda vale se existir).
+    """
+    def do_streamlit():
+        try:
+            import streamlit as st
+            return st.secrets.get(nome)
+        except Exception:
+            return None
+
+    if _backend_ativo() == "streamlit":
+        valor = do_streamlit()
+        if valor is None:
+            valor = os.getenv(nome)
+    else:
+        valor = os.getenv(nome)
+        if valor is None:
+            valor = do_streamlit()
+    return padrao if valor is None else valor
+
+
+def erro_fatal(mensagem):
+    """No app: st.error + st.stop. Fora dele: RuntimeError com a mesma mensagem."""
+    if _backend_ativo() == "streamlit":
+        import streamlit as st
+        st.error(mensagem)
+        st.stop()
+    raise RuntimeError(mensagem)
@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from core.disk_cache import make_cache_key
+
+# ==========================================================
+# CASSETE HTTP (GRAVAÇÃO / REPRODUÇÃO DAS CHAMADAS À API)
+# ==========================================================
+# Modo "record": request_endpoint grava cada par requisição/resposta (endpoint,
+# corpo canônico, status, JSON) num arquivo por requisição em `pasta/<endpoint>/`.
+# Modo "replay": as respostas saem da pasta, sem rede e sem token; uma requisição
+# sem gravação vira erro (como uma falha da API), para o teste não ir à produção
+# por engano. Serve para medir a geração de mapas e o relatório de grade offline,
+# sempre com os mesmos dados.
+#
+# A chave é o nome do endpoint + corpo canônico (sem a URL): um cassete gravado
+# contra a API real reproduz com a URL apontando para outro servidor.
+#
+# Os corpos dependem de "hoje" (datas padrão, divisão passado/futuro dos geradores):
+# a gravação guarda o momento em `pasta/relogio.json` e, na reprodução, core.relogio
+# usa esse momento (FEEGOW_HOJE ainda tem precedência). Cassete sem relogio.json só
+# reproduz no dia em que foi gravado.
+
+MODOS = ("off", "record", "replay")
+ARQUIVO_RELOGIO = "relogio.json"
+
+
+def chave_cassete(endpoint, corpo):
+    return make_cache_key(endpoint, "", corpo)
+
+
+class Cassette:
+    def __init__(self, pasta, modo="replay", momento=None):
+        """
+        `momento` (só na gravação): o "agora" das requisições gravadas, guardado em
+        relogio.json. Na reprodução, `self.momento` é lido de lá (None se não houver).
+        """
+        if modo not in ("record", "replay"):
+            raise ValueError(f"modo de cassete inválido: {modo!r} (use record ou replay)")
+        self.pasta = Path(pasta)
+        self.modo = modo
+        self.momento = None
+        if modo == "record":
+            self.pasta.mkdir(parents=True, exist_ok=True)
+            self._gravar_momento(momento or datetime.now())
+        else:
+            self.momento = self._ler_momento()
+        self._lock = threading.Lock()
+        self.gravadas = 0
+        self.reproduzidas = 0
+        self.faltantes = 0
+
+    @property
+    def gravando(self):
+        return self.modo == "record"
+
+    @property
+    def reproduzindo(self):
+        return self.modo == "replay"
+
+    def _ler_momento(self):
+        try:
+            registro = json.loads((self.pasta / ARQUIVO_RELOGIO).read_text(encoding="utf-8"))
+            return datetime.fromisoformat(registro["agora"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _gravar_momento(self, momento):
+        anterior = self._ler_momento()
+        if anterior is not None:
+            # Regravação na mesma pasta: vale o primeiro momento (as chaves já gravadas dependem dele)
+            if anterior.date() != momento.date():
+                print(f"[CASSETE] {self.pasta} foi gravado em {anterior:%d-%m-%Y}; a reprodução usa essa data, "
+                      f"não {momento:%d-%m-%Y} (grave numa pasta nova)")
+            self.momento = anterior
+            return
+        (self.pasta / ARQUIVO_RELOGIO).write_text(
+            json.dumps({"agora": momento.isoformat(timespec="seconds")}), encoding="utf-8")
+        self.momento = momento
+
+    def _arquivo(self, endpoint, corpo):
+        return self.pasta / endpoint / f"{chave_cassete(endpoint, corpo)}.json"
+
+    def gravar(self, endpoint, metodo, url, corpo, status, resposta, erro=None):
+        """Grava uma resposta HTTP (inclusive de erro, para reproduzir o mesmo comportamento)."""
+        destino = self._arquivo(endpoint, corpo)
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        registro = {
+            "endpoint": endpoint,
+            "method": metodo,
+            "url": url,
+            "body": corpo,
+            "status": status,
+            "error": erro,
+            "json": resposta,
+        }
+        tmp = destino.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(registro, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+        os.replace(tmp, destino)
+        with self._lock:
+            self.gravadas += 1
+
+    def reproduzir(self, endpoint, corpo):
+        """Registro gravado ({'status', 'error', 'json', ...}) ou None se não houver."""
+        try:
+            registro = json.loads(self._arquivo(endpoint, corpo).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            with self._lock:
+                self.faltantes += 1
+            return None
+        with self._lock:
+            self.reproduzidas += 1
+        return registro
+
+    def stats(self):
+        with self._lock:
+            return {
+                "modo": self.modo,
+                "pasta": str(self.pasta),
+                "gravadas": self.gravadas,
+                "reproduzidas": self.reproduzidas,
+                "faltantes": self.faltantes,
+                "momento": self.momento.isoformat(timespec="seconds") if self.momento else None,
+            }
@@ -0,0 +1,183 @@
+"""
+Geração de mapas sem o Streamlit (cron / linha de comando).
+
+Uso:
+    python -m core.cli maps --week 08-12-2025 --units all --out mapas_gerados/
+    python -m core.cli maps --day 09-12-2025 --units "OURO VERDE" "CENTRO CAMBUI"
+    python -m core.cli maps --week 08-12-2025 --cassette replay --cassette-dir fixtures/semana/
+    python -m core.cli maps --day 09-12-2025 --today 09-12-2025      # "hoje" fixo (FEEGOW_HOJE)
+
+O token vem de FEEGOW_ACCESS_TOKEN (ambiente ou .env); o cache é o do próprio
+processo (core.cache, backend "memory"), então dimensões, bloqueios e agendamentos
+buscados para uma unidade são reaproveitados pelas seguintes.
+
+Na reprodução de um cassete, "hoje" (datas padrão das consultas, divisão passado/futuro)
+é o momento gravado com ele (core.relogio), então a reprodução é a mesma em qualquer dia.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from core.cache import set_cache_backend
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+# ==========================================================
+# TEMPOS POR ETAPA
+# ==========================================================
+class Cronometro:
+    def __init__(self):
+        self.etapas = []
+
+    @contextmanager
+    def etapa(self, nome):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas.append((nome, time.perf_counter() - t0))
+
+    def resumo(self):
+        largura = max((len(n) for n, _ in self.etapas), default=0)
+        linhas = [f"  {n.ljust(largura)}  {s:8.2f} s" for n, s in self.etapas]
+        linhas.append(f"  {'total'.ljust(largura)}  {sum(s for _, s in self.etapas):8.2f} s")
+        return "\n".join(linhas)
+
+
+def _slug(nome):
+    return re.sub(r"[^\w-]+", "_", str(nome)).strip("_")
+
+
+def _data(texto):
+    try:
+        return datetime.strptime(texto, "%d-%m-%Y").date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida {texto!r} (use DD-MM-AAAA)")
+
+
+# ==========================================================
+# COMANDO: maps
+# ==========================================================
+def cmd_maps(args):
+    from core.api_client import get_cassette, get_pdf_cache, get_rate_limiter, single_flight_stats
+    from core.map_generator import generate_daily_maps, generate_weekly_maps
+    from core.registry import get_registry
+    from core.stages import resumo_etapas
+
+    if args.profile:
+        os.environ["FEEGOW_PROFILE"] = args.profile
+    if args.cassette:
+        os.environ["FEEGOW_CASSETTE_MODE"] = args.cassette
+    if args.cassette_dir:
+        os.environ["FEEGOW_CASSETTE_PATH"] = str(Path(args.cassette_dir).resolve())
+    if args.today:
+        os.environ["FEEGOW_HOJE"] = args.today.isoformat()
+
+    out_dir = Path(args.out).resolve()  # resolvido antes do chdir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    os.chdir(RAIZ)  # os templates HTML são lidos com caminho relativo à raiz do projeto
+
+    semanal = args.week is not None
+    dia = args.week or args.day
+    data_str = dia.strftime("%d-%m-%Y")
+    if semanal and dia.weekday() != 0:
+        print(f"ERRO: {data_str} não é uma segunda-feira.", file=sys.stderr)
+        return 2
+
+    crono = Cronometro()
+    with crono.etapa("dimensões"):
+        reg = get_registry()
+
+    todas = [u for u in args.units if u.lower() == "all"]
+    if todas:
+        unidades = [None] if semanal else list(reg.unidade_id_por_nome)
+    else:
+        desconhecidas = [u for u in args.units if u not in reg.unidade_id_por_nome]
+        if desconhecidas:
+            print(f"ERRO: unidade(s) desconhecida(s): {', '.join(desconhecidas)}", file=sys.stderr)
+            print(f"Disponíveis: {', '.join(reg.unidade_id_por_nome)}", file=sys.stderr)
+            return 2
+        unidades = list(args.units)
+
+    gerar = generate_weekly_maps if semanal else generate_daily_maps
+    prefixo = "Mapa_Semanal" if semanal else "Mapa_Diario"
+    gerados = 0
+
+    for unidade in unidades:
+        rotulo = unidade or "todas"
+        with crono.etapa(f"geração [{rotulo}]"):
+            resultado = gerar(data_str, unidade_id=unidade)
+
+        metricas = dict(getattr(resultado, "metricas", None) or {})
+        etapas = metricas.pop("etapas", None)
+        if etapas:
+            print(f"[{rotulo}] etapas:\n{resumo_etapas(etapas)}")
+
+        if "warning" in resultado:
+            print(f"[{rotulo}] {resultado['warning']}")
+            continue
+
+        with crono.etapa(f"gravação [{rotulo}]"):
+            for nome, pdf_bytes in resultado.items():
+                destino = out_dir / f"{prefixo}_{_slug(nome)}_{data_str}.pdf"
+                destino.write_bytes(pdf_bytes)
+                gerados += 1
+                print(f"[{rotulo}] {destino}")
+
+        if metricas:
+            print(f"[{rotulo}] métricas: {metricas}")
+
+    print(f"\n{gerados} PDF(s) em {out_dir}\nTempos por etapa:\n{crono.resumo()}")
+    cache_pdf = get_pdf_cache()
+    if cache_pdf is not None:
+        print(f"Cache de PDFs: {cache_pdf.stats()}")
+    limiter = get_rate_limiter()
+    if limiter is not None:
+        print(f"Limitador da API: {limiter.stats()}")
+    print(f"Chamadas coalescidas (single-flight): {single_flight_stats()}")
+    cassette = get_cassette()
+    if cassette is not None:
+        print(f"Cassete: {cassette.stats()}")
+    return 0 if gerados else 1
+
+
+# ==========================================================
+# ENTRADA
+# ==========================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-backend", default="memory", choices=["memory", "streamlit", "auto"],
+                        help="Backend de cache do core (padrão: memory)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_maps = sub.add_parser("maps", help="Gera os mapas de salas em PDF")
+    quando = p_maps.add_mutually_exclusive_group(required=True)
+    quando.add_argument("--week", type=_data, help="Segunda-feira da semana (DD-MM-AAAA): mapa semanal")
+    quando.add_argument("--day", type=_data, help="Dia (DD-MM-AAAA): mapa diário")
+    p_maps.add_argument("--units", nargs="+", default=["all"],
+                        help='Nomes das unidades (nome_fantasia) ou "all" (padrão)')
+    p_maps.add_argument("--out", default="mapas_gerados", help="Pasta de saída dos PDFs")
+    p_maps.add_argument("--profile", choices=["cprofile", "pyinstrument"],
+                        help="Grava um perfil por geração (o mesmo que FEEGOW_PROFILE; pasta em FEEGOW_PROFILE_DIR)")
+    p_maps.add_argument("--cassette", choices=["record", "replay"],
+                        help="Grava as respostas da API ou gera offline a partir delas (o mesmo que FEEGOW_CASSETTE_MODE)")
+    p_maps.add_argument("--cassette-dir", help="Pasta do cassete (o mesmo que FEEGOW_CASSETTE_PATH)")
+    p_maps.add_argument("--today", type=_data,
+                        help="Data tratada como hoje (DD-MM-AAAA; o mesmo que FEEGOW_HOJE). "
+                             "Na reprodução de cassete, o padrão é o dia da gravação")
+    p_maps.set_defaults(func=cmd_maps)
+
+    args = parser.parse_args(argv)
+    set_cache_backend(args.cache_backend)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+import json
+import sqlite3
+import threading
+import time
+import hashlib
+from pathlib import Path
+
+# ==========================================================
+# CACHE PERSISTENTE (SQLite) PARA RESPOSTAS DA API
+# ==========================================================
+# Compartilhado entre processos (Streamlit, réplicas, scripts de debug):
+# o SQLite em modo WAL permite leitores concorrentes e serializa os escritores,
+# e o busy_timeout faz cada processo aguardar o lock em vez de falhar.
+#
+# Leitura não escreve a cada acerto: accessed_at (usado na evicção) só é atualizado
+# quando está mais velho que touch_interval_s, então os acertos de várias sessões e
+# threads não disputam o lock de escrita. O tamanho total fica numa linha de `meta`
+# mantida por triggers (vale para todos os processos), sem SUM(size) a cada escrita.
+
+def make_cache_key(endpoint_name, url, body):
+    """Chave estável: nome do endpoint + URL + corpo canonicalizado (chaves ordenadas)."""
+    canonical = json.dumps(body or {}, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    raw = f"{endpoint_name}\n{url}\n{canonical}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Cache chave→JSON em um arquivo SQLite local, com TTL por entrada e
+    limite de tamanho total (evicta primeiro os expirados e depois os menos acessados).
+    """
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, busy_timeout_s=30, touch_interval_s=60):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = int(max_bytes)
+        self.busy_timeout_s = busy_timeout_s
+        self.touch_interval_s = float(touch_interval_s)
+        self._local = threading.local()
+        self._init_schema()
+
+    # ---------------- conexão (uma por thread) ----------------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_s * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key         TEXT PRIMARY KEY,
+                endpoint    TEXT NOT NULL,
+                value       TEXT NOT NULL,
+                size        INTEGER NOT NULL,
+                created_at  REAL NOT NULL,
+                expires_at  REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_expires ON responses(expires_at)")
+
+        # Total de bytes corrente (linha única), mantido pelos triggers dentro de cada escrita
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 1), total_bytes INTEGER NOT NULL)")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_responses_insert AFTER INSERT ON responses
+                BEGIN UPDATE meta SET total_bytes = total_bytes + NEW.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_responses_delete AFTER DELETE ON responses
+                BEGIN UPDATE meta SET total_bytes = total_bytes - OLD.size WHERE id = 1; END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_responses_update AFTER UPDATE OF size ON responses
+                BEGIN UPDATE meta SET total_bytes = total_bytes + NEW.size - OLD.size WHERE id = 1; END
+            """)
+            # Arquivo criado antes da tabela meta: parte da soma atual
+            conn.execute("INSERT OR IGNORE INTO meta (id, total_bytes) SELECT 1, COALESCE(SUM(size), 0) FROM responses")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------------- API pública ----------------
+    def get(self, key):
+        """Retorna o JSON armazenado ou None se ausente/expirado."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at, accessed_at = row
+            if expires_at < now:
+                conn.execute("DELETE FROM responses WHERE key = ? AND expires_at < ?", (key, now))
+                return None
+            if now - accessed_at >= self.touch_interval_s:
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            return json.loads(value)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[CACHE ERROR] leitura: {e}")
+            return None
+
+    def set(self, key, endpoint, value, ttl_seconds):
+        now = time.time()
+        try:
+            payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        except (TypeError, ValueError):
+            return
+        try:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Upsert (e não INSERT OR REPLACE): a troca dispara o trigger de UPDATE do total;
+                # o REPLACE apagaria a linha antiga sem disparar o de DELETE
+                conn.execute(
+                    "INSERT INTO responses (key, endpoint, value, size, created_at, expires_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET endpoint = excluded.endpoint, value = excluded.value, "
+                    "size = excluded.size, created_at = excluded.created_at, "
+                    "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                    (key, endpoint, payload, len(payload), now, now + float(ttl_seconds), now),
+                )
+                self._evict(conn, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            print(f"[CACHE ERROR] escrita: {e}")
+
+    def clear(self, endpoint=None):
+        conn = self._conn()
+        if endpoint:
+            conn.execute("DELETE FROM responses WHERE endpoint = ?", (endpoint,))
+        else:
+            conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        conn = self._conn()
+        total = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        size = self._total_bytes(conn)
+        return {"entries": int(total), "bytes": int(size), "max_bytes": self.max_bytes, "path": str(self.path)}
+
+    # ---------------- evicção ----------------
+    @staticmethod
+    def _total_bytes(conn):
+        return conn.execute("SELECT total_bytes FROM meta WHERE id = 1").fetchone()[0]
+
+    def _evict(self, conn, now):
+        """Mantém o arquivo abaixo de max_bytes (chamado dentro da transação de escrita)."""
+        total = self._total_bytes(conn)
+        if total <= self.max_bytes:
+            return
+
+        conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+        total = self._total_bytes(conn)
+
+        # Remove os menos acessados até ficar em 90% do limite (evita evictar a cada escrita)
+        alvo = self.max_bytes * 0.9
+        if total <= alvo:
+            return
+        liberar = total - alvo
+        acumulado = 0
+        chaves = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            chaves.append((key,))
+            acumulado += size
+            if acumulado >= liberar:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", chaves)
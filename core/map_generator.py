@@ -1,136 +1,107 @@
+import os
 from pathlib import Path
-from datetime import timedelta, datetime, date
+from datetime import timedelta, datetime
 from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
 import pandas as pd
-import re
 
 from core.api_client import (
     fetch_agendamentos,
-    list_profissionals,
-    list_especialidades,
-    list_salas,
-    list_unidades,
     fetch_horarios_disponiveis,
+    fetch_horarios_disponiveis_lote,
+    get_api_settings,
+    fetch_horarios_ociosos_lote,
     get_main_specialty_id,
-    list_blocks
+    get_roster,
+    get_snapshot_store,
+    list_blocks,
+    _executar_em_lote
 )
 
 from core.utils import (
+    aplicar_carimbo,
     build_matrices,
-    render_pdf_from_template,
-    to_time,
-    periodo_from_time
+    carimbo_geracao,
+    hora_corte_se_hoje,
+    pdf_from_html,
+    render_pdfs
 )
+from core.time_columns import adicionar_colunas_tempo, periodo_por_minuto, segundos_do_dia
 
 from core.normalize_df import normalize_and_validate
+from core.block_index import BlockSnapshot, blocked_mask, slot_arrays
+from core import relogio
+from core.schedule_templates import grades_por_template
+from core.registry import get_registry
+from core.stages import Etapas, perfilado
 
-# Carregamento de dados auxiliares
-df_prof = list_profissionals()
-df_esp = list_especialidades()
-df_loc = list_salas()
-df_unid = list_unidades()
+# ==============================================================================
+# RENDERIZAÇÃO (POOL DE PROCESSOS)
+# ==============================================================================
+def _workers_render():
+    """
+    Nº de processos para renderizar os PDFs: FEEGOW_RENDER_WORKERS ou globals.render.workers.
+    0/ausente = automático; 1 = em série.
+    """
+    valor = os.getenv("FEEGOW_RENDER_WORKERS")
+    if valor is None:
+        valor = (get_api_settings().globals_cfg.get("render", {}) or {}).get("workers", 0)
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return valor if valor > 0 else None
+
+# ==============================================================================
+# RESULTADO DA GERAÇÃO
+# ==============================================================================
+class ResultadoMapas(dict):
+    """
+    Mesmo formato de sempre ({unidade: pdf_bytes} ou {"warning": ...}),
+    com as métricas da geração em `.metricas`.
+    """
+    def __init__(self, *args, metricas=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metricas = metricas if metricas is not None else {}
+
+def _carregar_bloqueios(start_date_str, end_date_str, metricas):
+    """Busca os bloqueios do período UMA vez por geração (list_blocks tem cache curto entre gerações)."""
+    snapshot = BlockSnapshot(list_blocks(start_date=start_date_str, end_date=end_date_str), start_date_str, end_date_str)
+    metricas['bloqueios_buscados'] = metricas.get('bloqueios_buscados', 0) + 1
+    return snapshot
 
 # ==============================================================================
 # FUNÇÃO AUXILIAR DE FILTRO DE BLOQUEIOS
 # ==============================================================================
-def _remove_blocked_slots(df_slots, start_date_str, end_date_str, unidade_id=None):
+def _remove_blocked_slots(df_slots, start_date_str, end_date_str, unidade_id=None, bloqueios=None):
     """
     Remove linhas do DataFrame que coincidem com períodos de bloqueio.
     Versão Blindada: Corrige tipagem de unidades (str/int) e datas.
+    A verificação é uma junção vetorizada contra o índice compilado (core.block_index).
+    `bloqueios` é o BlockSnapshot da geração; sem ele, busca os bloqueios do período.
     """
     if df_slots.empty:
         return df_slots
 
-    df_blocks = list_blocks(start_date=start_date_str, end_date=end_date_str)
+    if bloqueios is None:
+        bloqueios = BlockSnapshot(list_blocks(start_date=start_date_str, end_date=end_date_str))
     
-    if df_blocks.empty:
+    if bloqueios.empty:
         return df_slots
 
-    # 1. Preparação Robusta de Datas dos Slots
-    # Tenta ler dayfirst=True (DD-MM-YYYY) padrão BR. Se falhar, tenta ISO.
-    df_slots['_temp_date'] = pd.to_datetime(df_slots['data'], dayfirst=True, errors='coerce').dt.date
-    # Fallback: Se gerou NaT (Not a Time), tenta forçar formato ISO
-    mask_nat = df_slots['_temp_date'].isna()
-    if mask_nat.any():
-        df_slots.loc[mask_nat, '_temp_date'] = pd.to_datetime(df_slots.loc[mask_nat, 'data'], errors='coerce').dt.date
-        
-    df_slots['_temp_time'] = pd.to_datetime(df_slots['horario'], format="%H:%M:%S", errors='coerce').dt.time
-    
     if 'profissional_id' in df_slots.columns:
         df_slots['profissional_id'] = pd.to_numeric(df_slots['profissional_id'], errors='coerce').fillna(0).astype(int)
 
-    # 2. Máscara de Exclusão
-    mask_exclude = pd.Series([False] * len(df_slots), index=df_slots.index)
+    # 1. Índice compilado (unidades normalizadas, intervalos diários fundidos), memorizado no snapshot
+    index = bloqueios.index(unidade_id)
+    if index.empty:
+        return df_slots.copy()
 
-    # Garante que a unidade alvo seja Inteiro (se existir)
-    target_unit = int(unidade_id) if unidade_id else None
-
-    for _, block in df_blocks.iterrows():
-        # --- A. VERIFICAÇÃO DE UNIDADE (CORRIGIDA) ---
-        block_units = block.get('units')
-        
-        should_apply_block = False
-        
-        if target_unit is None:
-            # Se não estamos filtrando por unidade (Mapa Geral), aplica todos os bloqueios
-            should_apply_block = True
-        else:
-            # Estamos gerando mapa para Unidade X. O bloqueio se aplica a X?
-            
-            # Cenário 1: Lista de Unidades
-            if isinstance(block_units, list) and len(block_units) > 0:
-                # [CORREÇÃO CRÍTICA]: Converte a lista do bloqueio para inteiros para garantir
-                # Isso resolve o caso de ["12"] vs 12
-                clean_units = []
-                for u in block_units:
-                    try: clean_units.append(int(u))
-                    except: pass
-                
-                if target_unit in clean_units or 0 in clean_units:
-                    should_apply_block = True
-            
-            # Cenário 2: Fallback (Coluna antiga unidade_id)
-            else:
-                legacy_uid = block.get('unidade_id')
-                try:
-                    legacy_uid = int(legacy_uid) if legacy_uid is not None else 0
-                except:
-                    legacy_uid = 0
-                
-                if legacy_uid == 0 or legacy_uid == target_unit:
-                    should_apply_block = True
-
-        if not should_apply_block:
-            continue
-
-        # --- B. Verifica Data (Segura) ---
-        # block['date_start'] já vem como date object do list_blocks
-        m_date = (df_slots['_temp_date'] >= block['date_start']) & (df_slots['_temp_date'] <= block['date_end'])
-        
-        if not m_date.any(): continue
-
-        # --- C. Verifica Horário ---
-        blk_start = block['time_start'] if pd.notnull(block.get('time_start')) else time(0,0)
-        blk_end = block['time_end'] if pd.notnull(block.get('time_end')) else time(23,59,59)
-        
-        m_time = (df_slots['_temp_time'] >= blk_start) & (df_slots['_temp_time'] <= blk_end)
-        
-        # --- D. Verifica Profissional ---
-        blk_prof = int(block['professional_id']) if pd.notnull(block.get('professional_id')) else 0
-        
-        if blk_prof > 0:
-            m_prof = (df_slots['profissional_id'] == blk_prof)
-        else:
-            m_prof = True # Afeta todos
-
-        # Combina
-        current_mask = m_date & m_time & m_prof
-        mask_exclude = mask_exclude | current_mask
+    # 2. Chaves vetorizadas dos slots (data, horário, profissional) e junção por intervalo
+    dias, segundos, profs = slot_arrays(df_slots)
+    mask_exclude = blocked_mask(index, dias, segundos, profs)
 
     # 3. Limpeza
     df_clean = df_slots[~mask_exclude].copy()
-    df_clean.drop(columns=['_temp_date', '_temp_time'], inplace=True, errors='ignore')
     
     removidos = mask_exclude.sum()
     if removidos > 0:
@@ -138,13 +109,101 @@ def _remove_blocked_slots(df_slots, start_date_str, end_date_str, unidade_id=Non
         
     return df_clean
 
+# ==============================================================================
+# GRADE GRAVADA (Histórico local de disponibilidade)
+# ==============================================================================
+def _ler_grades_gravadas(unidade_id, start_dt, end_dt, profissionais, metricas=None):
+    """
+    Lê do SnapshotStore a grade gravada de [start_dt, end_dt] dos profissionais.
+    Retorna {(profissional_id, date): DataFrame} só para os dias com captura válida
+    (DataFrame vazio = dia gravado sem horários). Sem store, retorna {}.
+    """
+    store = get_snapshot_store()
+    if store is None or not profissionais or start_dt > end_dt:
+        return {}
+
+    try:
+        df_snap, cobertos = store.read_range(unidade_id, start_dt, end_dt, profissionais)
+    except Exception as e:
+        print(f"[SNAPSHOT ERROR] leitura: {e}")
+        return {}
+
+    gravadas = {chave: pd.DataFrame() for chave in cobertos}
+    if not df_snap.empty:
+        dias = pd.to_datetime(df_snap['data'], format="%Y-%m-%d").dt.date
+        for (pid, dia), grupo in df_snap.groupby([df_snap['profissional_id'], dias]):
+            gravadas[(int(pid), dia)] = grupo.reset_index(drop=True)
+
+    if metricas is not None:
+        metricas['grades_gravadas'] = metricas.get('grades_gravadas', 0) + len(gravadas)
+    return gravadas
+
+def _grades_locais(unidade_id, start_dt, end_dt, profissionais, metricas=None):
+    """
+    Grade do passado sem chamadas à API: primeiro a gravada (SnapshotStore) e, para os
+    pares (profissional, dia) ainda sem dados, a reconstruída pelo template semanal
+    quando a confiança é suficiente. Mesmo formato de _ler_grades_gravadas.
+    """
+    grades = _ler_grades_gravadas(unidade_id, start_dt, end_dt, profissionais, metricas)
+
+    dias = []
+    d = start_dt
+    while d <= end_dt:
+        dias.append(d)
+        d += timedelta(days=1)
+    pendentes = [p for p in profissionais if any((int(p), dia) not in grades for dia in dias)]
+
+    por_template = {
+        chave: df_t
+        for chave, df_t in grades_por_template(unidade_id, pendentes, dias).items()
+        if chave not in grades
+    }
+    if metricas is not None and por_template:
+        metricas['grades_template'] = metricas.get('grades_template', 0) + len(por_template)
+    grades.update(por_template)
+    return grades
+
+def _nota_rodape_passado(metricas):
+    """
+    Origem da grade do passado para o rodapé quando houve leitura local (histórico gravado
+    e/ou template semanal), com ou sem espelho D+7. Sem leitura local, retorna None (texto original).
+    """
+    fontes = []
+    if metricas.get('grades_gravadas', 0) > 0:
+        fontes.append("do histórico gravado da agenda")
+    if metricas.get('grades_template', 0) > 0:
+        fontes.append("do template semanal inferido do histórico")
+    if not fontes:
+        return None
+    if metricas.get('grades_espelho', 0) > 0:
+        return (f"as grades vêm {' e '.join(fontes)} e, nos demais dias, "
+                f"são simuladas baseadas na próxima agenda (D+7)")
+    if len(fontes) == 1 and metricas.get('grades_gravadas', 0) > 0:
+        return "as grades vêm do histórico gravado da agenda (capturado antes do início de cada dia)"
+    return f"as grades vêm {' e '.join(fontes)}"
+
 # ==============================================================================
 # RECONSTRUÇÃO HÍBRIDA (Passado Simulado + Futuro Real)
 # ==============================================================================
-def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_id):
+def _segundo_agora():
+    agora = relogio.agora()
+    return agora.hour * 3600 + agora.minute * 60 + agora.second
+
+def _antes_de(horarios, now_seg):
+    """Máscara dos horários válidos < agora (comparação em segundos do dia)."""
+    segundos = segundos_do_dia(horarios)
+    return (segundos >= 0) & (segundos < now_seg)
+
+def _a_partir_de(horarios, now_seg):
+    """Máscara dos horários válidos >= agora."""
+    segundos = segundos_do_dia(horarios)
+    return (segundos >= 0) & (segundos >= now_seg)
+
+def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_id, bloqueios=None, grade_gravada=None):
     """
     Abordagem Híbrida para o dia de "Hoje":
-    1. Horários < Agora: Usa o Espelho (D+7) para preencher o passado que a API esconde.
+    1. Horários < Agora: Usa a grade local do dia (`grade_gravada`: SnapshotStore ou template
+       semanal) ou, sem ela, o Espelho (D+7) para preencher o passado que a API esconde.
     2. Horários >= Agora: Usa a API Real de hoje para precisão total.
     """
     # Conversão de datas
@@ -153,8 +212,8 @@ def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_i
     except ValueError:
         return pd.DataFrame()
         
-    dt_today = date.today()
-    now_time = datetime.now().time()
+    dt_today = relogio.hoje()
+    now_seg = _segundo_agora()
     
     # ---------------------------------------------------------
     # CENÁRIO 1: Data Futura (Amanhã em diante)
@@ -179,7 +238,12 @@ def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_i
     # Tenta D+7 ou D+14
     mirrors = [dt_target + timedelta(days=7), dt_target + timedelta(days=14)]
     df_mirror = pd.DataFrame()
-    
+
+    # Grade local do dia dispensa o espelho (inclusive quando foi gravada vazia)
+    if grade_gravada is not None:
+        df_mirror = grade_gravada.copy()
+        mirrors = []
+
     for mirror_date in mirrors:
         m_str = mirror_date.strftime("%d-%m-%Y")
         raw_mirror = fetch_horarios_disponiveis(unidade_id, m_str, m_str, profissional_id, especialidade_id=especialidade_id)
@@ -193,9 +257,7 @@ def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_i
         
         if is_today:
             # FILTRO DO PASSADO: Mantém apenas o que já aconteceu (horario < agora)
-            # Converte para time object para comparar
-            temp_times = pd.to_datetime(df_mirror['horario'], format="%H:%M:%S", errors='coerce').dt.time
-            df_mirror = df_mirror[temp_times < now_time]
+            df_mirror = df_mirror[_antes_de(df_mirror['horario'], now_seg)]
         
         # Adiciona ao combinado
         df_combined = pd.concat([df_combined, df_mirror], ignore_index=True)
@@ -210,8 +272,7 @@ def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_i
         if not df_real.empty:
             # FILTRO DO FUTURO: Mantém apenas o que é daqui pra frente (horario >= agora)
             # A API já deve trazer só futuro, mas garantimos para evitar duplicação na borda
-            temp_times_real = pd.to_datetime(df_real['horario'], format="%H:%M:%S", errors='coerce').dt.time
-            df_real = df_real[temp_times_real >= now_time]
+            df_real = df_real[_a_partir_de(df_real['horario'], now_seg)]
             
             df_combined = pd.concat([df_combined, df_real], ignore_index=True)
 
@@ -229,40 +290,235 @@ def _fetch_grade_simulada(unidade_id, date_str, profissional_id, especialidade_i
     df_combined.drop_duplicates(subset=['horario', 'profissional_id'], inplace=True)
 
     # Aplica os bloqueios de HOJE (Segurança final)
-    df_final = _remove_blocked_slots(df_combined, date_str, date_str, unidade_id=unidade_id)
+    df_final = _remove_blocked_slots(df_combined, date_str, date_str, unidade_id=unidade_id, bloqueios=bloqueios)
     
     return df_final
 
+def _parse_datas_grade(serie):
+    """A API de grade devolve 'data' em ISO (YYYY-MM-DD); DD-MM-YYYY fica como fallback."""
+    datas = pd.to_datetime(serie, format="%Y-%m-%d", errors='coerce')
+    mask_nat = datas.isna()
+    if mask_nat.any():
+        datas[mask_nat] = pd.to_datetime(serie[mask_nat], format="%d-%m-%Y", errors='coerce')
+    return datas
+
+def _redatar(df, dias_atras):
+    """Traz linhas do espelho (D+N) para a data alvo (D), no formato DD-MM-YYYY."""
+    df = df.copy()
+    datas = _parse_datas_grade(df['data'])
+    df['_dia_alvo'] = (datas - pd.Timedelta(days=dias_atras)).dt.date
+    df['data'] = df['_dia_alvo'].map(lambda d: d.strftime("%d-%m-%Y") if pd.notna(d) else None)
+    return df
+
+def _fetch_grade_semana_hibrida(unidade_id, start_dt, end_dt, profissionais, metricas=None):
+    """
+    Versão em lote da busca híbrida para a semana inteira.
+    Dias passados/hoje com grade gravada (SnapshotStore) são lidos localmente.
+    Para os demais, por profissional, no máximo 3 chamadas (em vez de até 2 por dia passado + 1 futura):
+      1. Espelho D+7 dos dias sem gravação, em UMA chamada com período;
+      2. Fallback D+14 só para os dias que ficaram sem espelho, também em UMA chamada;
+      3. API real de hoje (ou do início da semana, se futura) até o fim da semana.
+    As linhas do espelho são re-datadas localmente. Para hoje, a grade gravada/espelho cobre os
+    horários < agora e a API real os horários >= agora. Os bloqueios são aplicados
+    depois, no filtro final da semana (mesmo snapshot).
+    """
+    if not profissionais:
+        return pd.DataFrame()
+
+    dt_today = relogio.hoje()
+    now_seg = _segundo_agora()
+    fim_passado = min(end_dt, dt_today)
+    dias_passados = []
+    d = start_dt
+    while d <= fim_passado:
+        dias_passados.append(d)
+        d += timedelta(days=1)
+    inicio_real = max(start_dt, dt_today)
+
+    def pedido(p_int, sid, ini, fim):
+        return {
+            'unidade_id': unidade_id,
+            'data_start': ini.strftime("%d-%m-%Y"),
+            'data_end': fim.strftime("%d-%m-%Y"),
+            'profissional_id': p_int,
+            'especialidade_id': sid,
+        }
+
+    def buscar_espelho(faltantes, deslocamento):
+        """Uma chamada por profissional cobrindo seus dias faltantes + deslocamento; devolve só esses dias."""
+        chaves = list(faltantes)
+        pedidos = [
+            pedido(p, s, faltantes[(p, s)][0] + timedelta(days=deslocamento), faltantes[(p, s)][-1] + timedelta(days=deslocamento))
+            for p, s in chaves
+        ]
+        achados = {}
+        for chave, df_m in zip(chaves, _executar_em_lote(fetch_horarios_disponiveis, pedidos)):
+            if df_m is None or df_m.empty:
+                continue
+            df_m = _redatar(df_m, deslocamento)
+            df_m = df_m[df_m['_dia_alvo'].isin(set(faltantes[chave]))]
+            if not df_m.empty:
+                achados[chave] = df_m
+        return achados
+
+    frames = []
+    if dias_passados:
+        # 0. Grade gravada ou reconstruída pelo template (sem chamadas à API)
+        gravadas = _grades_locais(unidade_id, dias_passados[0], dias_passados[-1], [p for p, _ in profissionais], metricas)
+
+        espelhos = {p_int: [] for p_int, _ in profissionais}
+        faltantes = {}
+        for p_int, sid in profissionais:
+            partes = [gravadas[(p_int, dia)] for dia in dias_passados if (p_int, dia) in gravadas]
+            partes = [_redatar(df_g, 0) for df_g in partes if not df_g.empty]
+            espelhos[p_int].extend(partes)
+            sem_gravacao = [dia for dia in dias_passados if (p_int, dia) not in gravadas]
+            if sem_gravacao:
+                faltantes[(p_int, sid)] = sem_gravacao
+
+        if metricas is not None:
+            metricas['grades_espelho'] = metricas.get('grades_espelho', 0) + sum(len(v) for v in faltantes.values())
+
+        # 1. Espelho D+7 dos dias sem gravação (uma chamada por profissional)
+        if faltantes:
+            achados7 = buscar_espelho(faltantes, 7)
+            faltantes14 = {}
+            for chave, dias in faltantes.items():
+                df7 = achados7.get(chave)
+                if df7 is not None:
+                    espelhos[chave[0]].append(df7)
+                cobertos = set(df7['_dia_alvo']) if df7 is not None else set()
+                sem_espelho = [dia for dia in dias if dia not in cobertos]
+                if sem_espelho:
+                    faltantes14[chave] = sem_espelho
+
+            # 2. Fallback D+14 apenas para os dias sem D+7 (uma chamada por profissional)
+            if faltantes14:
+                for chave, df14 in buscar_espelho(faltantes14, 14).items():
+                    espelhos[chave[0]].append(df14)
+
+        for p_int, partes in espelhos.items():
+            if not partes:
+                continue
+            df_sim = pd.concat(partes, ignore_index=True)
+            if dt_today in dias_passados:
+                # FILTRO DO PASSADO para hoje: gravação/espelho só cobre o que já aconteceu (horario < agora)
+                eh_hoje = (df_sim['_dia_alvo'] == dt_today).to_numpy()
+                df_sim = df_sim[~eh_hoje | _antes_de(df_sim['horario'], now_seg)]
+            frames.append(df_sim)
+
+    # 3. API real de hoje/futuro até o fim da semana (uma chamada por profissional)
+    if inicio_real <= end_dt:
+        res_real = _executar_em_lote(fetch_horarios_disponiveis, [pedido(p, s, inicio_real, end_dt) for p, s in profissionais])
+        for df_real in res_real:
+            if df_real is None or df_real.empty:
+                continue
+            if inicio_real == dt_today:
+                # FILTRO DO FUTURO para hoje: mantém apenas horario >= agora (evita duplicar a borda)
+                datas_real = _parse_datas_grade(df_real['data']).dt.date
+                df_real = df_real[(datas_real != dt_today).to_numpy() | _a_partir_de(df_real['horario'], now_seg)]
+            frames.append(df_real)
+
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    if '_dia_alvo' in df.columns:
+        df = df.drop(columns=['_dia_alvo'])
+    # Remove duplicatas de borda (mesmo dia, horário e profissional)
+    return df.drop_duplicates(subset=['data', 'horario', 'profissional_id'])
+
+# ==============================================================================
+# VARREDURA DE OCIOSOS (Elenco da unidade)
+# ==============================================================================
+_HISTORICO_ELENCO_DIAS = 56
+
+def _profissionais_ociosos(reg, unidade_sel_id, processed_ids, metricas):
+    """
+    Profissionais da varredura complementar: sem agendamento no período e, com o elenco
+    ativo (core.roster), só os que plausivelmente atendem na unidade.
+    Retorna (lista, varredura_completa).
+    """
+    todos = [int(p) for p in reg.profissional_ids if int(p) not in processed_ids]
+    roster = get_roster()
+    if roster is None:
+        return todos, True
+
+    store = get_snapshot_store()
+    if store is not None and unidade_sel_id:
+        try:
+            roster.observar(unidade_sel_id, store.profissionais_com_grade(
+                unidade_sel_id, relogio.hoje() - timedelta(days=_HISTORICO_ELENCO_DIAS)))
+        except Exception as e:
+            print(f"[SNAPSHOT ERROR] elenco: {e}")
+
+    candidatos, completa = roster.candidatos(unidade_sel_id, todos)
+    metricas['ociosos_sondados'] = len(candidatos)
+    metricas['ociosos_fora_do_elenco'] = len(todos) - len(candidatos)
+    return candidatos, completa
+
+def _observar_elenco(df_ag, unidade_sel_id):
+    roster = get_roster()
+    if roster is not None:
+        roster.observar_agendamentos(df_ag, unidade_sel_id)
+
+def _registrar_ociosos(unidade_sel_id, varredura, completa):
+    """
+    Quem apareceu com horário na unidade, em qualquer dia das semanas sondadas (não só no
+    período do mapa), entra no elenco. A varredura completa só renova o ciclo se nenhuma
+    sondagem falhou e se cobriu os 7 dias depois de hoje: a API só devolve vagas de agora
+    em diante, então uma semana passada (ou a atual pela metade) não mostra quem atende
+    nos outros dias, e o ciclo vale para mapas de qualquer data.
+    """
+    roster = get_roster()
+    if roster is None:
+        return
+    roster.observar(unidade_sel_id, varredura.get('profissionais', ()))
+    ultimo_dia = varredura.get('ultimo_dia')
+    if (completa and not varredura.get('erros')
+            and ultimo_dia is not None and ultimo_dia >= relogio.hoje() + timedelta(days=7)):
+        roster.marcar_varredura(unidade_sel_id)
+
+@perfilado("semanal")
 def generate_weekly_maps(start_date, unidade_id=None, output_dir="mapas_gerados"):
     """
     Função de Mapa Semanal com suporte à Busca Híbrida (Simulação de Passado + Futuro Real).
+    Cada etapa (core.stages) fica registrada em resultado.metricas['etapas'].
     """
     start_date_str = start_date if isinstance(start_date, str) else start_date.strftime("%d-%m-%Y")
-    df_unid_list = list_unidades()
+    reg = get_registry()
 
     # Datas de controle
     start_dt = datetime.strptime(start_date_str, "%d-%m-%Y").date()
     end_dt = start_dt + timedelta(days=6)
     end_date_str = end_dt.strftime("%d-%m-%Y")
-    today = date.today()
+    today = relogio.hoje()
 
     out_dir = Path(output_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     unidade_sel_id = None
     if unidade_id and unidade_id != 'Todas':
-        filtro = df_unid_list[df_unid_list['nome_fantasia'] == unidade_id]
-        if not filtro.empty:
-            unidade_sel_id = int(filtro['unidade_id'].iloc[0])
+        unidade_sel_id = reg.unidade_id_por_nome.get(unidade_id)
+
+    metricas = {}
+    etapas = Etapas(metricas)
 
     # 1. Busca Agendamentos (Dados Reais)
-    df_ag = fetch_agendamentos(start_date=start_date_str, end_date=end_date_str, unidade_id=unidade_sel_id)
-    if df_ag.empty: return {"warning": "Vazio"}
-    
-    # Filtro de status válidos
-    required_status = [1, 7, 2, 3, 4]
-    df_ag = df_ag[df_ag['status_id'].isin(required_status)]
-    
+    with etapas.etapa("agendamentos") as et:
+        df_ag = fetch_agendamentos(start_date=start_date_str, end_date=end_date_str, unidade_id=unidade_sel_id)
+        et.entrada(df_ag)
+        if df_ag.empty: return ResultadoMapas({"warning": "Vazio"}, metricas=metricas)
+        _observar_elenco(df_ag, unidade_sel_id)
+
+        # Bloqueios da semana: um único snapshot reutilizado pela simulação e pelo filtro final
+        bloqueios = _carregar_bloqueios(start_date_str, end_date_str, metricas)
+
+        # Filtro de status válidos
+        required_status = [1, 7, 2, 3, 4]
+        df_ag = df_ag[df_ag['status_id'].isin(required_status)]
+        et.saida(df_ag)
+
     # 2. Injeção de Grade (Lógica Híbrida vs Padrão)
     profs_ativos = df_ag["profissional_id"].unique()
     all_slots = []
@@ -273,541 +529,556 @@ def generate_weekly_maps(start_date, unidade_id=None, output_dir="mapas_gerados"
     USAR_BUSCA_HIBRIDA = True  
     # ==============================================================================
 
-    for p_id in profs_ativos:
-        p_int = int(p_id)
-        sid = get_main_specialty_id(p_int)
-        
-        if sid:
-            # --- CAMINHO A: LÓGICA HÍBRIDA (Recupera Passado + Pega Futuro) ---
-            if USAR_BUSCA_HIBRIDA:
-                # 1. Dias Passados ou Hoje (Requer Simulação/Espelho)
-                # Iteramos dia a dia até chegar em "Amanhã" ou no fim do intervalo
-                current_loop_dt = start_dt
-                
-                while current_loop_dt <= end_dt and current_loop_dt <= today:
-                    loop_str = current_loop_dt.strftime("%d-%m-%Y")
-                    
-                    # Chama a função de espelho para este dia
-                    v_sim = _fetch_grade_simulada(
-                        unidade_sel_id, loop_str, p_int, especialidade_id=int(sid)
-                    )
-                    
-                    if not v_sim.empty:
-                        v_sim['agendamento_id'], v_sim['status_id'] = 0, 0
-                        all_slots.append(v_sim)
-                    
-                    current_loop_dt += timedelta(days=1)
-                
-                # 2. Dias Futuros (Amanhã em diante) - Otimização com chamada única
-                if current_loop_dt <= end_dt:
-                    future_start_str = current_loop_dt.strftime("%d-%m-%Y")
-                    
-                    v_future = fetch_horarios_disponiveis(
-                        unidade_sel_id, future_start_str, end_date_str, p_int, especialidade_id=int(sid)
-                    )
-                    if not v_future.empty:
-                        v_future['agendamento_id'], v_future['status_id'] = 0, 0
-                        all_slots.append(v_future)
-
-            # --- CAMINHO B: LÓGICA PADRÃO (Apenas API Real - Passado virá vazio) ---
-            else:
-                vagas = fetch_horarios_disponiveis(
-                    unidade_sel_id, start_date_str, end_date_str, p_int, especialidade_id=int(sid)
-                )
-                if not vagas.empty:
-                    vagas['agendamento_id'], vagas['status_id'] = 0, 0 
-                    all_slots.append(vagas)
+    with etapas.etapa("grade", linhas_entrada=len(profs_ativos)) as et:
+        # Profissionais com agendamento na semana e a especialidade usada para consultar a grade
+        profs_com_spec = []
+        for p_id in profs_ativos:
+            p_int = int(p_id)
+            sid = get_main_specialty_id(p_int)
+            if sid:
+                profs_com_spec.append((p_int, int(sid)))
+
+        # --- CAMINHO A: LÓGICA HÍBRIDA (Recupera Passado + Pega Futuro) ---
+        if USAR_BUSCA_HIBRIDA:
+            v_semana = _fetch_grade_semana_hibrida(unidade_sel_id, start_dt, end_dt, profs_com_spec, metricas)
+            if not v_semana.empty:
+                v_semana['agendamento_id'], v_semana['status_id'] = 0, 0
+                all_slots.append(v_semana)
+
+        # --- CAMINHO B: LÓGICA PADRÃO (Apenas API Real - Passado virá vazio) ---
+        else:
+            pedidos = [{
+                'unidade_id': unidade_sel_id,
+                'data_start': start_date_str,
+                'data_end': end_date_str,
+                'profissional_id': p_int,
+                'especialidade_id': sid,
+                'extras': {'agendamento_id': 0, 'status_id': 0},
+            } for p_int, sid in profs_com_spec]
+
+            vagas = fetch_horarios_disponiveis_lote(pedidos)
+            if not vagas.empty:
+                all_slots.append(vagas)
+        et.saida(sum(len(s) for s in all_slots))
 
     # ==============================================================================
     # VARREDURA COMPLEMENTAR: BUSCAR MÉDICOS SEM AGENDAMENTO (GRADE VAZIA)
     # ==============================================================================
-    # Lista de quem já foi processado no loop anterior
-    processed_ids = set(map(int, profs_ativos))
-    
-    # Lista total de profissionais ativos no sistema (df_prof é global)
-    # Filtra apenas quem está ativo (se houver coluna de status) ou pega todos
-    all_prof_ids = df_prof['profissional_id'].unique()
+    # Quem já foi processado no loop anterior (tinha agendamento) fica de fora; dos demais,
+    # só o elenco da unidade (core.roster) é sondado, exceto na varredura completa periódica
+    with etapas.etapa("ociosos") as et:
+        processed_ids = set(map(int, profs_ativos))
+        ociosos, varredura_completa = _profissionais_ociosos(reg, unidade_sel_id, processed_ids, metricas)
+        et.entrada(ociosos)
+        pedidos_ociosos = []
+
+        for p_int in ociosos:
+            # Busca especialidade principal para poder consultar a grade
+            sid = get_main_specialty_id(p_int)
+            
+            if sid:
+                # Médicos sem agendamento no passado não precisam de simulação complexa,
+                # pois não há "buracos" de agendamentos passados para preencher.
+                # A busca direta costuma resolver a maioria dos casos de "Agenda Aberta Vazia".
+                pedidos_ociosos.append({
+                    'unidade_id': unidade_sel_id,
+                    'data_start': start_date_str,
+                    'data_end': end_date_str,
+                    'profissional_id': p_int,
+                    'especialidade_id': int(sid),
+                    # Status 0 ou null indica grade livre
+                    'extras': {'agendamento_id': 0, 'status_id': 0, 'profissional_id': p_int, 'especialidade_id': int(sid)},
+                })
+
+        varredura = {}
+        vagas_extra = fetch_horarios_ociosos_lote(pedidos_ociosos, varredura=varredura)
+        _registrar_ociosos(unidade_sel_id, varredura, varredura_completa)
+        if not vagas_extra.empty:
+            all_slots.append(vagas_extra)
+        et.saida(vagas_extra)
+
+    with etapas.etapa("bloqueios") as et:
+        # União
+        if all_slots:
+            df = pd.concat([df_ag, pd.concat(all_slots)], ignore_index=True)
+            # Sincronização simples para o semanal
+            df['especialidade_id'] = df.groupby(['profissional_id', 'local_id'])['especialidade_id'].transform(lambda x: x.ffill().bfill())
+        else:
+            df = df_ag.copy()
+        et.entrada(df)
 
-    for p_id in all_prof_ids:
-        p_int = int(p_id)
-        
-        # Se já processamos este médico (porque ele tinha agendamento), pula
-        if p_int in processed_ids:
-            continue
+        # Parse único de data/horário para inteiros (dia_ord, segundo, minuto), usado daqui em diante
+        df = adicionar_colunas_tempo(df)
 
-        # Busca especialidade principal para poder consultar a grade
-        sid = get_main_specialty_id(p_int)
-        
-        if sid:
-            # Tenta buscar horários para este médico "ocioso"
-            # Nota: Usamos a mesma lógica de busca (Híbrida ou Normal) que já está configurada na função
-            
-            # --- Se for no MAPA SEMANAL e estiver usando Busca Híbrida: ---
-            # (Copie a lógica de USAR_BUSCA_HIBRIDA se estiver dentro do semanal)
-            # Para simplificar aqui, vou colocar a busca direta, mas idealmente deve seguir o padrão da função:
-            
-            vagas_extra = pd.DataFrame()
-            
-            # Exemplo genérico (serve para Diário e Semanal simples):
-            vagas_extra = fetch_horarios_disponiveis(
-                unidade_sel_id, start_date_str, end_date_str, p_int, especialidade_id=int(sid)
-            )
+        # Aplica filtro de bloqueios (Crucial para limpar a grade simulada se houver bloqueio real)
+        df = _remove_blocked_slots(df, start_date_str, end_date_str, unidade_id=unidade_sel_id, bloqueios=bloqueios)
+        et.saida(df)
+        if df.empty: return ResultadoMapas({"warning": "Todos os horários estão bloqueados."}, metricas=metricas)
 
-            # --- Se for MAPA SEMANAL COM SIMULAÇÃO, você precisaria replicar a lógica do while/loop aqui ---
-            # Mas geralmente, médicos sem agendamento no passado não precisam de simulação complexa 
-            # pois não há "buracos" de agendamentos passados para preencher. 
-            # A busca direta costuma resolver a maioria dos casos de "Agenda Aberta Vazia".
-
-            if not vagas_extra.empty:
-                vagas_extra['agendamento_id'] = 0
-                vagas_extra['status_id'] = 0 # Status 0 ou null indica grade livre
-                vagas_extra['profissional_id'] = p_int
-                vagas_extra['especialidade_id'] = int(sid)
-                all_slots.append(vagas_extra)
-
-    # União
-    if all_slots:
-        df = pd.concat([df_ag, pd.concat(all_slots)], ignore_index=True)
-        # Sincronização simples para o semanal
-        df['especialidade_id'] = df.groupby(['profissional_id', 'local_id'])['especialidade_id'].transform(lambda x: x.ffill().bfill())
-    else:
-        df = df_ag.copy()
-
-    # Aplica filtro de bloqueios (Crucial para limpar a grade simulada se houver bloqueio real)
-    df = _remove_blocked_slots(df, start_date_str, end_date_str, unidade_id=unidade_sel_id)
-    if df.empty: return {"warning": "Todos os horários estão bloqueados."}
-
-    df['especialidade_id'] = pd.to_numeric(df['especialidade_id'], errors='coerce').fillna(0).astype(int)
-    df['profissional_id'] = pd.to_numeric(df['profissional_id'], errors='coerce').fillna(0).astype(int)
-    df['local_id'] = pd.to_numeric(df['local_id'], errors='coerce').fillna(0).astype(int)
-
-    mapa_esp = df_esp.set_index('especialidade_id')['nome'].to_dict()
-    mapa_loc = df_loc.set_index('id')['local'].to_dict()
-    mapa_prof = df_prof.set_index('profissional_id')['nome'].to_dict()
-
-    if 'especialidade' not in df.columns:
-        df['especialidade'] = df['especialidade_id'].map(mapa_esp)
-    else:
-        df['especialidade'] = df['especialidade'].fillna(df['especialidade_id'].map(mapa_esp))
-
-    if 'sala' not in df.columns:
-        df['sala'] = df['local_id'].map(mapa_loc)
-    else:
-        df['sala'] = df['sala'].fillna(df['local_id'].map(mapa_loc))
-
-    if 'nome_profissional' not in df.columns:
-        df['nome_profissional'] = df['profissional_id'].map(mapa_prof)
-    else:
-        df['nome_profissional'] = df['nome_profissional'].fillna(df['profissional_id'].map(mapa_prof))
-
-    # df = df.merge(df_esp[['especialidade_id', 'nome']], on="especialidade_id", how="left").rename(columns={'nome': 'especialidade'})
-    # df = df.merge(df_prof[['profissional_id', 'nome']], on="profissional_id", how="left").rename(columns={'nome': 'nome_profissional'})
-    # df = df.merge(df_loc[['id', 'local']], left_on="local_id", right_on="id", how="left").rename(columns={'local': 'sala'})
-
-    for col in ['especialidade', 'nome_profissional', 'sala']:
-        if col in df.columns:
-            df[col] = df[col].replace({'nan': None, 'NAN': None, 'NaN': None})
-            # Preenchimento final de segurança
-            fallback = "Indefinido" if col != 'especialidade' else "Especialidade"
-            df[col] = df[col].fillna(fallback)
-    
-    # Normalização
-    df_final, _ = normalize_and_validate(df)
+    with etapas.etapa("enriquecimento", linhas_entrada=df) as et:
+        df['especialidade_id'] = pd.to_numeric(df['especialidade_id'], errors='coerce').fillna(0).astype(int)
+        df['profissional_id'] = pd.to_numeric(df['profissional_id'], errors='coerce').fillna(0).astype(int)
+        df['local_id'] = pd.to_numeric(df['local_id'], errors='coerce').fillna(0).astype(int)
 
-    # Remove salas inválidas para o mapa
-    remover = ['LABORATÓRIO', 'RAIO X', 'SALA DE VACINA', 'COLETA DOMICILIAR', 'VACINA', 'LABORATORIO']
-    df_final = df_final[~df_final['sala'].isin(remover)]
-    
-    # Fix Unidade
-    if unidade_id and unidade_id != 'Todas':
-        df_final['unidade'] = unidade_id
-    else:
-        if 'unidade_id' in df_final.columns:
-            df_final = df_final.merge(df_unid_list[['unidade_id', 'nome_fantasia']], on="unidade_id", how="left")
-            df_final.rename(columns={'nome_fantasia': 'unidade'}, inplace=True)
-            
-    df_final['unidade'] = df_final['unidade'].fillna("Geral")
-    df_final = df_final[~df_final['sala'].str.upper().isin(['SALA DE VACINA', 'LABORATÓRIO', 'RAIO X'])]
+        mapa_esp = reg.especialidade_nome
+        mapa_loc = reg.sala_nome
+        mapa_prof = reg.prof_nome
+
+        if 'especialidade' not in df.columns:
+            df['especialidade'] = df['especialidade_id'].map(mapa_esp)
+        else:
+            df['especialidade'] = df['especialidade'].fillna(df['especialidade_id'].map(mapa_esp))
+
+        if 'sala' not in df.columns:
+            df['sala'] = df['local_id'].map(mapa_loc)
+        else:
+            df['sala'] = df['sala'].fillna(df['local_id'].map(mapa_loc))
+
+        if 'nome_profissional' not in df.columns:
+            df['nome_profissional'] = df['profissional_id'].map(mapa_prof)
+        else:
+            df['nome_profissional'] = df['nome_profissional'].fillna(df['profissional_id'].map(mapa_prof))
+
+        # df = df.merge(df_esp[['especialidade_id', 'nome']], on="especialidade_id", how="left").rename(columns={'nome': 'especialidade'})
+        # df = df.merge(df_prof[['profissional_id', 'nome']], on="profissional_id", how="left").rename(columns={'nome': 'nome_profissional'})
+        # df = df.merge(df_loc[['id', 'local']], left_on="local_id", right_on="id", how="left").rename(columns={'local': 'sala'})
+
+        for col in ['especialidade', 'nome_profissional', 'sala']:
+            if col in df.columns:
+                df[col] = df[col].replace({'nan': None, 'NAN': None, 'NaN': None})
+                # Preenchimento final de segurança
+                fallback = "Indefinido" if col != 'especialidade' else "Especialidade"
+                df[col] = df[col].fillna(fallback)
+        et.saida(df)
+
+    with etapas.etapa("normalizacao", linhas_entrada=df) as et:
+        # Normalização
+        df_final, _ = normalize_and_validate(df)
+
+        # Remove salas inválidas para o mapa
+        remover = ['LABORATÓRIO', 'RAIO X', 'SALA DE VACINA', 'COLETA DOMICILIAR', 'VACINA', 'LABORATORIO']
+        df_final = df_final[~df_final['sala'].isin(remover)]
+        
+        # Fix Unidade
+        if unidade_id and unidade_id != 'Todas':
+            df_final['unidade'] = unidade_id
+        else:
+            # Os agendamentos já trazem 'nome_fantasia' (o merge criava _x/_y e 'unidade' sumia);
+            # vagas da grade não trazem unidade_id, então a unidade vem da sala
+            uid = df_final['local_id'].map(reg.sala_unidade)
+            if 'unidade_id' in df_final.columns:
+                uid = pd.to_numeric(df_final['unidade_id'], errors='coerce').fillna(uid)
+            df_final['unidade'] = uid.map(reg.unidade_nome)
+
+        df_final['unidade'] = df_final['unidade'].fillna("Geral")
+        df_final = df_final[~df_final['sala'].str.upper().isin(['SALA DE VACINA', 'LABORATÓRIO', 'RAIO X'])]
+        et.saida(df_final)
 
     # Geração
-    out_bytes = {}
+    out_bytes = ResultadoMapas(metricas=metricas)
 
     nota_rodape = "" # Padrão: Vazio
+    # Data/hora da geração à parte (fora da chave do cache de PDFs); o rodapé leva os marcadores
+    carimbo = carimbo_geracao()
 
     # Se a semana começa HOJE ou no PASSADO, haverá simulação.
     # Se a semana começa AMANHÃ (start_dt > today), é 100% futuro/real -> Sem nota.
     if start_dt <= today:
-        now = datetime.now()
-        timestamp = now.strftime('%d/%m/%Y às %H:%M')
-        hora_corte = now.strftime('%H:%M')
-        
         nota_rodape = (
-            f"Relatório gerado em {timestamp}. "
-            f"Para datas passadas e horários de hoje anteriores a {hora_corte}, "
-            f"as grades são simuladas baseados na próxima agenda (D+7). "
-            f"Datas futuras e horários de hoje após {hora_corte} utilizam dados reais da API."
+            "Relatório gerado em {timestamp}. "
+            "Para datas passadas e horários de hoje anteriores a {hora_corte}, "
+            f"{_nota_rodape_passado(metricas) or 'as grades são simuladas baseados na próxima agenda (D+7)'}. "
+            "Datas futuras e horários de hoje após {hora_corte} utilizam dados reais da API."
         )
 
-    for unidade in df_final["unidade"].unique():
-        if not unidade: continue
-        
-        # Filtra e gera
-        matrices, occ, days = build_matrices(df_final[df_final["unidade"] == unidade], include_taxa=False)
-        
-        pdf_bytes = render_pdf_from_template(
-            unidade, matrices, occ, days, start_date_str, end_date_str, 
-            "templates/semanal2.html", cell_font_size_px=9, return_bytes=True,
-            footer_text=nota_rodape 
-        )
-        out_bytes[unidade] = pdf_bytes
-        
+    # Matrizes por unidade aqui; o write_pdf (CPU-bound) vai em paralelo para o pool de processos
+    with etapas.etapa("agregacao", linhas_entrada=df_final) as et:
+        tarefas = {}
+        for unidade in df_final["unidade"].unique():
+            if not unidade: continue
+            
+            # Filtra e gera
+            matrices, occ, days = build_matrices(df_final[df_final["unidade"] == unidade], include_taxa=False)
+            
+            tarefas[unidade] = dict(
+                unidade=unidade, matrices=matrices, occupancy=occ, day_names=days,
+                week_start_date=start_date_str, week_end_date=end_date_str,
+                template_path="templates/semanal2.html", cell_font_size_px=9,
+                footer_text=nota_rodape, carimbo=carimbo,
+            )
+        et.saida(tarefas)
+
+    with etapas.etapa("renderizacao", linhas_entrada=tarefas) as et:
+        out_bytes.update(render_pdfs(tarefas, max_workers=_workers_render(), metricas=metricas))
+        et.saida(out_bytes)
     return out_bytes
 
+@perfilado("diario")
 def generate_daily_maps(start_date, unidade_id=None, output_dir="mapas_gerados"):
     start_date_str = start_date if isinstance(start_date, str) else start_date.strftime("%d-%m-%Y")
     
     DE_PARA_UNIDADES_VAGAS = { 39867: 12, 12: 12 }
-    df_unid_list = list_unidades()
+    reg = get_registry()
 
     # 1. Identificação da Unidade
     unidade_sel_id = None
     if unidade_id and unidade_id != 'Todas':
-        filtro = df_unid_list[df_unid_list['nome_fantasia'] == unidade_id]
-        if not filtro.empty:
-            raw_id = int(filtro['unidade_id'].iloc[0])
+        raw_id = reg.unidade_id_por_nome.get(unidade_id)
+        if raw_id is not None:
             unidade_sel_id = DE_PARA_UNIDADES_VAGAS.get(raw_id, raw_id)
 
     # 2. Busca Agendamentos
-    df_ag = fetch_agendamentos(start_date=start_date_str, end_date=start_date_str, unidade_id=unidade_sel_id)
-    if df_ag.empty: return {"warning": "Sem agendamentos para esta data."}
-
-    # Garante tipagem inicial
-    for col in ['profissional_id', 'local_id', 'especialidade_id', 'agendamento_id', 'status_id']:
-        if col in df_ag.columns:
-            df_ag[col] = pd.to_numeric(df_ag[col], errors='coerce').fillna(0).astype(int)
-
-    # Remoção de status inválidos
-    required_status = [1, 7, 2, 3, 4]
-    df_ag = df_ag[df_ag['status_id'].isin(required_status)]
+    metricas = {}
+    etapas = Etapas(metricas)
+    with etapas.etapa("agendamentos") as et:
+        df_ag = fetch_agendamentos(start_date=start_date_str, end_date=start_date_str, unidade_id=unidade_sel_id)
+        et.entrada(df_ag)
+        if df_ag.empty: return ResultadoMapas({"warning": "Sem agendamentos para esta data."}, metricas=metricas)
+        _observar_elenco(df_ag, unidade_sel_id)
+
+        # Bloqueios do dia: um único snapshot reutilizado pela simulação e pelo filtro final
+        bloqueios = _carregar_bloqueios(start_date_str, start_date_str, metricas)
+
+        # Garante tipagem inicial
+        for col in ['profissional_id', 'local_id', 'especialidade_id', 'agendamento_id', 'status_id']:
+            if col in df_ag.columns:
+                df_ag[col] = pd.to_numeric(df_ag[col], errors='coerce').fillna(0).astype(int)
+
+        # Remoção de status inválidos
+        required_status = [1, 7, 2, 3, 4]
+        df_ag = df_ag[df_ag['status_id'].isin(required_status)]
+        et.saida(df_ag)
 
     # 3. Injeção de Grade
     profs = df_ag["profissional_id"].unique()
     all_slots = []
     
-    for p_id in profs:
-        p_int = int(p_id)
-        if p_int == 0: continue
+    with etapas.etapa("grade", linhas_entrada=len(profs)) as et:
+        pedidos_simulados = []
+
+        # Grade local do dia (gravada ou por template; uma leitura para todos os profissionais, só até hoje)
+        dt_alvo = datetime.strptime(start_date_str, "%d-%m-%Y").date()
+        gravadas = {}
+        if dt_alvo <= relogio.hoje():
+            gravadas = _grades_locais(unidade_sel_id, dt_alvo, dt_alvo, [int(p) for p in profs if int(p) != 0], metricas)
+
+        for p_id in profs:
+            p_int = int(p_id)
+            if p_int == 0: continue
 
-        specs_do_dia = df_ag[df_ag['profissional_id'] == p_int]['especialidade_id'].unique()
-        specs_do_dia = [int(s) for s in specs_do_dia if s > 0]
+            specs_do_dia = df_ag[df_ag['profissional_id'] == p_int]['especialidade_id'].unique()
+            specs_do_dia = [int(s) for s in specs_do_dia if s > 0]
         
-        # Se não achou especialidade no agendamento, busca a principal para poder consultar a grade
-        if not specs_do_dia:
-            sid_main = get_main_specialty_id(p_int)
-            if sid_main: specs_do_dia = [sid_main]
-            
-        for sid in specs_do_dia:
-            # ====================
-            # IMPLEMENTAÇÃO DA BUSCA HÍBRIDA PARA DADOS RETROATIVOS
-            # Para desativar, substituir pela chamada direta à API: fetch_horarios_disponiveis(...)
-            # ====================
-            v_df = _fetch_grade_simulada(
-                unidade_id=unidade_sel_id,
-                date_str=start_date_str, # Passamos apenas a data do dia
-                profissional_id=p_int, 
-                especialidade_id=int(sid)
-            )
+            # Se não achou especialidade no agendamento, busca a principal para poder consultar a grade
+            if not specs_do_dia:
+                sid_main = get_main_specialty_id(p_int)
+                if sid_main: specs_do_dia = [sid_main]
             
-            if not v_df.empty:
-                v_df['agendamento_id'] = 0
-                v_df['status_id'] = 0
-                v_df['profissional_id'] = p_int
-                v_df['especialidade_id'] = int(sid)
-                
-                if 'local_id' not in v_df.columns or v_df['local_id'].sum() == 0:
-                     locais = df_ag[df_ag['profissional_id'] == p_int]['local_id'].unique()
-                     local_fallback = locais[0] if len(locais) > 0 else 0
-                     v_df['local_id'] = int(local_fallback)
-                
-                all_slots.append(v_df)
+            for sid in specs_do_dia:
+                # ====================
+                # IMPLEMENTAÇÃO DA BUSCA HÍBRIDA PARA DADOS RETROATIVOS
+                # Para desativar, substituir pela chamada direta à API: fetch_horarios_disponiveis(...)
+                # ====================
+                pedidos_simulados.append({
+                    'unidade_id': unidade_sel_id,
+                    'date_str': start_date_str, # Passamos apenas a data do dia
+                    'profissional_id': p_int,
+                    'especialidade_id': int(sid),
+                    'bloqueios': bloqueios,
+                    'grade_gravada': gravadas.get((p_int, dt_alvo)),
+                })
+
+        if dt_alvo <= relogio.hoje():
+            metricas['grades_espelho'] = sum(1 for ped in pedidos_simulados if ped['grade_gravada'] is None)
+
+        # Executa as simulações em lote (paralelo) e preserva a ordem dos pedidos
+        resultados_simulados = _executar_em_lote(_fetch_grade_simulada, pedidos_simulados)
+
+        for pedido, v_df in zip(pedidos_simulados, resultados_simulados):
+            if v_df is None or v_df.empty:
+                continue
+
+            p_int = pedido['profissional_id']
+            v_df['agendamento_id'] = 0
+            v_df['status_id'] = 0
+            v_df['profissional_id'] = p_int
+            v_df['especialidade_id'] = pedido['especialidade_id']
+        
+            if 'local_id' not in v_df.columns or v_df['local_id'].sum() == 0:
+                 locais = df_ag[df_ag['profissional_id'] == p_int]['local_id'].unique()
+                 local_fallback = locais[0] if len(locais) > 0 else 0
+                 v_df['local_id'] = int(local_fallback)
+        
+            all_slots.append(v_df)
+        et.saida(sum(len(s) for s in all_slots))
 
     # ==============================================================================
     # VARREDURA COMPLEMENTAR: BUSCAR MÉDICOS SEM AGENDAMENTO (GRADE VAZIA)
     # ==============================================================================
-    # Lista de quem já foi processado no loop anterior
-    processed_ids = set(map(int, profs))
-    
-    # Lista total de profissionais ativos no sistema (df_prof é global)
-    # Filtra apenas quem está ativo (se houver coluna de status) ou pega todos
-    all_prof_ids = df_prof['profissional_id'].unique()
-
-    for p_id in all_prof_ids:
-        p_int = int(p_id)
+    # Quem já foi processado no loop anterior (tinha agendamento) fica de fora; dos demais,
+    # só o elenco da unidade (core.roster) é sondado, exceto na varredura completa periódica
+    with etapas.etapa("ociosos") as et:
+        processed_ids = set(map(int, profs))
+        ociosos, varredura_completa = _profissionais_ociosos(reg, unidade_sel_id, processed_ids, metricas)
+        et.entrada(ociosos)
+        pedidos_ociosos = []
+
+        for p_int in ociosos:
+            # Busca especialidade principal para poder consultar a grade
+            sid = get_main_specialty_id(p_int)
         
-        # Se já processamos este médico (porque ele tinha agendamento), pula
-        if p_int in processed_ids:
-            continue
+            if sid:
+                # 1/2. Nomes textuais da especialidade e do profissional (impede o NaN no mapa)
+                nome_especialidade = str(reg.especialidade_nome.get(int(sid), "Especialidade"))
+                nome_profissional = str(reg.prof_nome.get(p_int, f"Prof. ID {p_int}"))
+
+                # 3. Busca direta (médicos sem agendamento não precisam de simulação)
+                pedidos_ociosos.append({
+                    'unidade_id': unidade_sel_id,
+                    'data_start': start_date_str,
+                    'data_end': start_date_str,
+                    'profissional_id': p_int,
+                    'especialidade_id': int(sid),
+                    'extras': {
+                        'agendamento_id': 0,
+                        'status_id': 0,
+                        'profissional_id': p_int,
+                        'especialidade_id': int(sid),
+                        'profissional': nome_profissional,
+                        'especialidade': nome_especialidade,
+                    },
+                })
+
+        varredura = {}
+        vagas_extra = fetch_horarios_ociosos_lote(pedidos_ociosos, varredura=varredura)
+        _registrar_ociosos(unidade_sel_id, varredura, varredura_completa)
+        if not vagas_extra.empty:
+            # Garante que a coluna 'local_id' existe (necessário para o mapa diário)
+            if 'local_id' not in vagas_extra.columns:
+                vagas_extra['local_id'] = 0
+            all_slots.append(vagas_extra)
+        et.saida(vagas_extra)
+
+    with etapas.etapa("bloqueios") as et:
+        if all_slots:
+            df_grade = pd.concat(all_slots, ignore_index=True)
+            df_grade = df_grade.drop_duplicates(subset=['profissional_id', 'horario', 'local_id'])
+            df = pd.concat([df_ag, df_grade], ignore_index=True)
+        else:
+            df = df_ag.copy()
+        et.entrada(df)
 
-        # Busca especialidade principal para poder consultar a grade
-        sid = get_main_specialty_id(p_int)
-        
-        if sid:
-            # Tenta buscar horários para este médico "ocioso"
-            # Nota: Usamos a mesma lógica de busca (Híbrida ou Normal) que já está configurada na função
-            
-            # --- Se for no MAPA SEMANAL e estiver usando Busca Híbrida: ---
-            # (Copie a lógica de USAR_BUSCA_HIBRIDA se estiver dentro do semanal)
-            # Para simplificar aqui, vou colocar a busca direta, mas idealmente deve seguir o padrão da função:
-            
-            vagas_extra = pd.DataFrame()
-            
-            # Exemplo genérico (serve para Diário e Semanal simples):
-            vagas_extra = fetch_horarios_disponiveis(
-                unidade_sel_id, start_date_str, start_date_str, p_int, especialidade_id=int(sid)
-            )
+        # Parse único de data/horário para inteiros (dia_ord, segundo, minuto), usado daqui em diante
+        df = adicionar_colunas_tempo(df)
 
-            # --- Se for MAPA SEMANAL COM SIMULAÇÃO, você precisaria replicar a lógica do while/loop aqui ---
-            # Mas geralmente, médicos sem agendamento no passado não precisam de simulação complexa 
-            # pois não há "buracos" de agendamentos passados para preencher. 
-            # A busca direta costuma resolver a maioria dos casos de "Agenda Aberta Vazia".
-
-            if not vagas_extra.empty:
-                # 1. Busca o nome da especialidade no df_esp global usando o sid
-                # Filtramos pela coluna ID e pegamos o valor da coluna de texto (nome ou especialidade)
-                col_texto_esp = 'especialidade' if 'especialidade' in df_esp.columns else 'nome'
-                esp_match = df_esp[df_esp['especialidade_id'] == int(sid)]
-                nome_especialidade = str(esp_match[col_texto_esp].iloc[0]) if not esp_match.empty else "Especialidade"
-
-                # 2. Busca o nome do profissional no df_prof global para evitar NaN lá também
-                prof_match = df_prof[df_prof['profissional_id'] == p_int]
-                nome_profissional = str(prof_match['nome'].iloc[0]) if not prof_match.empty else f"Prof. ID {p_int}"
-
-                # 3. Preenche o DataFrame de forma "blindada"
-                vagas_extra = vagas_extra.copy()
-                vagas_extra['agendamento_id'] = 0
-                vagas_extra['status_id'] = 0
-                vagas_extra['profissional_id'] = p_int
-                vagas_extra['especialidade_id'] = int(sid)
-                
-                # Injeta os nomes textuais (isso impede o NaN no mapa)
-                vagas_extra['profissional'] = nome_profissional
-                vagas_extra['especialidade'] = nome_especialidade
-
-                # Garante que a coluna 'local_id' existe (necessário para o mapa diário)
-                if 'local_id' not in vagas_extra.columns:
-                    vagas_extra['local_id'] = 0
-
-                all_slots.append(vagas_extra)
-
-    if all_slots:
-        df_grade = pd.concat(all_slots, ignore_index=True)
-        df_grade = df_grade.drop_duplicates(subset=['profissional_id', 'horario', 'local_id'])
-        df = pd.concat([df_ag, df_grade], ignore_index=True)
-    else:
-        df = df_ag.copy()
-
-    # Aplica filtro de bloqueios
-    df = _remove_blocked_slots(df, start_date_str, start_date_str, unidade_id=unidade_sel_id)
-    if df.empty: return {"warning": "Todos os agendamentos/vagas coincidem com bloqueios de agenda."}
+        # Aplica filtro de bloqueios
+        df = _remove_blocked_slots(df, start_date_str, start_date_str, unidade_id=unidade_sel_id, bloqueios=bloqueios)
+        et.saida(df)
+        if df.empty: return ResultadoMapas({"warning": "Todos os agendamentos/vagas coincidem com bloqueios de agenda."}, metricas=metricas)
 
-    # ==============================================================================
-    # [PASSO 1] RECUPERAÇÃO E SANEAMENTO DE DADOS (Antes do Merge)
-    # ==============================================================================
+    with etapas.etapa("enriquecimento", linhas_entrada=df) as et:
+        # ==============================================================================
+        # [PASSO 1] RECUPERAÇÃO E SANEAMENTO DE DADOS (Antes do Merge)
+        # ==============================================================================
     
-    # 1. Garante que IDs sejam numéricos
-    df['especialidade_id'] = pd.to_numeric(df['especialidade_id'], errors='coerce').fillna(0).astype(int)
-    df['profissional_id'] = pd.to_numeric(df['profissional_id'], errors='coerce').fillna(0).astype(int)
-    df['local_id'] = pd.to_numeric(df['local_id'], errors='coerce').fillna(0).astype(int)
+        # 1. Garante que IDs sejam numéricos
+        df['especialidade_id'] = pd.to_numeric(df['especialidade_id'], errors='coerce').fillna(0).astype(int)
+        df['profissional_id'] = pd.to_numeric(df['profissional_id'], errors='coerce').fillna(0).astype(int)
+        df['local_id'] = pd.to_numeric(df['local_id'], errors='coerce').fillna(0).astype(int)
 
-    # 2. Remove imediatamente linhas sem médico (profissional_id == 0)
-    # Se não tem ID de médico, é lixo de base e não serve para o mapa.
-    df = df[df['profissional_id'] > 0]
+        # 2. Remove imediatamente linhas sem médico (profissional_id == 0)
+        # Se não tem ID de médico, é lixo de base e não serve para o mapa.
+        df = df[df['profissional_id'] > 0]
 
-    # 3. Tenta salvar especialidade zerada buscando a principal do médico
-    mask_sem_spec = df['especialidade_id'] == 0
+        # 3. Tenta salvar especialidade zerada buscando a principal do médico
+        mask_sem_spec = df['especialidade_id'] == 0
     
-    if mask_sem_spec.any():
-        print(f"DEBUG: Tentando recuperar especialidade para {mask_sem_spec.sum()} registros...")
+        if mask_sem_spec.any():
+            print(f"DEBUG: Tentando recuperar especialidade para {mask_sem_spec.sum()} registros...")
         
-        def recuperar_spec(row):
-            # Se já tem, mantém
-            if row['especialidade_id'] > 0: return row['especialidade_id']
-            # Se não tem, busca na API/Cache
-            pid = row['profissional_id']
-            spec_recuperada = get_main_specialty_id(pid)
-            return spec_recuperada if spec_recuperada else 0
-            
-        # Aplica a recuperação linha a linha onde necessário
-        df.loc[mask_sem_spec, 'especialidade_id'] = df.loc[mask_sem_spec].apply(recuperar_spec, axis=1)
+            # Especialidade principal do médico, direto do registro (sem busca linha a linha)
+            principal = df.loc[mask_sem_spec, 'profissional_id'].map(reg.prof_especialidade_principal)
+            df.loc[mask_sem_spec, 'especialidade_id'] = principal.fillna(0).astype(int)
+
+        # ==============================================================================
+        # 5. Merges (Agora com IDs mais limpos)
+        mapa_esp = reg.especialidade_nome
+        mapa_loc = reg.sala_nome
+        mapa_prof = reg.prof_nome
+
+        if 'especialidade' not in df.columns:
+            df['especialidade'] = df['especialidade_id'].map(mapa_esp)
+        else:
+            df['especialidade'] = df['especialidade'].fillna(df['especialidade_id'].map(mapa_esp))
 
-    # ==============================================================================
-    # 5. Merges (Agora com IDs mais limpos)
-    mapa_esp = df_esp.set_index('especialidade_id')['nome'].to_dict()
-    mapa_loc = df_loc.set_index('id')['local'].to_dict()
-    mapa_prof = df_prof.set_index('profissional_id')['nome'].to_dict()
-
-    if 'especialidade' not in df.columns:
-        df['especialidade'] = df['especialidade_id'].map(mapa_esp)
-    else:
-        df['especialidade'] = df['especialidade'].fillna(df['especialidade_id'].map(mapa_esp))
-
-    if 'sala' not in df.columns:
-        df['sala'] = df['local_id'].map(mapa_loc)
-    else:
-        df['sala'] = df['sala'].fillna(df['local_id'].map(mapa_loc))
-
-    if 'nome_profissional' not in df.columns:
-        df['nome_profissional'] = df['profissional_id'].map(mapa_prof)
-    else:
-        df['nome_profissional'] = df['nome_profissional'].fillna(df['profissional_id'].map(mapa_prof))
-
-    # df = df.merge(df_esp[['especialidade_id', 'nome']], on="especialidade_id", how="left").rename(columns={'nome': 'especialidade'})
-    # df = df.merge(df_prof[['profissional_id', 'nome']], on="profissional_id", how="left").rename(columns={'nome': 'nome_profissional'})
-    # df = df.merge(df_loc[['id', 'local']], left_on="local_id", right_on="id", how="left").rename(columns={'local': 'sala'})
+        if 'sala' not in df.columns:
+            df['sala'] = df['local_id'].map(mapa_loc)
+        else:
+            df['sala'] = df['sala'].fillna(df['local_id'].map(mapa_loc))
 
-    # ==============================================================================
-    # [PASSO 2] LIMPEZA FINAL (Pós-Merge)
-    # ==============================================================================
+        if 'nome_profissional' not in df.columns:
+            df['nome_profissional'] = df['profissional_id'].map(mapa_prof)
+        else:
+            df['nome_profissional'] = df['nome_profissional'].fillna(df['profissional_id'].map(mapa_prof))
+
+        # df = df.merge(df_esp[['especialidade_id', 'nome']], on="especialidade_id", how="left").rename(columns={'nome': 'especialidade'})
+        # df = df.merge(df_prof[['profissional_id', 'nome']], on="profissional_id", how="left").rename(columns={'nome': 'nome_profissional'})
+        # df = df.merge(df_loc[['id', 'local']], left_on="local_id", right_on="id", how="left").rename(columns={'local': 'sala'})
+
+        # ==============================================================================
+        # [PASSO 2] LIMPEZA FINAL (Pós-Merge)
+        # ==============================================================================
     
-    # Converte para string para analisar o conteúdo textual
-    df['nome_profissional'] = df['nome_profissional'].astype(str).str.strip()
-    df['especialidade'] = df['especialidade'].astype(str).str.strip()
-    df['sala'] = df['sala'].astype(str).str.strip()
+        # Converte para string para analisar o conteúdo textual
+        df['nome_profissional'] = df['nome_profissional'].astype(str).str.strip()
+        df['especialidade'] = df['especialidade'].astype(str).str.strip()
+        df['sala'] = df['sala'].astype(str).str.strip()
     
-    # Termos proibidos (indica falha no merge ou dado nulo original)
-    termos_invalidos = ['nan', 'none', '', 'null', 'nat']
+        # Termos proibidos (indica falha no merge ou dado nulo original)
+        termos_invalidos = ['nan', 'none', '', 'null', 'nat']
     
-    # Filtros: Mantém apenas se O NOME E A ESPECIALIDADE forem válidos
-    keep_prof = ~df['nome_profissional'].str.lower().isin(termos_invalidos)
-    keep_spec = ~df['especialidade'].str.lower().isin(termos_invalidos)
-    keep_sala = ~df['sala'].str.lower().isin(termos_invalidos)
+        # Filtros: Mantém apenas se O NOME E A ESPECIALIDADE forem válidos
+        keep_prof = ~df['nome_profissional'].str.lower().isin(termos_invalidos)
+        keep_spec = ~df['especialidade'].str.lower().isin(termos_invalidos)
+        keep_sala = ~df['sala'].str.lower().isin(termos_invalidos)
     
-    # Aplica o corte
-    df = df[keep_prof & keep_spec & keep_sala]
+        # Aplica o corte
+        df = df[keep_prof & keep_spec & keep_sala]
+        et.saida(df)
     
     # ==============================================================================
 
     # Normalização
-    df_final, _ = normalize_and_validate(df)
+    with etapas.etapa("normalizacao", linhas_entrada=df) as et:
+        df_final, _ = normalize_and_validate(df)
     
-    remover_visual = ['PRÉ ATENDIMENTO', 'COLETA DOMICILIAR', 'TELEMEDICINA']
-    df_final = df_final[~df_final['sala'].str.upper().str.contains('|'.join(remover_visual), na=False)]
+        remover_visual = ['PRÉ ATENDIMENTO', 'COLETA DOMICILIAR', 'TELEMEDICINA']
+        df_final = df_final[~df_final['sala'].str.upper().str.contains('|'.join(remover_visual), na=False)]
     
-    df_final['time'] = df_final['horario'].apply(to_time)
-    df_final['periodo'] = df_final['time'].apply(periodo_from_time)
+        df_final['periodo'] = periodo_por_minuto(df_final['minuto'])
+        et.saida(df_final)
     
-    # 6. Agrupamento
-    master_data = {}
-    dados_uni = {
-        "Manhã": [], "Tarde": [], 
-        "totais": {'Manhã': {'grade': 0, 'pacientes': 0, 'taxa': 0}, 'Tarde': {'grade': 0, 'pacientes': 0, 'taxa': 0}, 'dia': {'grade': 0, 'pacientes': 0, 'taxa': 0}}
-    }
+    with etapas.etapa("agregacao", linhas_entrada=df_final) as et:
+        # 6. Agrupamento
+        master_data = {}
+        dados_uni = {
+            "Manhã": [], "Tarde": [], 
+            "totais": {'Manhã': {'grade': 0, 'pacientes': 0, 'taxa': 0}, 'Tarde': {'grade': 0, 'pacientes': 0, 'taxa': 0}, 'dia': {'grade': 0, 'pacientes': 0, 'taxa': 0}}
+        }
     
-    grouped = df_final.groupby(['sala', 'nome_profissional', 'especialidade', 'periodo']).agg(
-        pacientes_reais=('agendamento_id', lambda x: (pd.to_numeric(x, errors='coerce').fillna(0) > 0).sum()),
-        grade_total=('horario', 'count')
-    ).reset_index()
-
-    # Ordenação Natural
-    def natural_key(text):
-        return [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', str(text))]
-    grouped['sort_key'] = grouped['sala'].apply(natural_key)
-    grouped = grouped.sort_values(by='sort_key')
-
-    for _, row in grouped.iterrows():
-        g = int(row['grade_total'])
-        p = int(row['pacientes_reais'])
-        if g < p: g = p 
+        grouped = df_final.groupby(['sala', 'nome_profissional', 'especialidade', 'periodo']).agg(
+            pacientes_reais=('agendamento_id', lambda x: (pd.to_numeric(x, errors='coerce').fillna(0) > 0).sum()),
+            grade_total=('horario', 'count')
+        ).reset_index()
+
+        # Ordenação Natural (posição pré-calculada no registro)
+        grouped['sort_key'] = grouped['sala'].map(reg.rank_sala)
+        grouped = grouped.sort_values(by='sort_key')
+
+        for _, row in grouped.iterrows():
+            g = int(row['grade_total'])
+            p = int(row['pacientes_reais'])
+            if g < p: g = p 
         
-        taxa = (p / g * 100) if g > 0 else 0
+            taxa = (p / g * 100) if g > 0 else 0
         
-        item = {
-            'sala': row['sala'], 'periodo_detalhe': row['periodo'], 'especialidade': row['especialidade'],
-            'medico': row['nome_profissional'], 'ocupacao': p, 'vagas_grade': g, 'taxa_ocupacao': f"{taxa:.1f}%", 'taxa_num': taxa
-        }
+            item = {
+                'sala': row['sala'], 'periodo_detalhe': row['periodo'], 'especialidade': row['especialidade'],
+                'medico': row['nome_profissional'], 'ocupacao': p, 'vagas_grade': g, 'taxa_ocupacao': f"{taxa:.1f}%", 'taxa_num': taxa
+            }
         
-        if row['periodo'] in ["Manhã", "Tarde"]:
-            dados_uni[row['periodo']].append(item)
-            dados_uni['totais'][row['periodo']]['grade'] += g
-            dados_uni['totais'][row['periodo']]['pacientes'] += p
-
-    for per in ['Manhã', 'Tarde']:
-        g_t = dados_uni['totais'][per]['grade']
-        p_t = dados_uni['totais'][per]['pacientes']
-        dados_uni['totais'][per]['taxa'] = (p_t / g_t * 100) if g_t > 0 else 0
-        dados_uni['totais']['dia']['grade'] += g_t
-        dados_uni['totais']['dia']['pacientes'] += p_t
-
-    g_d = dados_uni['totais']['dia']['grade']
-    p_d = dados_uni['totais']['dia']['pacientes']
-    dados_uni['totais']['dia']['taxa'] = (p_d / g_d * 100) if g_d > 0 else 0
-
-    # 7. Cálculo de Salas Físicas (Mantido e ajustado)
-    salas_ignorar_contagem = ['PRÉ ATENDIMENTO', 'COLETA DOMICILIAR', "TELEMEDICINA", "TESTE"]
+            if row['periodo'] in ["Manhã", "Tarde"]:
+                dados_uni[row['periodo']].append(item)
+                dados_uni['totais'][row['periodo']]['grade'] += g
+                dados_uni['totais'][row['periodo']]['pacientes'] += p
+
+        for per in ['Manhã', 'Tarde']:
+            g_t = dados_uni['totais'][per]['grade']
+            p_t = dados_uni['totais'][per]['pacientes']
+            dados_uni['totais'][per]['taxa'] = (p_t / g_t * 100) if g_t > 0 else 0
+            dados_uni['totais']['dia']['grade'] += g_t
+            dados_uni['totais']['dia']['pacientes'] += p_t
+
+        g_d = dados_uni['totais']['dia']['grade']
+        p_d = dados_uni['totais']['dia']['pacientes']
+        dados_uni['totais']['dia']['taxa'] = (p_d / g_d * 100) if g_d > 0 else 0
+
+        # 7. Cálculo de Salas Físicas (Mantido e ajustado)
+        salas_ignorar_contagem = ['PRÉ ATENDIMENTO', 'COLETA DOMICILIAR', "TELEMEDICINA", "TESTE"]
     
-    if 'unidade_id' in df_loc.columns and unidade_sel_id:
-        df_salas_unid = df_loc[df_loc['unidade_id'] == int(unidade_sel_id)]
-        if df_salas_unid.empty: df_salas_unid = df_loc 
-    else:
-        df_salas_unid = df_loc.copy()
+        if 'unidade_id' in reg.df_loc.columns and unidade_sel_id:
+            df_salas_unid = reg.df_loc[reg.df_loc['unidade_id'] == int(unidade_sel_id)]
+            if df_salas_unid.empty: df_salas_unid = reg.df_loc 
+        else:
+            df_salas_unid = reg.df_loc.copy()
     
-    mask_ignorar = df_salas_unid['local'].astype(str).str.upper().apply(lambda x: any(ign in x for ign in salas_ignorar_contagem))
-    total_salas_fisicas = df_salas_unid[~mask_ignorar]['local'].nunique()
+        mask_ignorar = df_salas_unid['local'].astype(str).str.upper().apply(lambda x: any(ign in x for ign in salas_ignorar_contagem))
+        total_salas_fisicas = df_salas_unid[~mask_ignorar]['local'].nunique()
     
-    # --- CÁLCULO DE OCUPAÇÃO ---
-    salas_ativas_manha = df_final[df_final['periodo'] == 'Manhã']['sala'].nunique()
-    salas_ativas_tarde = df_final[df_final['periodo'] == 'Tarde']['sala'].nunique()
+        # --- CÁLCULO DE OCUPAÇÃO ---
+        salas_ativas_manha = df_final[df_final['periodo'] == 'Manhã']['sala'].nunique()
+        salas_ativas_tarde = df_final[df_final['periodo'] == 'Tarde']['sala'].nunique()
     
-    # Nova Lógica: O dia é a soma aritmética dos dois turnos
-    salas_ativas_dia_soma = salas_ativas_manha + salas_ativas_tarde
-    total_capacidade_dia = total_salas_fisicas * 2  # Capacidade Dobrada (Ex: 19 de manhã + 19 de tarde = 38)
+        # Nova Lógica: O dia é a soma aritmética dos dois turnos
+        salas_ativas_dia_soma = salas_ativas_manha + salas_ativas_tarde
+        total_capacidade_dia = total_salas_fisicas * 2  # Capacidade Dobrada (Ex: 19 de manhã + 19 de tarde = 38)
 
-    def calc_taxa(usadas, total):
-        return (usadas / total * 100) if total > 0 else 0
+        def calc_taxa(usadas, total):
+            return (usadas / total * 100) if total > 0 else 0
 
-    dados_uni['metricas_salas'] = {
-        'total_salas': total_salas_fisicas,      # Ex: 19
-        'total_salas_dia': total_capacidade_dia, # Ex: 38 (Use isso no HTML se quiser mostrar o denominador dobrado)
+        dados_uni['metricas_salas'] = {
+            'total_salas': total_salas_fisicas,      # Ex: 19
+            'total_salas_dia': total_capacidade_dia, # Ex: 38 (Use isso no HTML se quiser mostrar o denominador dobrado)
         
-        'ativas_manha': salas_ativas_manha,
-        'taxa_manha': calc_taxa(salas_ativas_manha, total_salas_fisicas),
+            'ativas_manha': salas_ativas_manha,
+            'taxa_manha': calc_taxa(salas_ativas_manha, total_salas_fisicas),
         
-        'ativas_tarde': salas_ativas_tarde,
-        'taxa_tarde': calc_taxa(salas_ativas_tarde, total_salas_fisicas),
+            'ativas_tarde': salas_ativas_tarde,
+            'taxa_tarde': calc_taxa(salas_ativas_tarde, total_salas_fisicas),
         
-        'ativas_dia': salas_ativas_dia_soma,     # Agora é a soma (Ex: 12 + 14 = 26)
-        'taxa_dia': calc_taxa(salas_ativas_dia_soma, total_capacidade_dia)
-    }
+            'ativas_dia': salas_ativas_dia_soma,     # Agora é a soma (Ex: 12 + 14 = 26)
+            'taxa_dia': calc_taxa(salas_ativas_dia_soma, total_capacidade_dia)
+        }
 
-    unidade_chave = unidade_id if unidade_id else "Geral"
-    master_data[unidade_chave] = dados_uni
+        unidade_chave = unidade_id if unidade_id else "Geral"
+        master_data[unidade_chave] = dados_uni
+        et.saida(len(grouped))
 
     dt_target = datetime.strptime(start_date_str, "%d-%m-%Y").date()
-    today = date.today()
+    today = relogio.hoje()
     
     nota_rodape = "" # Padrão: Vazio (Para datas futuras)
+    # Data/hora da geração à parte (fora da chave do cache de PDFs); o rodapé leva os marcadores
+    carimbo = carimbo_geracao()
 
     # Só exibe o aviso se for HOJE ou PASSADO (onde ocorre simulação)
     if dt_target <= today:
-        now = datetime.now()
-        timestamp = now.strftime('%d/%m/%Y às %H:%M')
-        hora_corte = now.strftime('%H:%M')
-        
+        origem = _nota_rodape_passado(metricas)
         nota_rodape = (
-            f"Relatório gerado em {timestamp}. "
-            f"Horários anteriores a {hora_corte} são simulados baseados na próxima agenda (D+7). "
-            f"Dados após {hora_corte} refletem informações reais da API."
+            "Relatório gerado em {timestamp}. "
+            + (f"Horários anteriores a {{hora_corte}}: {origem}. " if origem else
+               "Horários anteriores a {hora_corte} são simulados baseados na próxima agenda (D+7). ")
+            + "Dados após {hora_corte} refletem informações reais da API."
         )
 
-    tpl = Environment(loader=FileSystemLoader('.')).get_template("templates/diario.html")
+    with etapas.etapa("renderizacao", linhas_entrada=len(grouped)) as et:
+        tpl = Environment(loader=FileSystemLoader('.')).get_template("templates/diario.html")
     
-    html = tpl.render(
-        unidade=unidade_chave, 
-        all_data=master_data, 
-        date_str=start_date_str, 
-        grand_total=dados_uni['totais']['dia']['pacientes'], 
-        generated=datetime.now().strftime("%d/%m/%Y %H:%M"), # Mantém gerado em sempre visível no cabeçalho se houver
-        footer_text=nota_rodape  # <--- Vazio se for futuro, Texto se for hoje/passado
-    )
+        entradas = dict(
+            unidade=unidade_chave, 
+            all_data=master_data, 
+            date_str=start_date_str, 
+            grand_total=dados_uni['totais']['dia']['pacientes'], 
+            footer_text=nota_rodape  # <--- Vazio se for futuro, Texto se for hoje/passado
+        )
+        html = tpl.render({
+            **entradas,
+            "generated": carimbo["generated"], # Mantém gerado em sempre visível no cabeçalho se houver
+            "footer_text": aplicar_carimbo(nota_rodape, carimbo),
+        })
     
-    return {unidade_chave: HTML(string=html).write_pdf()}
\ No newline at end of file
+        # Dados idênticos a uma geração anterior: reaproveita o PDF (core.pdf_cache)
+        pdf_bytes = pdf_from_html(html, "templates/diario.html", metricas, entradas=entradas,
+                                  hora_corte=hora_corte_se_hoje(dt_target, dt_target, carimbo))
+        et.saida(1 if pdf_bytes else 0)
+    return ResultadoMapas({unidade_chave: pdf_bytes}, metricas=metricas)
\ No newline at end of file
@@ -0,0 +1,219 @@
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# ==========================================================
+# MÉTRICAS DAS CHAMADAS À API (POR ENDPOINT)
+# ==========================================================
+# request_endpoint registra cada chamada: latência (histograma com os buckets do
+# Prometheus), repetições, distribuição de status HTTP, bytes da resposta e
+# acertos/faltas do cache em disco. Os contadores são do processo (todas as sessões)
+# e podem ser exportados em JSON e no formato texto do Prometheus
+# (python -m core.metrics, CLI e página de Métricas).
+
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _novo_endpoint():
+    return {
+        "chamadas": 0,
+        "erros": 0,
+        "repeticoes": 0,
+        "status": {},
+        "bytes": 0,
+        "latencia_soma_s": 0.0,
+        "latencia_max_s": 0.0,
+        "latencia_buckets": [0] * (len(BUCKETS_LATENCIA) + 1),  # último = +Inf
+        "cache_hits": 0,
+        "cache_misses": 0,
+        "coalescidas": 0,
+    }
+
+
+class ApiMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.iniciado_em = time.time()
+        self._exportado_em = 0.0
+
+    def _ep(self, endpoint):
+        ep = self._endpoints.get(endpoint)
+        if ep is None:
+            ep = self._endpoints[endpoint] = _novo_endpoint()
+        return ep
+
+    # ---------------- registro ----------------
+    def registrar_chamada(self, endpoint, latencia_s, status=None, bytes_resposta=0, repeticoes=0, erro=False):
+        """Uma chamada HTTP concluída. status = código HTTP ou nome da exceção (falha sem resposta)."""
+        with self._lock:
+            ep = self._ep(endpoint)
+            ep["chamadas"] += 1
+            ep["erros"] += int(bool(erro))
+            ep["repeticoes"] += int(repeticoes)
+            chave = str(status) if status is not None else "desconhecido"
+            ep["status"][chave] = ep["status"].get(chave, 0) + 1
+            ep["bytes"] += int(bytes_resposta or 0)
+            ep["latencia_soma_s"] += latencia_s
+            ep["latencia_max_s"] = max(ep["latencia_max_s"], latencia_s)
+            i = next((i for i, limite in enumerate(BUCKETS_LATENCIA) if latencia_s <= limite), len(BUCKETS_LATENCIA))
+            ep["latencia_buckets"][i] += 1
+        self._exportar_se_devido()
+
+    def registrar_cache(self, endpoint, acerto):
+        with self._lock:
+            self._ep(endpoint)["cache_hits" if acerto else "cache_misses"] += 1
+
+    def registrar_coalescida(self, endpoint):
+        with self._lock:
+            self._ep(endpoint)["coalescidas"] += 1
+
+    def limpar(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.iniciado_em = time.time()
+
+    # ---------------- leitura ----------------
+    @staticmethod
+    def _percentil(buckets, total, q):
+        """Limite superior do bucket que contém o percentil q (estimativa, como no Prometheus)."""
+        if not total:
+            return None
+        alvo = q * total
+        acumulado = 0
+        for limite, n in zip(BUCKETS_LATENCIA + (float("inf"),), buckets):
+            acumulado += n
+            if acumulado >= alvo:
+                return limite
+        return float("inf")
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {nome: {**ep, "status": dict(ep["status"]), "latencia_buckets": list(ep["latencia_buckets"])}
+                         for nome, ep in self._endpoints.items()}
+            iniciado_em = self.iniciado_em
+        for ep in endpoints.values():
+            n = ep["chamadas"]
+            ep["latencia_media_s"] = ep["latencia_soma_s"] / n if n else 0.0
+            ep["latencia_p50_s"] = self._percentil(ep["latencia_buckets"], n, 0.5)
+            ep["latencia_p95_s"] = self._percentil(ep["latencia_buckets"], n, 0.95)
+            consultas = ep["cache_hits"] + ep["cache_misses"]
+            ep["cache_taxa_acerto"] = ep["cache_hits"] / consultas if consultas else 0.0
+        return {
+            "gerado_em": time.time(),
+            "iniciado_em": iniciado_em,
+            "pid": os.getpid(),
+            "buckets_latencia_s": list(BUCKETS_LATENCIA),
+            "endpoints": endpoints,
+        }
+
+    def para_prometheus(self, snap=None):
+        """Formato texto de exposição do Prometheus."""
+        snap = snap or self.snapshot()
+        linhas = []
+
+        def metrica(nome, tipo, ajuda):
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+
+        eps = sorted(snap["endpoints"].items())
+        contadores = [
+            ("feegow_api_requests_total", "chamadas", "Chamadas HTTP por endpoint"),
+            ("feegow_api_errors_total", "erros", "Chamadas que terminaram em erro"),
+            ("feegow_api_retries_total", "repeticoes", "Repetições (429/5xx/conexão)"),
+            ("feegow_api_response_bytes_total", "bytes", "Bytes de resposta recebidos"),
+            ("feegow_api_cache_hits_total", "cache_hits", "Respostas servidas pelo cache em disco"),
+            ("feegow_api_cache_misses_total", "cache_misses", "Consultas ao cache em disco sem resposta válida"),
+            ("feegow_api_coalesced_total", "coalescidas", "Chamadas atendidas por uma requisição idêntica em voo"),
+        ]
+        for nome, campo, ajuda in contadores:
+            metrica(nome, "counter", ajuda)
+            for ep, dados in eps:
+                linhas.append(f'{nome}{{endpoint="{ep}"}} {dados[campo]}')
+
+        metrica("feegow_api_responses_total", "counter", "Respostas por status HTTP (ou exceção)")
+        for ep, dados in eps:
+            for status, n in sorted(dados["status"].items()):
+                linhas.append(f'feegow_api_responses_total{{endpoint="{ep}",status="{status}"}} {n}')
+
+        metrica("feegow_api_latency_seconds", "histogram", "Latência das chamadas (inclui repetições)")
+        for ep, dados in eps:
+            acumulado = 0
+            for limite, n in zip(BUCKETS_LATENCIA + (float("inf"),), dados["latencia_buckets"]):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else f"{limite:g}"
+                linhas.append(f'feegow_api_latency_seconds_bucket{{endpoint="{ep}",le="{le}"}} {acumulado}')
+            linhas.append(f'feegow_api_latency_seconds_sum{{endpoint="{ep}"}} {dados["latencia_soma_s"]:.6f}')
+            linhas.append(f'feegow_api_latency_seconds_count{{endpoint="{ep}"}} {dados["chamadas"]}')
+        return "\n".join(linhas) + "\n"
+
+    # ---------------- exportação ----------------
+    def exportar(self, pasta):
+        """Grava api_metrics.json e api_metrics.prom em `pasta` (escrita atômica). Retorna os caminhos."""
+        pasta = Path(pasta)
+        pasta.mkdir(parents=True, exist_ok=True)
+        snap = self.snapshot()
+        saidas = {
+            pasta / "api_metrics.json": json.dumps(snap, ensure_ascii=False, indent=2, default=str),
+            pasta / "api_metrics.prom": self.para_prometheus(snap),
+        }
+        for destino, conteudo in saidas.items():
+            tmp = destino.with_suffix(f"{destino.suffix}.{os.getpid()}.tmp")
+            tmp.write_text(conteudo, encoding="utf-8")
+            os.replace(tmp, destino)
+        self._exportado_em = time.time()
+        return list(saidas)
+
+    def _exportar_se_devido(self):
+        pasta, intervalo = config_exportacao()
+        if not pasta or time.time() - self._exportado_em < intervalo:
+            return
+        self._exportado_em = time.time()  # marca antes: só uma thread exporta por intervalo
+        try:
+            self.exportar(pasta)
+        except OSError as e:
+            print(f"[METRICS ERROR] exportação: {e}")
+
+
+_CONFIG_EXPORTACAO = None
+
+
+def configurar_exportacao(pasta, intervalo_s=60):
+    """Exporta automaticamente a cada `intervalo_s` (e ao sair). pasta=None desliga."""
+    global _CONFIG_EXPORTACAO
+    _CONFIG_EXPORTACAO = (str(pasta) if pasta else None, float(intervalo_s))
+
+
+def config_exportacao():
+    return _CONFIG_EXPORTACAO or (None, 0.0)
+
+
+_METRICAS = ApiMetrics()
+
+
+def get_api_metrics():
+    return _METRICAS
+
+
+@atexit.register
+def _exportar_ao_sair():
+    pasta, _ = config_exportacao()
+    if pasta and _METRICAS._endpoints:
+        try:
+            _METRICAS.exportar(pasta)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mostra as métricas exportadas da API.")
+    parser.add_argument("pasta", nargs="?", default=".cache/metrics")
+    parser.add_argument("--prometheus", action="store_true", help="Mostra o arquivo .prom em vez do JSON")
+    args = parser.parse_args()
+    arquivo = Path(args.pasta) / ("api_metrics.prom" if args.prometheus else "api_metrics.json")
+    print(arquivo.read_text(encoding="utf-8") if arquivo.exists() else f"{arquivo} não encontrado")
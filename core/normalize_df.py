@@ -1,138 +1,136 @@
 # --- Normalização e validação do DataFrame antes da agregação ---
+import numpy as np
 import pandas as pd
-import re
-from datetime import datetime
 
-def normalize_and_validate(df):
+from core.time_columns import (
+    colunas_tipadas, datas_por_ordinal, marcar_tipadas, minutos_por_segundo, ordinal_dia,
+    segundos_do_dia, time_por_segundo,
+)
+
+TEXT_COLS = ['nome_profissional', 'especialidade', 'sala']
+
+def _texto_por_valor(serie, normalizar):
+    """
+    Aplica `normalizar` uma vez por valor distinto (salas, nomes e especialidades se repetem
+    em milhares de linhas) e espalha o resultado pelos códigos do factorize.
+    """
+    codigos, valores = pd.factorize(serie)
+    normalizados = np.array([normalizar(v) for v in valores] + [None], dtype=object)
+    out = normalizados[codigos]
+    nulos = codigos < 0
+    if nulos.any():  # None e NaN viram textos diferentes ('None' / 'nan'): um a um
+        out[nulos] = [normalizar(v) for v in serie.to_numpy()[nulos]]
+    return pd.Series(out, index=serie.index, dtype=object)
+
+def _texto(v):
+    # Mesmo resultado de astype(str).str.strip() (None -> 'None', NaN -> 'nan')
+    return str(v).strip()
+
+def _nome_fantasia(v):
+    # Vazio vira '<NA>' (NA convertido para texto); espaços duplos são colapsados
+    s = " ".join(str(v).split())
+    return s if s else str(pd.NA)
+
+def normalize_and_validate(df, diagnostics=False):
     """
     Recebe df (provavelmente com colunas object) e:
       - normaliza nomes (strip, case)
       - converte agendamento_id para int (quando possível)
-      - converte 'data' para datetime.date (dayfirst=True)
-      - converte 'horario' para datetime.time (tenta vários formatos)
+      - converte 'data' para datetime.date (DD-MM-AAAA ou ISO) e mantém 'dia_ord' (int32)
+      - converte 'horario' para datetime.time (vários formatos, com segundos) e mantém
+        'segundo' (int32) e 'minuto' (int16)
       - reporta problemas e devolve df limpo
+    Colunas que já estão no tipo alvo (agendamento_id Int64, dia_ord int32, segundo int32, minuto int16)
+    não são reconvertidas; textos, 'data' e 'horario' marcados como tipados em df.attrs (por
+    adicionar_colunas_tempo ou por uma normalização anterior) também não. As amostras de
+    linhas problemáticas só são montadas com diagnostics=True (os geradores de mapa
+    descartam o diagnóstico).
     Retorna: (df_clean, diagnostics_dict)
     """
-    df = df.copy()
+    df = df.copy(deep=False)  # só troca colunas inteiras: o df do chamador não é alterado
     diag = {}
+    # Só vale a marca de coluna que ainda é object (date/time/str); reatribuída com outro tipo, refaz
+    tipadas = {c for c in colunas_tipadas(df) if c in df.columns and df[c].dtype == object}
 
-    # Trim strings e normalizar colunas de texto
-    text_cols = ['nome_profissional', 'nome_fantasia', 'especialidade', 'sala']
-    for c in text_cols:
-        if c in df.columns:
-            df[c] = df[c].astype(str).fillna('').str.strip()
-            # optionally uppercase
-            # df[c] = df[c].str.upper()
+    # Texto: strip (e colapso de espaços em 'nome_fantasia') por valor distinto
+    for c in TEXT_COLS:
+        if c in df.columns and c not in tipadas:
+            df[c] = _texto_por_valor(df[c], _texto)
+    if 'nome_fantasia' in df.columns and 'nome_fantasia' not in tipadas:
+        df['nome_fantasia'] = _texto_por_valor(df['nome_fantasia'], _nome_fantasia)
 
     # agendamento_id -> inteiro quando possível
     if 'agendamento_id' in df.columns:
         before = df['agendamento_id'].dtype
-        df['agendamento_id'] = pd.to_numeric(df['agendamento_id'], errors='coerce').astype('Int64')
+        if before != 'Int64':
+            df['agendamento_id'] = pd.to_numeric(df['agendamento_id'], errors='coerce').astype('Int64')
         diag['agendamento_id_before_dtype'] = str(before)
         diag['agendamento_id_nulls'] = int(df['agendamento_id'].isna().sum())
     else:
         diag['agendamento_id_present'] = False
 
-    # DATA: tentar parse com dayfirst True (DD-MM-YYYY)
+    # DATA e HORARIO: parse vetorizado único para inteiros (core.time_columns), reaproveitando
+    # 'dia_ord'/'segundo'/'minuto' se o pipeline já os calculou; 'data'/'horario' viram date/time
+    # a partir deles (sem strptime/regex por célula).
+    # Horários aceitos: '08:00', '08:00:00', '2025-12-01T08:00:00', '08h00'
+    sem_data = sem_horario = None
     if 'data' in df.columns:
         before = df['data'].dtype
-        # Primeira tentativa: formato dd-mm-YYYY
-        df['data_parsed'] = pd.to_datetime(df['data'], dayfirst=True, errors='coerce')
-        # Segunda tentativa: ISO fallback
-        mask_na = df['data_parsed'].isna()
-        if mask_na.any():
-            df.loc[mask_na, 'data_parsed'] = pd.to_datetime(df.loc[mask_na, 'data'], errors='coerce')
-        # Extrair só a data
-        df['data'] = df['data_parsed'].dt.date
+        if 'dia_ord' not in df.columns:
+            df['dia_ord'] = ordinal_dia(df['data'])
+            tipadas.discard('data')
+        elif df['dia_ord'].dtype != np.int32:
+            df['dia_ord'] = df['dia_ord'].astype('int32')
+        sem_data = (df['dia_ord'] < 0).to_numpy()
+        if 'data' not in tipadas:
+            df['data'] = datas_por_ordinal(df['dia_ord']).to_numpy()
         diag['data_before_dtype'] = str(before)
-        diag['data_parse_nulls'] = int(df['data_parsed'].isna().sum())
-        df.drop(columns=['data_parsed'], inplace=True)
+        diag['data_parse_nulls'] = int(sem_data.sum())
     else:
         diag['data_present'] = False
 
-    # HORARIO: tentar extrair horário - exemplos aceitos: '08:00', '08:00:00', '2025-12-01T08:00:00', '08h00'
-    def parse_time_cell(x):
-        if pd.isna(x):
-            return None
-        if isinstance(x, datetime):
-            return x.time()
-        s = str(x).strip()
-        if s == '':
-            return None
-        # caso seja 'HH:MM' ou 'HH:MM:SS'
-        try:
-            return datetime.strptime(s, "%H:%M:%S").time()
-        except:
-            try:
-                return datetime.strptime(s, "%H:%M").time()
-            except:
-                pass
-        # extrair padrão com regex HH:MM possivelmente dentro de datetime string
-        m = re.search(r"(\d{1,2}:\d{2}(?::\d{2})?)", s)
-        if m:
-            tstr = m.group(1)
-            try:
-                return datetime.strptime(tstr, "%H:%M:%S").time()
-            except:
-                try:
-                    return datetime.strptime(tstr, "%H:%M").time()
-                except:
-                    return None
-        # capturar formatos com 'h' como 08h30
-        m2 = re.search(r"(\d{1,2})\s*h\s*(\d{2})", s)
-        if m2:
-            try:
-                hh = int(m2.group(1)); mm = int(m2.group(2))
-                return datetime.strptime(f"{hh:02d}:{mm:02d}", "%H:%M").time()
-            except:
-                return None
-        return None
-
     if 'horario' in df.columns:
-        df['horario_parsed'] = df['horario'].apply(parse_time_cell)
-        diag['horario_nulls'] = int(df['horario_parsed'].isna().sum())
-        df['horario'] = df['horario_parsed']
-        df.drop(columns=['horario_parsed'], inplace=True)
+        if 'segundo' not in df.columns:
+            df['segundo'] = segundos_do_dia(df['horario'])
+            tipadas.discard('horario')
+        elif df['segundo'].dtype != np.int32:
+            df['segundo'] = df['segundo'].astype('int32')
+        if 'minuto' not in df.columns:
+            df['minuto'] = minutos_por_segundo(df['segundo'])
+        elif df['minuto'].dtype != np.int16:
+            df['minuto'] = df['minuto'].astype('int16')
+        sem_horario = (df['segundo'] < 0).to_numpy()
+        if 'horario' not in tipadas:
+            df['horario'] = time_por_segundo(df['segundo'])  # com os segundos (08:15:30 continua 08:15:30)
+        diag['horario_nulls'] = int(sem_horario.sum())
     else:
         diag['horario_present'] = False
 
-    # Padronizar 'nome_fantasia' (unidade) removendo espaços duplos
-    if 'nome_fantasia' in df.columns:
-        df['nome_fantasia'] = df['nome_fantasia'].replace('', pd.NA).astype('string')
-        df['nome_fantasia'] = df['nome_fantasia'].str.replace(r'\s+', ' ', regex=True).str.strip()
-
     # Remover linhas sem data/hora/agendamento_id - mas primeiro reportar quantos
-    missing_date = df['data'].isna().sum() if 'data' in df.columns else None
-    missing_time = df['horario'].isna().sum() if 'horario' in df.columns else None
-    missing_id = df['agendamento_id'].isna().sum() if 'agendamento_id' in df.columns else None
-    diag['missing_date_count'] = int(missing_date) if missing_date is not None else None
-    diag['missing_time_count'] = int(missing_time) if missing_time is not None else None
-    diag['missing_id_count'] = int(missing_id) if missing_id is not None else None
+    sem_id = df['agendamento_id'].isna().to_numpy() if 'agendamento_id' in df.columns else None
+    diag['missing_date_count'] = int(sem_data.sum()) if sem_data is not None else None
+    diag['missing_time_count'] = int(sem_horario.sum()) if sem_horario is not None else None
+    diag['missing_id_count'] = int(sem_id.sum()) if sem_id is not None else None
 
-    # Opcional: remover rows completamente sem data ou id (comente se preferir inspecionar)
-    df_clean = df.copy()
     # manter linhas com data e agendamento_id
-    if 'data' in df_clean.columns and 'agendamento_id' in df_clean.columns:
-        df_clean = df_clean[df_clean['data'].notna() & df_clean['agendamento_id'].notna()]
-    elif 'data' in df_clean.columns:
-        df_clean = df_clean[df_clean['data'].notna()]
-
-    # Garantir colunas de texto existam e sejam string
-    for c in ['nome_profissional','especialidade','sala','nome_fantasia']:
-        if c in df_clean.columns:
-            df_clean[c] = df_clean[c].astype(str).fillna('').str.strip()
+    if sem_data is not None and sem_id is not None:
+        df_clean = df[~sem_data & ~sem_id]
+    elif sem_data is not None:
+        df_clean = df[~sem_data]
+    else:
+        df_clean = df.copy()
 
+    marcar_tipadas(df_clean, [c for c in TEXT_COLS + ['nome_fantasia', 'data', 'horario'] if c in df_clean.columns])
     diag['rows_before'] = int(len(df))
     diag['rows_after'] = int(len(df_clean))
 
-    # mostrar amostras de linhas problemáticas (até 10)
+    # mostrar amostras de linhas problemáticas (até 10) — só sob demanda
     problems = {}
-    if missing_date and missing_date > 0:
-        problems['sample_missing_date'] = df[df['data'].isna()].head(10).to_dict(orient='records')
-    if missing_time and missing_time > 0:
-        problems['sample_missing_time'] = df[df['horario'].isna()].head(10).to_dict(orient='records')
-    if missing_id and missing_id > 0:
-        problems['sample_missing_id'] = df[df['agendamento_id'].isna()].head(10).to_dict(orient='records')
+    if diagnostics:
+        for chave, mask in (('sample_missing_date', sem_data), ('sample_missing_time', sem_horario),
+                            ('sample_missing_id', sem_id)):
+            if mask is not None and mask.any():
+                problems[chave] = df[mask].head(10).to_dict(orient='records')
 
     diag['sample_problems'] = problems
-    return df_clean, diag
\ No newline at end of file
+    return df_clean, diag
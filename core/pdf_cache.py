@@ -0,0 +1,148 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from core.cache import hash_conteudo
+
+# ==========================================================
+# CACHE DE PDFs ENDEREÇADO PELO CONTEÚDO
+# ==========================================================
+# Gerar de novo o mesmo mapa (mesmos dados) re-executava o WeasyPrint inteiro.
+# A chave é o SHA-256 das entradas do template (matrizes, ocupação, totais, textos),
+# mais o mtime do template. O carimbo de geração (data/hora do cabeçalho e do rodapé
+# e a hora de corte) vai à parte, em `carimbo`, e fica fora da chave: a hora de corte
+# só entra quando o período contém hoje, que é quando o conteúdo depende dela.
+# Num acerto, o PDF devolvido traz o carimbo da renderização original — que é
+# quando aquele conteúdo idêntico foi produzido.
+#
+# Duas camadas: memória (LRU limitada em bytes, por processo) e disco (um arquivo
+# por chave, compartilhado entre processos, limitado em bytes pelo mtime mais antigo).
+
+
+def chave_pdf(template_path, entradas, hora_corte=None):
+    """
+    Chave de conteúdo: entradas do template (sem o carimbo de geração) + mtime do template.
+    `hora_corte` só deve ser passada quando o período do mapa contém hoje.
+    """
+    h = hashlib.sha256(hash_conteudo(entradas).encode("ascii"))
+    if hora_corte:
+        h.update(f"\ncorte:{hora_corte}".encode("utf-8"))
+    if template_path:
+        try:
+            h.update(f"\n{template_path}:{os.stat(template_path).st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            h.update(f"\n{template_path}".encode("utf-8"))
+    return h.hexdigest()
+
+
+class PdfCache:
+    def __init__(self, path=None, max_memoria_bytes=64 * 1024 * 1024, max_disco_bytes=500 * 1024 * 1024):
+        self.path = Path(path) if path else None
+        if self.path is not None:
+            self.path.mkdir(parents=True, exist_ok=True)
+        self.max_memoria_bytes = int(max_memoria_bytes)
+        self.max_disco_bytes = int(max_disco_bytes)
+        self._memoria = OrderedDict()
+        self._bytes_memoria = 0
+        self._lock = threading.Lock()
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+    def _arquivo(self, chave):
+        return self.path / f"{chave}.pdf"
+
+    # ---------------- memória ----------------
+    def _guardar_memoria(self, chave, pdf):
+        if len(pdf) > self.max_memoria_bytes:
+            return
+        with self._lock:
+            antigo = self._memoria.pop(chave, None)
+            if antigo is not None:
+                self._bytes_memoria -= len(antigo)
+            self._memoria[chave] = pdf
+            self._bytes_memoria += len(pdf)
+            while self._bytes_memoria > self.max_memoria_bytes and self._memoria:
+                _, removido = self._memoria.popitem(last=False)
+                self._bytes_memoria -= len(removido)
+
+    # ---------------- API ----------------
+    def get(self, chave):
+        with self._lock:
+            pdf = self._memoria.get(chave)
+            if pdf is not None:
+                self._memoria.move_to_end(chave)
+                self.hits_memoria += 1
+                return pdf
+
+        if self.path is not None:
+            arquivo = self._arquivo(chave)
+            try:
+                pdf = arquivo.read_bytes()
+                os.utime(arquivo)  # marca como usado recentemente (evicção pelo mtime)
+            except OSError:
+                pdf = None
+            if pdf:
+                with self._lock:
+                    self.hits_disco += 1
+                self._guardar_memoria(chave, pdf)
+                return pdf
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, chave, pdf):
+        self._guardar_memoria(chave, pdf)
+        if self.path is None:
+            return
+        arquivo = self._arquivo(chave)
+        tmp = arquivo.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(pdf)
+            os.replace(tmp, arquivo)  # atômico: outro processo nunca lê um PDF pela metade
+            self._evictar_disco()
+        except OSError as e:
+            print(f"[PDF CACHE ERROR] gravação: {e}")
+            tmp.unlink(missing_ok=True)
+
+    def _evictar_disco(self):
+        arquivos = []
+        total = 0
+        for a in self.path.glob("*.pdf"):
+            try:
+                st = a.stat()
+            except OSError:
+                continue
+            arquivos.append((st.st_mtime, st.st_size, a))
+            total += st.st_size
+        if total <= self.max_disco_bytes:
+            return
+        for _, tamanho, a in sorted(arquivos):
+            a.unlink(missing_ok=True)
+            total -= tamanho
+            if total <= self.max_disco_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._memoria.clear()
+            self._bytes_memoria = 0
+        if self.path is not None:
+            for a in self.path.glob("*.pdf"):
+                a.unlink(missing_ok=True)
+
+    def stats(self):
+        with self._lock:
+            consultas = self.hits_memoria + self.hits_disco + self.misses
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "taxa_acerto": (self.hits_memoria + self.hits_disco) / consultas if consultas else 0.0,
+                "itens_memoria": len(self._memoria),
+                "bytes_memoria": self._bytes_memoria,
+                "path": str(self.path) if self.path else None,
+            }
@@ -0,0 +1,160 @@
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# ==========================================================
+# LIMITADOR DE REQUISIÇÕES (TOKEN BUCKET + CONCORRÊNCIA AIMD)
+# ==========================================================
+# Um único limitador por processo, compartilhado por todas as sessões do Streamlit
+# e pelas threads dos lotes:
+#   - token bucket: no máximo `taxa` requisições/s (rajada de até `rajada`);
+#   - concorrência adaptativa (AIMD): o teto de requisições em voo cresce +1 a cada
+#     `teto` respostas boas e cai pela metade a cada 429/5xx (no máximo uma queda
+#     por `janela_queda_s`, para uma rajada de erros não zerar o teto);
+#   - Retry-After: um 429 com o cabeçalho pausa TODAS as requisições até o instante
+#     indicado, em vez de cada thread recuar por conta própria.
+
+STATUS_SOBRECARGA = frozenset({429, 500, 502, 503, 504})
+
+
+def segundos_retry_after(valor, agora=None):
+    """Cabeçalho Retry-After (segundos ou data HTTP) → segundos a esperar (None se ausente/inválido)."""
+    if valor is None or str(valor).strip() == "":
+        return None
+    texto = str(valor).strip()
+    try:
+        return max(0.0, float(texto))
+    except ValueError:
+        pass
+    try:
+        quando = parsedate_to_datetime(texto)
+    except (TypeError, ValueError):
+        return None
+    if quando.tzinfo is None:
+        quando = quando.replace(tzinfo=timezone.utc)
+    agora = agora or datetime.now(timezone.utc)
+    return max(0.0, (quando - agora).total_seconds())
+
+
+class RateLimiter:
+    def __init__(self, taxa=8.0, rajada=16, max_concorrencia=8, min_concorrencia=1,
+                 janela_queda_s=1.0, max_pausa_s=60.0):
+        self.taxa = float(taxa)
+        self.rajada = max(1.0, float(rajada))
+        self.max_concorrencia = max(1, int(max_concorrencia))
+        self.min_concorrencia = max(1, min(int(min_concorrencia), self.max_concorrencia))
+        self.janela_queda_s = float(janela_queda_s)
+        self.max_pausa_s = float(max_pausa_s)
+
+        self._cond = threading.Condition()
+        self._tokens = self.rajada
+        self._reposto_em = time.monotonic()
+        self._pausa_ate = 0.0
+        self._ultima_queda = 0.0
+        self._teto = float(self.max_concorrencia)
+        self._em_voo = 0
+
+        self.requisicoes = 0
+        self.respostas_429 = 0
+        self.respostas_5xx = 0
+        self.falhas_conexao = 0
+        self.quedas = 0
+        self.pausas = 0
+        self.esperas = 0
+        self.espera_total_s = 0.0
+
+    # ---------------- token bucket ----------------
+    def _repor(self, agora):
+        if self.taxa > 0:
+            self._tokens = min(self.rajada, self._tokens + (agora - self._reposto_em) * self.taxa)
+        self._reposto_em = agora
+
+    def _espera_necessaria(self, agora):
+        """Segundos até poder liberar uma requisição (0 = pode agora). Chamar com o lock."""
+        if agora < self._pausa_ate:
+            return self._pausa_ate - agora
+        if self._em_voo >= int(self._teto):
+            return None  # espera um slot (notify em liberar)
+        self._repor(agora)
+        if self.taxa > 0 and self._tokens < 1:
+            return (1 - self._tokens) / self.taxa
+        return 0.0
+
+    def adquirir(self):
+        t0 = time.monotonic()
+        esperou = False
+        with self._cond:
+            while True:
+                agora = time.monotonic()
+                espera = self._espera_necessaria(agora)
+                if espera == 0.0:
+                    break
+                esperou = True
+                self._cond.wait(timeout=espera)
+            if self.taxa > 0:
+                self._tokens -= 1
+            self._em_voo += 1
+            self.requisicoes += 1
+            if esperou:
+                self.esperas += 1
+                self.espera_total_s += time.monotonic() - t0
+
+    def liberar(self):
+        with self._cond:
+            self._em_voo = max(0, self._em_voo - 1)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.adquirir()
+        try:
+            yield
+        finally:
+            self.liberar()
+
+    # ---------------- adaptação ----------------
+    def registrar(self, status, retry_after=None):
+        """Resultado de uma requisição (status HTTP, ou None para falha de conexão)."""
+        agora = time.monotonic()
+        with self._cond:
+            if status in STATUS_SOBRECARGA or status is None:
+                if status == 429:
+                    self.respostas_429 += 1
+                elif status is None:
+                    self.falhas_conexao += 1
+                else:
+                    self.respostas_5xx += 1
+                if agora - self._ultima_queda >= self.janela_queda_s:
+                    self._teto = max(float(self.min_concorrencia), self._teto / 2)
+                    self._ultima_queda = agora
+                    self.quedas += 1
+                espera = segundos_retry_after(retry_after)
+                if espera is not None:
+                    self._pausa_ate = max(self._pausa_ate, agora + min(espera, self.max_pausa_s))
+                    self.pausas += 1
+            else:
+                self._teto = min(float(self.max_concorrencia), self._teto + 1 / max(self._teto, 1.0))
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            agora = time.monotonic()
+            self._repor(agora)
+            return {
+                "taxa_por_s": self.taxa,
+                "tokens": round(self._tokens, 2),
+                "concorrencia_teto": int(self._teto),
+                "concorrencia_max": self.max_concorrencia,
+                "em_voo": self._em_voo,
+                "pausado_por_s": round(max(0.0, self._pausa_ate - agora), 2),
+                "requisicoes": self.requisicoes,
+                "respostas_429": self.respostas_429,
+                "respostas_5xx": self.respostas_5xx,
+                "falhas_conexao": self.falhas_conexao,
+                "quedas_concorrencia": self.quedas,
+                "pausas_retry_after": self.pausas,
+                "esperas": self.esperas,
+                "espera_total_s": round(self.espera_total_s, 3),
+            }
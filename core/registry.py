@@ -0,0 +1,175 @@
+import re
+from types import MappingProxyType
+
+import pandas as pd
+
+from core.cache import cache_resource
+
+# ==========================================================
+# REGISTRO DE DIMENSÕES (PROFISSIONAIS, ESPECIALIDADES, SALAS, UNIDADES)
+# ==========================================================
+# Montado UMA vez por atualização das dimensões (mesmo TTL dos list_* do api_client)
+# e somente leitura: as buscas viram acesso O(1) a dicionários em vez de filtros
+# booleanos / set_index().to_dict() / merges repetidos a cada chamada.
+
+
+def _natural_key(text):
+    return [int(c) if c.isdigit() else c.lower() for c in re.split(r'(\d+)', str(text))]
+
+
+def _int_or_none(valor):
+    try:
+        if valor is None or pd.isna(valor):
+            return None
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _congelar(d):
+    return MappingProxyType(dict(d))
+
+
+class DimensionRegistry:
+    """
+    Índices imutáveis das dimensões da Feegow.
+
+    Mapas (somente leitura):
+      prof_nome              profissional_id → nome
+      prof_especialidades    profissional_id → tupla de especialidade_id (a principal primeiro)
+      prof_especialidade_principal  profissional_id → especialidade_id (mesma regra de get_main_specialty_id)
+      especialidade_nome     especialidade_id → nome
+      sala_nome              local_id → nome da sala
+      sala_unidade           local_id → unidade_id
+      sala_rank              nome da sala → posição na ordenação natural
+      unidade_id_por_nome    nome_fantasia → unidade_id
+      unidade_nome           unidade_id → nome_fantasia
+    Os DataFrames de origem ficam em df_prof/df_esp/df_loc/df_unid para os widgets das páginas.
+    """
+
+    __slots__ = (
+        "df_prof", "df_esp", "df_loc", "df_unid", "profissional_ids",
+        "prof_nome", "prof_especialidades", "prof_especialidade_principal", "especialidade_nome",
+        "sala_nome", "sala_unidade", "sala_rank", "unidade_id_por_nome", "unidade_nome",
+    )
+
+    def __init__(self, df_prof, df_esp, df_loc, df_unid):
+        vazio = pd.DataFrame()
+        self.df_prof = df_prof if df_prof is not None else vazio
+        self.df_esp = df_esp if df_esp is not None else vazio
+        self.df_loc = df_loc if df_loc is not None else vazio
+        self.df_unid = df_unid if df_unid is not None else vazio
+
+        # ---------------- profissionais ----------------
+        nomes, specs, principal = {}, {}, {}
+        ids = []
+        if not self.df_prof.empty and 'profissional_id' in self.df_prof.columns:
+            tem_col = 'especialidade_id' in self.df_prof.columns
+            tem_lista = 'especialidades' in self.df_prof.columns
+            for row in self.df_prof.to_dict('records'):
+                pid = _int_or_none(row.get('profissional_id'))
+                if pid is None:
+                    continue
+                ids.append(pid)
+                if pid in nomes:  # duplicado: vale a primeira linha (como o filtro + iloc[0])
+                    continue
+                nomes[pid] = row.get('nome')
+
+                lista = []
+                sid_col = _int_or_none(row.get('especialidade_id')) if tem_col else None
+                if sid_col is not None:
+                    lista.append(sid_col)
+                if tem_lista and isinstance(row.get('especialidades'), list):
+                    for item in row['especialidades']:
+                        sid = _int_or_none(item.get('especialidade_id')) if isinstance(item, dict) else None
+                        if sid is not None and sid not in lista:
+                            lista.append(sid)
+                specs[pid] = tuple(lista)
+
+                # Regra de get_main_specialty_id: a coluna direta tem prioridade (mesmo vazia);
+                # sem ela, a primeira da lista aninhada
+                if tem_col:
+                    sid_main = sid_col
+                elif tem_lista and isinstance(row.get('especialidades'), list) and row['especialidades']:
+                    primeiro = row['especialidades'][0]
+                    sid_main = _int_or_none(primeiro.get('especialidade_id')) if isinstance(primeiro, dict) else None
+                else:
+                    sid_main = None
+                if sid_main is not None:
+                    principal[pid] = sid_main
+
+        self.profissional_ids = tuple(pd.unique(pd.Series(ids, dtype='int64')))
+        self.prof_nome = _congelar(nomes)
+        self.prof_especialidades = _congelar(specs)
+        self.prof_especialidade_principal = _congelar(principal)
+
+        # ---------------- especialidades ----------------
+        esp = {}
+        if not self.df_esp.empty and 'especialidade_id' in self.df_esp.columns and 'nome' in self.df_esp.columns:
+            for sid, nome in zip(self.df_esp['especialidade_id'], self.df_esp['nome']):
+                sid = _int_or_none(sid)
+                if sid is not None:
+                    esp[sid] = nome  # último vence, como set_index().to_dict()
+        self.especialidade_nome = _congelar(esp)
+
+        # ---------------- salas ----------------
+        salas, sala_uni = {}, {}
+        if not self.df_loc.empty and 'id' in self.df_loc.columns and 'local' in self.df_loc.columns:
+            unidades = self.df_loc['unidade_id'] if 'unidade_id' in self.df_loc.columns else [None] * len(self.df_loc)
+            for lid, nome, uid in zip(self.df_loc['id'], self.df_loc['local'], unidades):
+                lid = _int_or_none(lid)
+                if lid is None:
+                    continue
+                salas[lid] = nome
+                uid = _int_or_none(uid)
+                if uid is not None:
+                    sala_uni[lid] = uid
+        self.sala_nome = _congelar(salas)
+        self.sala_unidade = _congelar(sala_uni)
+        nomes_salas = sorted({str(n) for n in salas.values() if n is not None}, key=_natural_key)
+        self.sala_rank = _congelar({n: i for i, n in enumerate(nomes_salas)})
+
+        # ---------------- unidades ----------------
+        por_nome, uni_nome = {}, {}
+        if not self.df_unid.empty and {'unidade_id', 'nome_fantasia'}.issubset(self.df_unid.columns):
+            for uid, nome in zip(self.df_unid['unidade_id'], self.df_unid['nome_fantasia']):
+                uid = _int_or_none(uid)
+                if uid is None:
+                    continue
+                por_nome.setdefault(nome, uid)
+                uni_nome.setdefault(uid, nome)
+        self.unidade_id_por_nome = _congelar(por_nome)
+        self.unidade_nome = _congelar(uni_nome)
+
+    def __setattr__(self, nome, valor):
+        if hasattr(self, nome):
+            raise AttributeError("DimensionRegistry é somente leitura")
+        object.__setattr__(self, nome, valor)
+
+    # ---------------- atalhos ----------------
+    def main_specialty(self, profissional_id):
+        """Especialidade principal do profissional (None se não houver)."""
+        pid = _int_or_none(profissional_id)
+        return self.prof_especialidade_principal.get(pid) if pid is not None else None
+
+    def rank_sala(self, nome):
+        """Posição natural da sala; nomes fora do cadastro vão para o fim, em ordem natural entre si."""
+        rank = self.sala_rank.get(str(nome))
+        return (0, rank, []) if rank is not None else (1, 0, _natural_key(nome))
+
+
+@cache_resource(ttl=3600, show_spinner=False)
+def get_registry():
+    """Registro das dimensões, montado uma vez por atualização dos list_* (TTL de 1h)."""
+    from core.api_client import list_profissionals, list_especialidades, list_salas, list_unidades
+
+    return DimensionRegistry(list_profissionals(), list_especialidades(), list_salas(), list_unidades())
+
+
+def refresh_registry():
+    """Descarta o registro e as dimensões em cache; o próximo get_registry() busca tudo de novo."""
+    from core.api_client import list_profissionals, list_especialidades, list_salas, list_unidades
+
+    for func in (list_profissionals, list_especialidades, list_salas, list_unidades):
+        func.clear()
+    get_registry.clear()
@@ -0,0 +1,51 @@
+import os
+from datetime import datetime
+
+# ==========================================================
+# RELÓGIO DA GERAÇÃO (HOJE/AGORA SOBRESCREVÍVEIS)
+# ==========================================================
+# As datas padrão das consultas, a divisão passado/futuro dos geradores (simulação x
+# API real, espelhos D+7/D+14) e o corte de "agora" saem daqui, não de
+# date.today()/datetime.now() direto. Ordem:
+#   1. FEEGOW_HOJE ('AAAA-MM-DD', 'DD-MM-AAAA' ou 'AAAA-MM-DDTHH:MM[:SS]'; só a data
+#      mantém a hora real);
+#   2. cassete em reprodução: o momento gravado junto com ele (core.cassette), para
+#      os corpos das requisições baterem com os gravados em qualquer dia;
+#   3. o relógio do sistema.
+
+
+def _ler(texto):
+    texto = texto.strip()
+    for formato in ("%Y-%m-%d", "%d-%m-%Y"):
+        try:
+            return datetime.combine(datetime.strptime(texto, formato).date(), datetime.now().time())
+        except ValueError:
+            continue
+    try:
+        return datetime.fromisoformat(texto)
+    except ValueError:
+        raise ValueError(f"FEEGOW_HOJE inválido: {texto!r} (use AAAA-MM-DD ou AAAA-MM-DDTHH:MM)") from None
+
+
+def agora(usar_cassete=True):
+    """
+    Momento atual da geração (datetime ingênuo, hora local). usar_cassete=False ignora
+    o cassete (é o que a gravação guarda como momento dele).
+    """
+    texto = os.getenv("FEEGOW_HOJE", "").strip()
+    if texto:
+        return _ler(texto)
+    if not usar_cassete:
+        return datetime.now()
+    from core.api_client import get_cassette
+
+    cassette = get_cassette()
+    if cassette is not None and cassette.reproduzindo and cassette.momento is not None:
+        return cassette.momento
+    return datetime.now()
+
+
+def hoje():
+    """Data de hoje da geração (ver agora())."""
+    return agora().date()
+
@@ -0,0 +1,111 @@
+import threading
+import time
+
+# ==========================================================
+# ELENCO PROFISSIONAL → UNIDADE (VARREDURA DE OCIOSOS)
+# ==========================================================
+# A varredura complementar dos geradores consultava a grade de TODOS os profissionais
+# da empresa para achar quem tem agenda aberta sem agendamentos — a maior fonte de
+# chamadas num mapa de uma unidade só. O elenco guarda, por unidade, quem plausivelmente
+# atende nela, aprendido de:
+#   - agendamentos (histórico que passa pelos geradores);
+#   - respostas de disponibilidade com horários naquela unidade (sondagens e snapshots).
+#
+# Uma unidade nunca varrida (ou com a última varredura completa mais antiga que
+# `sweep_hours`) é sondada por inteiro, como antes; o resultado alimenta o elenco e,
+# até a próxima varredura completa, só o elenco é sondado. O estado vai para o
+# DiskCache (quando ativo), então vale entre processos e execuções da CLI.
+
+_ENDPOINT_CACHE = "roster"
+
+
+class ProfUnitRoster:
+    def __init__(self, disk_cache=None, sweep_hours=24):
+        self.disk_cache = disk_cache
+        self.sweep_seconds = float(sweep_hours) * 3600
+        self._unidades = {}  # unidade → {"varredura_em": ts, "profissionais": set}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _chave(unidade_id):
+        try:
+            return int(unidade_id) if unidade_id else None
+        except (TypeError, ValueError):
+            return None
+
+    def _estado(self, unidade):
+        """Estado da unidade (memória, senão DiskCache). Chamar com o lock."""
+        estado = self._unidades.get(unidade)
+        if estado is None:
+            salvo = self.disk_cache.get(f"roster:{unidade}") if self.disk_cache is not None else None
+            estado = {
+                "varredura_em": float((salvo or {}).get("varredura_em") or 0),
+                "profissionais": {int(p) for p in (salvo or {}).get("profissionais", [])},
+            }
+            self._unidades[unidade] = estado
+        return estado
+
+    def _persistir(self, unidade, estado):
+        if self.disk_cache is None:
+            return
+        valor = {"varredura_em": estado["varredura_em"], "profissionais": sorted(estado["profissionais"])}
+        # Guardado por mais tempo que o ciclo de varredura: o elenco sobrevive ao vencimento
+        self.disk_cache.set(f"roster:{unidade}", _ENDPOINT_CACHE, valor, max(self.sweep_seconds, 3600) * 7)
+
+    # ---------------- aprendizado ----------------
+    def observar(self, unidade_id, profissionais):
+        """Registra profissionais vistos atendendo na unidade (agendamento ou horário livre)."""
+        unidade = self._chave(unidade_id)
+        if unidade is None:
+            return
+        novos = {int(p) for p in profissionais if p is not None and int(p) != 0}
+        if not novos:
+            return
+        with self._lock:
+            estado = self._estado(unidade)
+            if novos <= estado["profissionais"]:
+                return
+            estado["profissionais"] |= novos
+            self._persistir(unidade, estado)
+
+    def observar_agendamentos(self, df_ag, unidade_id=None):
+        """Agendamentos de uma unidade (consulta filtrada) ou de todas (coluna 'unidade_id')."""
+        if df_ag is None or df_ag.empty or 'profissional_id' not in df_ag.columns:
+            return
+        if self._chave(unidade_id) is not None:
+            self.observar(unidade_id, df_ag['profissional_id'].dropna().unique())
+        elif 'unidade_id' in df_ag.columns:
+            for uid, grupo in df_ag.groupby('unidade_id')['profissional_id']:
+                self.observar(uid, grupo.dropna().unique())
+
+    # ---------------- consulta ----------------
+    def candidatos(self, unidade_id, profissionais, agora=None):
+        """
+        Profissionais a sondar na varredura de ociosos. Sem unidade, ou com o elenco
+        frio/vencido, devolve todos (varredura completa — chamar marcar_varredura depois).
+        Retorna (lista, completa).
+        """
+        unidade = self._chave(unidade_id)
+        profissionais = [int(p) for p in profissionais]
+        if unidade is None:
+            return profissionais, True
+        agora = time.time() if agora is None else agora
+        with self._lock:
+            estado = self._estado(unidade)
+            if agora - estado["varredura_em"] > self.sweep_seconds:
+                return profissionais, True
+            elenco = set(estado["profissionais"])
+        return [p for p in profissionais if p in elenco], False
+
+    def marcar_varredura(self, unidade_id, agora=None):
+        unidade = self._chave(unidade_id)
+        if unidade is None:
+            return
+        with self._lock:
+            estado = self._estado(unidade)
+            estado["varredura_em"] = time.time() if agora is None else agora
+            self._persistir(unidade, estado)
+
+    def stats(self):
+        with self._lock:
+            return {u: len(e["profissionais"]) for u, e in self._unidades.items()}
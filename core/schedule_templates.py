@@ -0,0 +1,296 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from core import relogio
+from core.cache import cache_data
+
+# ==========================================================
+# TEMPLATES SEMANAIS DE GRADE (INFERIDOS DO HISTÓRICO)
+# ==========================================================
+# Cada profissional tende a repetir a mesma grade por dia da semana (sala, início,
+# fim e intervalo entre consultas). O motor aprende essa grade a partir do histórico
+# (agendamentos + grade gravada no SnapshotStore) e guarda uma tabela compacta:
+#
+#   profissional_id | dia_semana | local_id | inicio_min | fim_min | intervalo_min
+#   dias_observados | dias_grade | semanas_janela | confianca
+#
+# confianca = presença (dias observados / semanas da janela) × consistência
+# (fração dos dias com grade gravada que bateram início/fim do template).
+# Sem grade gravada suficiente (min_dias_grade) a confiança é 0: agendamentos sozinhos
+# não mostram os horários livres, então o template não é usado e o gerador cai no espelho/API.
+# Dias gravados sem horários também contam: se predominam, o template é de folga
+# (inicio_min = fim_min = -1) e reconstrói o dia como "sem grade".
+
+COLUNAS_TEMPLATE = [
+    "profissional_id", "dia_semana", "local_id", "inicio_min", "fim_min", "intervalo_min",
+    "dias_observados", "dias_grade", "semanas_janela", "confianca",
+]
+
+
+def calcular_moda_intervalos(df_dados):
+    """
+    Recebe um DataFrame com colunas 'profissional_id', 'especialidade_id', 'horario_full'
+    Retorna um dicionário com os resultados processados.
+    """
+    resultados_dict = {}
+
+    # Unificação de Especialidades "Não Definidas"
+    df_valid_specs = df_dados[df_dados['especialidade_id'] > 0]
+    if not df_valid_specs.empty:
+        # Mapa: Médico -> Especialidade Mais Frequente
+        mapa_espec_dominante = df_valid_specs.groupby('profissional_id')['especialidade_id'].agg(
+            lambda x: x.mode()[0] if not x.mode().empty else 0
+        ).to_dict()
+
+        # Aplica correção
+        def corrigir(row):
+            if row['especialidade_id'] > 0: return row['especialidade_id']
+            return mapa_espec_dominante.get(row['profissional_id'], 0)
+
+        df_dados['especialidade_id'] = df_dados.apply(corrigir, axis=1)
+
+    # Agrupamento e Cálculo
+    grupos = df_dados.groupby(['profissional_id', 'especialidade_id'])
+
+    for (pid, sid), group in grupos:
+        if pid == 0: continue
+
+        # Remove horários duplicados e ordena
+        group = group.drop_duplicates(subset=['horario_full']).sort_values('horario_full')
+
+        if len(group) < 2: continue
+
+        # Diferença entre horários
+        group['diff'] = (group['horario_full'].shift(-1) - group['horario_full']).dt.total_seconds() / 60
+
+        # Filtra intervalos válidos (5 a 120 min)
+        valid_diffs = group[(group['diff'] >= 5) & (group['diff'] <= 120)]['diff']
+
+        if not valid_diffs.empty:
+            intervalo = valid_diffs.mode()[0]
+            confianca = (valid_diffs == intervalo).sum()
+            total = len(valid_diffs)
+
+            # Chave única para o dicionário
+            key = (pid, sid)
+            resultados_dict[key] = {
+                'intervalo': int(intervalo),
+                'amostras': confianca,
+                'total_amostras': total,
+                'origem': 'Calculado'
+            }
+
+    return resultados_dict
+
+
+def _moda(serie):
+    m = serie.mode()
+    return m.iloc[0] if not m.empty else None
+
+
+def _minutos(horarios):
+    h = pd.to_datetime(horarios.astype(str), format="%H:%M:%S", errors="coerce")
+    return h.dt.hour * 60 + h.dt.minute
+
+
+def inferir_templates(df_obs, inicio_janela, fim_janela, min_dias_grade=2, dias_gravados=None):
+    """
+    Aprende os templates semanais a partir de observações de horários.
+
+    df_obs: colunas data (date ou texto DD-MM-YYYY/ISO), horario (HH:MM:SS), profissional_id,
+    local_id e origem ('agenda' = agendamento, 'grade' = grade gravada).
+    dias_gravados: set de (profissional_id, date) com grade gravada, inclusive os gravados vazios.
+    Retorna um DataFrame com COLUNAS_TEMPLATE (uma linha por profissional × dia da semana).
+    """
+    if df_obs is None or df_obs.empty:
+        df_obs = pd.DataFrame(columns=["data", "horario", "profissional_id", "local_id", "origem"])
+
+    df = df_obs.copy()
+    datas = pd.to_datetime(df["data"], format="mixed", dayfirst=True, errors="coerce")
+    df["dia"] = datas.dt.date
+    df["minuto"] = _minutos(df["horario"])
+    df["profissional_id"] = pd.to_numeric(df["profissional_id"], errors="coerce").fillna(0).astype(int)
+    df["local_id"] = pd.to_numeric(df.get("local_id", 0), errors="coerce").fillna(0).astype(int)
+    df = df.dropna(subset=["dia", "minuto"])
+    df = df[df["profissional_id"] > 0]
+    if df.empty and not dias_gravados:
+        return pd.DataFrame(columns=COLUNAS_TEMPLATE)
+    df["minuto"] = df["minuto"].astype(int)
+    df["dia_semana"] = datas.loc[df.index].dt.weekday.astype(int)
+    df["eh_grade"] = df["origem"].eq("grade")
+
+    # Resumo por (profissional, dia): início/fim/sala e intervalos entre slots consecutivos
+    df = df.drop_duplicates(subset=["profissional_id", "dia", "minuto"]).sort_values(["profissional_id", "dia", "minuto"])
+    df["diff"] = df.groupby(["profissional_id", "dia"])["minuto"].diff()
+    por_dia = df.groupby(["profissional_id", "dia"]).agg(
+        dia_semana=("dia_semana", "first"),
+        inicio=("minuto", "min"),
+        fim=("minuto", "max"),
+        tem_grade=("eh_grade", "any"),
+    ).reset_index()
+
+    # Dias gravados sem nenhum horário entram como dias de grade vazios (início/fim nulos)
+    if dias_gravados:
+        ja_vistos = set(zip(por_dia["profissional_id"], por_dia["dia"]))
+        vazios = [(int(p), d) for p, d in dias_gravados if (int(p), d) not in ja_vistos]
+        if vazios:
+            por_dia = pd.concat([por_dia, pd.DataFrame({
+                "profissional_id": [p for p, _ in vazios],
+                "dia": [d for _, d in vazios],
+                "dia_semana": [d.weekday() for _, d in vazios],
+                "inicio": float("nan"),
+                "fim": float("nan"),
+                "tem_grade": True,
+            })], ignore_index=True)
+
+    # Ocorrências de cada dia da semana na janela (denominador da presença)
+    ocorrencias = pd.Series(
+        [(inicio_janela + timedelta(days=i)).weekday() for i in range((fim_janela - inicio_janela).days + 1)]
+    ).value_counts()
+
+    linhas = []
+    grade = df[df["eh_grade"]]
+    for (pid, dsem), dias in por_dia.groupby(["profissional_id", "dia_semana"]):
+        dias_grade = dias[dias["tem_grade"]]
+        if dias_grade.empty:
+            continue
+        semanas = int(ocorrencias.get(dsem, 0)) or 1
+        presenca = min(1.0, len(dias) / semanas)
+        vazios = dias_grade["inicio"].isna()
+
+        if vazios.mean() > 0.5:
+            # Folga: a maioria dos dias gravados veio sem horários
+            inicio = fim = -1
+            intervalo = 0
+            local_id = 0
+            consistencia = float(vazios.mean())
+        else:
+            obs_grade = grade[(grade["profissional_id"] == pid) & (grade["dia_semana"] == dsem)]
+            diffs = obs_grade["diff"]
+            diffs = diffs[(diffs >= 5) & (diffs <= 120)]
+            intervalo = _moda(diffs)
+            if intervalo is None:
+                continue
+            com_grade = dias_grade[~vazios]
+            inicio, fim = int(_moda(com_grade["inicio"])), int(_moda(com_grade["fim"]))
+            consistencia = float(((dias_grade["inicio"] == inicio) & (dias_grade["fim"] == fim)).mean())
+            local_id = int(_moda(obs_grade["local_id"]) or 0)
+
+        confianca = presenca * consistencia if len(dias_grade) >= min_dias_grade else 0.0
+
+        linhas.append({
+            "profissional_id": int(pid),
+            "dia_semana": int(dsem),
+            "local_id": local_id,
+            "inicio_min": inicio,
+            "fim_min": fim,
+            "intervalo_min": int(intervalo),
+            "dias_observados": len(dias),
+            "dias_grade": len(dias_grade),
+            "semanas_janela": semanas,
+            "confianca": round(confianca, 3),
+        })
+
+    out = pd.DataFrame(linhas, columns=COLUNAS_TEMPLATE)
+    for col in ("profissional_id", "local_id"):
+        out[col] = out[col].astype("int32")
+    for col in ("dia_semana", "inicio_min", "fim_min", "intervalo_min", "dias_observados", "dias_grade", "semanas_janela"):
+        out[col] = out[col].astype("int16")
+    return out
+
+
+def reconstruir_grade(templates, profissionais, dias, confianca_minima=0.8):
+    """
+    Monta a grade dos dias a partir dos templates com confiança suficiente.
+    Retorna {(profissional_id, date): DataFrame} no formato de fetch_horarios_disponiveis
+    (data ISO, horario, profissional_id, local_id); pares sem template confiável ficam de fora.
+    """
+    if templates is None or templates.empty:
+        return {}
+
+    confiaveis = templates[templates["confianca"] >= confianca_minima]
+    por_chave = {
+        (int(r.profissional_id), int(r.dia_semana)): r
+        for r in confiaveis.itertuples(index=False)
+    }
+
+    grades = {}
+    for pid in profissionais:
+        for dia in dias:
+            t = por_chave.get((int(pid), dia.weekday()))
+            if t is None:
+                continue
+            # Folga (inicio_min < 0) vira dia sem horários
+            minutos = range(int(t.inicio_min), int(t.fim_min) + 1, int(t.intervalo_min)) if t.inicio_min >= 0 else []
+            grades[(int(pid), dia)] = pd.DataFrame({
+                "data": dia.strftime("%Y-%m-%d"),
+                "horario": [f"{m // 60:02d}:{m % 60:02d}:00" for m in minutos],
+                "profissional_id": int(pid),
+                "local_id": int(t.local_id),
+            })
+    return grades
+
+
+# ==========================================================
+# CARGA DOS TEMPLATES (cacheada; histórico já cacheado localmente)
+# ==========================================================
+@cache_data(ttl=6 * 3600, show_spinner=False)
+def carregar_templates(unidade_id, data_ref, semanas=8, min_dias_grade=2):
+    """
+    Templates da unidade aprendidos nas `semanas` anteriores a `data_ref`.
+    Usa a grade gravada (SnapshotStore) e os agendamentos do período; sem grade
+    gravada na janela, retorna a tabela vazia sem consultar agendamentos.
+    """
+    from core.api_client import fetch_agendamentos, get_snapshot_store
+
+    fim = data_ref - timedelta(days=1)
+    inicio = data_ref - timedelta(weeks=int(semanas))
+
+    store = get_snapshot_store()
+    if store is None:
+        return pd.DataFrame(columns=COLUNAS_TEMPLATE)
+    df_grade, dias_gravados = store.read_range(unidade_id, inicio, fim)
+    if not dias_gravados:
+        return pd.DataFrame(columns=COLUNAS_TEMPLATE)
+    df_grade = df_grade.assign(origem="grade")
+
+    frames = [df_grade]
+    df_ag = fetch_agendamentos(
+        unidade_id=unidade_id, start_date=inicio.strftime("%d-%m-%Y"), end_date=fim.strftime("%d-%m-%Y")
+    )
+    if not df_ag.empty and {"data", "horario", "profissional_id"}.issubset(df_ag.columns):
+        status = pd.to_numeric(df_ag.get("status_id", 1), errors="coerce")
+        df_ag = df_ag[status.isin([1, 7, 2, 3, 4])]
+        cols = [c for c in ("data", "horario", "profissional_id", "local_id") if c in df_ag.columns]
+        frames.append(df_ag[cols].assign(origem="agenda"))
+
+    return inferir_templates(
+        pd.concat(frames, ignore_index=True), inicio, fim,
+        min_dias_grade=min_dias_grade, dias_gravados=dias_gravados,
+    )
+
+
+def grades_por_template(unidade_id, profissionais, dias):
+    """
+    Grade reconstruída pelos templates para os pares (profissional, dia) com confiança
+    suficiente, conforme `globals.templates` do api_config.yaml. Desativado → {}.
+    """
+    from core.api_client import get_api_settings
+
+    cfg = get_api_settings().globals_cfg.get("templates", {}) or {}
+    if not cfg.get("enabled", False) or not profissionais or not dias:
+        return {}
+
+    try:
+        templates = carregar_templates(
+            int(unidade_id) if unidade_id else None,
+            relogio.hoje(),
+            semanas=int(cfg.get("semanas", 8)),
+            min_dias_grade=int(cfg.get("min_dias_grade", 2)),
+        )
+    except Exception as e:
+        print(f"[TEMPLATE ERROR] {e}")
+        return {}
+
+    return reconstruir_grade(templates, profissionais, dias, confianca_minima=float(cfg.get("confianca_minima", 0.8)))
@@ -0,0 +1,304 @@
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from core import relogio
+
+# ==========================================================
+# HISTÓRICO GRAVADO DE DISPONIBILIDADE (SNAPSHOTS DA GRADE)
+# ==========================================================
+# O endpoint available-schedule só devolve horários de agora em diante, por isso o
+# passado era simulado pelo espelho D+7/D+14. Aqui um job agendado grava a grade de
+# cada (unidade, profissional, dia) ANTES do dia começar, em um SQLite append-only.
+# Para datas passadas, os geradores de mapa leem essa gravação localmente.
+#
+# Regra de leitura: para o dia D vale a captura mais recente feita antes de D + corte
+# (hora de corte configurável, padrão 06:00), ou seja, antes de a grade do dia começar
+# a ser consumida. Capturas vazias também são gravadas ("sem grade neste dia").
+
+_CORTE_HORA_PADRAO = 6
+
+
+def _to_ordinal(d):
+    if isinstance(d, datetime):
+        d = d.date()
+    if isinstance(d, date):
+        return d.toordinal()
+    texto = str(d)
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(texto, fmt).date().toordinal()
+        except ValueError:
+            continue
+    raise ValueError(f"Data inválida: {d!r}")
+
+
+def _unidade_key(unidade_id):
+    """None/'' (consulta sem unidade) é gravado como 0, igual ao contexto da API."""
+    try:
+        return int(unidade_id) if unidade_id else 0
+    except (TypeError, ValueError):
+        return 0
+
+
+class SnapshotStore:
+    """
+    Capturas da grade por (unidade, profissional, dia), append-only.
+    Cada captura registra também o instante em que foi feita; a leitura escolhe,
+    por dia, a última captura anterior ao corte daquele dia.
+    """
+
+    def __init__(self, path, corte_hora=_CORTE_HORA_PADRAO, busy_timeout_s=30):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.corte_hora = int(corte_hora)
+        self.busy_timeout_s = busy_timeout_s
+        self._local = threading.local()
+        self._init_schema()
+
+    # ---------------- conexão (uma por thread) ----------------
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_s, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_s * 1000)}")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS captures (
+                capture_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+                unidade_id       INTEGER NOT NULL,
+                profissional_id  INTEGER NOT NULL,
+                especialidade_id INTEGER,
+                dia              INTEGER NOT NULL,   -- date.toordinal()
+                captured_at      REAL NOT NULL,      -- epoch (segundos)
+                n_slots          INTEGER NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS slots (
+                capture_id  INTEGER NOT NULL,
+                horario     TEXT NOT NULL,
+                local_id    INTEGER NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_captures_lookup "
+            "ON captures(unidade_id, dia, profissional_id, captured_at)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_capture ON slots(capture_id)")
+
+    def _limite_captura(self, dia_ordinal):
+        """Instante (epoch local) até o qual uma captura ainda representa a grade cheia do dia."""
+        corte = datetime.combine(date.fromordinal(dia_ordinal), datetime.min.time()) + timedelta(hours=self.corte_hora)
+        return corte.timestamp()
+
+    # ---------------- escrita ----------------
+    def record(self, unidade_id, profissional_id, df_slots, dias, especialidade_id=None, captured_at=None):
+        """
+        Grava uma captura da grade de um profissional para cada dia em `dias`
+        (dias sem linhas em df_slots são gravados como vazios).
+        df_slots segue o formato de fetch_horarios_disponiveis: data, horario, local_id.
+        """
+        captured_at = time.time() if captured_at is None else float(captured_at)
+        uid = _unidade_key(unidade_id)
+        pid = int(profissional_id)
+        sid = int(especialidade_id) if especialidade_id else None
+
+        por_dia = {}
+        if df_slots is not None and not df_slots.empty:
+            ordinais = df_slots["data"].map(_to_ordinal)
+            locais = pd.to_numeric(df_slots.get("local_id", 0), errors="coerce").fillna(0).astype(int)
+            for o, h, l in zip(ordinais, df_slots["horario"].astype(str), locais):
+                por_dia.setdefault(o, []).append((h, int(l)))
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for dia in dias:
+                o = _to_ordinal(dia)
+                linhas = por_dia.get(o, [])
+                cur = conn.execute(
+                    "INSERT INTO captures (unidade_id, profissional_id, especialidade_id, dia, captured_at, n_slots) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (uid, pid, sid, o, captured_at, len(linhas)),
+                )
+                if linhas:
+                    conn.executemany(
+                        "INSERT INTO slots (capture_id, horario, local_id) VALUES (?, ?, ?)",
+                        [(cur.lastrowid, h, l) for h, l in linhas],
+                    )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def prune(self, antes_de):
+        """Remove capturas de dias anteriores a `antes_de` (retenção)."""
+        o = _to_ordinal(antes_de)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM slots WHERE capture_id IN (SELECT capture_id FROM captures WHERE dia < ?)", (o,))
+            conn.execute("DELETE FROM captures WHERE dia < ?", (o,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------------- leitura ----------------
+    def read_range(self, unidade_id, start_date, end_date, profissionais=None):
+        """
+        Grade gravada de [start_date, end_date] para a unidade.
+        Retorna (df, cobertos): df no formato de fetch_horarios_disponiveis
+        (data ISO, horario, profissional_id, local_id) e o set de (profissional_id, date)
+        que têm captura válida — inclusive os dias gravados sem horários.
+        """
+        uid = _unidade_key(unidade_id)
+        o0, o1 = _to_ordinal(start_date), _to_ordinal(end_date)
+        filtro_prof = {int(p) for p in profissionais} if profissionais is not None else None
+
+        conn = self._conn()
+        escolhidas = {}
+        for capture_id, pid, dia, captured_at in conn.execute(
+            "SELECT capture_id, profissional_id, dia, captured_at FROM captures "
+            "WHERE unidade_id = ? AND dia BETWEEN ? AND ? ORDER BY captured_at",
+            (uid, o0, o1),
+        ):
+            if filtro_prof is not None and pid not in filtro_prof:
+                continue
+            if captured_at > self._limite_captura(dia):
+                continue
+            escolhidas[(pid, dia)] = capture_id  # ordenado por captured_at: fica a mais recente
+
+        cobertos = {(pid, date.fromordinal(dia)) for pid, dia in escolhidas}
+        if not escolhidas:
+            return pd.DataFrame(), cobertos
+
+        meta = {cid: chave for chave, cid in escolhidas.items()}
+        linhas = []
+        ids = list(meta)
+        for i in range(0, len(ids), 900):  # limite de parâmetros do SQLite
+            lote = ids[i:i + 900]
+            marcadores = ",".join("?" * len(lote))
+            for capture_id, horario, local_id in conn.execute(
+                f"SELECT capture_id, horario, local_id FROM slots WHERE capture_id IN ({marcadores})", lote
+            ):
+                pid, dia = meta[capture_id]
+                linhas.append({
+                    "data": date.fromordinal(dia).strftime("%Y-%m-%d"),
+                    "horario": horario,
+                    "profissional_id": pid,
+                    "local_id": local_id,
+                })
+
+        return pd.DataFrame(linhas), cobertos
+
+    def profissionais_com_grade(self, unidade_id, desde):
+        """Profissionais com algum horário gravado na unidade a partir de `desde` (elenco, core.roster)."""
+        conn = self._conn()
+        return {
+            int(pid)
+            for (pid,) in conn.execute(
+                "SELECT DISTINCT profissional_id FROM captures "
+                "WHERE unidade_id = ? AND dia >= ? AND n_slots > 0",
+                (_unidade_key(unidade_id), _to_ordinal(desde)),
+            )
+        }
+
+    def stats(self):
+        conn = self._conn()
+        n_cap, dia_min, dia_max = conn.execute("SELECT COUNT(*), MIN(dia), MAX(dia) FROM captures").fetchone()
+        n_slots = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+        return {
+            "captures": int(n_cap),
+            "slots": int(n_slots),
+            "primeiro_dia": date.fromordinal(dia_min).isoformat() if dia_min else None,
+            "ultimo_dia": date.fromordinal(dia_max).isoformat() if dia_max else None,
+            "path": str(self.path),
+        }
+
+
+# ==========================================================
+# JOB DE CAPTURA (agendar 1x/dia antes do horário de corte)
+# ==========================================================
+def capturar_grades(store, unidades, dias=14, data_inicio=None, max_workers=None):
+    """
+    Grava a grade de hoje até hoje + `dias` de todos os profissionais com
+    especialidade principal, para cada unidade informada (ids usados na consulta de grade).
+    Pedidos que falham na API não são gravados (não viram "dia sem grade").
+    Retorna um resumo {unidade_id: n_profissionais_gravados}.
+    """
+    from core.api_client import _executar_em_lote, _call_endpoint, _parse_horarios, list_profissionals, get_main_specialty_id
+
+    inicio = data_inicio or relogio.hoje()
+    fim = inicio + timedelta(days=int(dias))
+    dias_periodo = [inicio + timedelta(days=i) for i in range((fim - inicio).days + 1)]
+
+    df_prof = list_profissionals()
+    profissionais = []
+    for p_id in (df_prof['profissional_id'].unique() if not df_prof.empty else []):
+        sid = get_main_specialty_id(int(p_id))
+        if sid:
+            profissionais.append((int(p_id), int(sid)))
+
+    def capturar(unidade_id, profissional_id, especialidade_id):
+        ctx = {
+            'unidade_id': _unidade_key(unidade_id),
+            'profissional_id': profissional_id,
+            'data_start': inicio.strftime("%d-%m-%Y"),
+            'data_end': fim.strftime("%d-%m-%Y"),
+            'tipo': 'E',
+            'especialidade_id': especialidade_id,
+        }
+        raw = _call_endpoint('available-schedule', context=ctx)
+        if raw is None:
+            return False
+        store.record(unidade_id, profissional_id, _parse_horarios(raw), dias_periodo, especialidade_id=especialidade_id)
+        return True
+
+    resumo = {}
+    for unidade_id in unidades:
+        pedidos = [
+            {'unidade_id': unidade_id, 'profissional_id': p, 'especialidade_id': s}
+            for p, s in profissionais
+        ]
+        ok = _executar_em_lote(capturar, pedidos, max_workers=max_workers)
+        resumo[_unidade_key(unidade_id)] = sum(1 for r in ok if r)
+        print(f"[SNAPSHOT] unidade {_unidade_key(unidade_id)}: {resumo[_unidade_key(unidade_id)]}/{len(pedidos)} profissionais gravados")
+    return resumo
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from core.api_client import get_snapshot_store, list_unidades
+
+    parser = argparse.ArgumentParser(description="Grava o snapshot diário da grade de disponibilidade.")
+    parser.add_argument("--dias", type=int, default=14, help="Quantos dias à frente capturar (padrão: 14)")
+    parser.add_argument("--unidades", type=int, nargs="*", help="IDs de unidade da consulta de grade (padrão: todas)")
+    parser.add_argument("--reter-dias", type=int, default=None, help="Apaga capturas de dias mais antigos que isso")
+    args = parser.parse_args()
+
+    store = get_snapshot_store()
+    if store is None:
+        raise SystemExit("Snapshots desativados (globals.snapshots.enabled em api_config.yaml)")
+
+    unidades = args.unidades
+    if not unidades:
+        df_u = list_unidades()
+        unidades = sorted({int(u) for u in df_u['unidade_id'].dropna()}) if not df_u.empty else []
+
+    capturar_grades(store, unidades, dias=args.dias)
+    if args.reter_dias:
+        store.prune(date.today() - timedelta(days=args.reter_dias))
+    print(store.stats())
@@ -0,0 +1,151 @@
+import contextvars
+import cProfile
+import functools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# ==========================================================
+# ETAPAS NOMEADAS DA GERAÇÃO DE MAPAS
+# ==========================================================
+# Cada gerador é dividido em etapas (agendamentos, grade, varredura, bloqueios,
+# enriquecimento, normalização, agregação, renderização). Para cada uma ficam
+# registrados o tempo de parede, as linhas de entrada/saída e as chamadas à API
+# feitas durante ela — inclusive nas threads de _executar_em_lote, que herdam a
+# etapa corrente por contextvars. O registro volta em metricas['etapas'].
+#
+# Perfil: com FEEGOW_PROFILE=1 (cProfile) ou FEEGOW_PROFILE=pyinstrument, cada geração
+# grava um arquivo de perfil em FEEGOW_PROFILE_DIR (padrão .cache/profiles).
+
+_ETAPA_ATUAL = contextvars.ContextVar("etapa_atual", default=None)
+PASTA_PERFIS_PADRAO = Path(__file__).resolve().parent.parent / ".cache" / "profiles"
+
+
+class RegistroEtapa(dict):
+    """Uma etapa: {'etapa', 'segundos', 'linhas_entrada', 'linhas_saida', 'chamadas_api', 'cache_api'}."""
+
+    def __init__(self, nome, linhas_entrada=None):
+        super().__init__(etapa=nome, segundos=0.0, linhas_entrada=linhas_entrada, linhas_saida=None,
+                         chamadas_api=0, cache_api=0)
+        self._lock = threading.Lock()
+
+    def entrada(self, linhas):
+        self["linhas_entrada"] = _contar(linhas)
+
+    def saida(self, linhas):
+        self["linhas_saida"] = _contar(linhas)
+
+    def _contar_api(self, cache):
+        with self._lock:
+            self["cache_api" if cache else "chamadas_api"] += 1
+
+
+def _contar(linhas):
+    if linhas is None or isinstance(linhas, int):
+        return linhas
+    return len(linhas)
+
+
+def contar_chamada_api(cache=False):
+    """Chamado por request_endpoint: conta a requisição (ou o acerto de cache) na etapa corrente."""
+    registro = _ETAPA_ATUAL.get()
+    if registro is not None:
+        registro._contar_api(cache)
+
+
+class Etapas:
+    def __init__(self, metricas=None):
+        self.registros = []
+        if metricas is not None:
+            metricas['etapas'] = self.registros
+
+    @contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        registro = RegistroEtapa(nome, _contar(linhas_entrada))
+        self.registros.append(registro)
+        token = _ETAPA_ATUAL.set(registro)
+        t0 = time.perf_counter()
+        try:
+            yield registro
+        finally:
+            registro["segundos"] = round(time.perf_counter() - t0, 4)
+            _ETAPA_ATUAL.reset(token)
+
+
+def resumo_etapas(etapas):
+    """Tabela de texto das etapas (CLI / logs)."""
+    if not etapas:
+        return ""
+    largura = max(len(e["etapa"]) for e in etapas)
+    linhas = [f"  {'etapa'.ljust(largura)}  {'seg':>8}  {'entrada':>8}  {'saída':>8}  {'API':>5}  {'cache':>5}"]
+    for e in etapas:
+        fmt = lambda v: "-" if v is None else str(v)
+        linhas.append(f"  {e['etapa'].ljust(largura)}  {e['segundos']:8.3f}  {fmt(e['linhas_entrada']):>8}  "
+                      f"{fmt(e['linhas_saida']):>8}  {e['chamadas_api']:>5}  {e['cache_api']:>5}")
+    return "\n".join(linhas)
+
+
+# ==========================================================
+# PERFIL POR GERAÇÃO (opt-in por variável de ambiente)
+# ==========================================================
+def _arquivo_perfil(nome, extensao):
+    pasta = Path(os.getenv("FEEGOW_PROFILE_DIR") or PASTA_PERFIS_PADRAO)
+    pasta.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r"[^\w-]+", "_", nome).strip("_")
+    return pasta / f"{slug}_{datetime.now():%Y%m%d_%H%M%S}_{os.getpid()}.{extensao}"
+
+
+def perfilado(prefixo):
+    """
+    Decorador dos geradores: com FEEGOW_PROFILE ativo, roda a geração sob cProfile
+    (ou pyinstrument) e grava o perfil; o caminho vai em resultado.metricas['perfil'].
+    """
+    def decorador(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            modo = (os.getenv("FEEGOW_PROFILE") or "").strip().lower()
+            if modo in ("", "0", "false", "no"):
+                return func(*args, **kwargs)
+
+            partes = [prefixo] + [str(a) for a in args[:2]] + [str(v) for v in kwargs.values() if isinstance(v, str)]
+            nome = "_".join(partes)
+
+            if modo == "pyinstrument":
+                try:
+                    from pyinstrument import Profiler
+                except ImportError:
+                    print("[PROFILE] pyinstrument não instalado; usando cProfile")
+                else:
+                    profiler = Profiler()
+                    profiler.start()
+                    try:
+                        resultado = func(*args, **kwargs)
+                    finally:
+                        profiler.stop()
+                        arquivo = _arquivo_perfil(nome, "html")
+                        arquivo.write_text(profiler.output_html(), encoding="utf-8")
+                        print(f"[PROFILE] {arquivo}")
+                    _anotar_perfil(resultado, arquivo)
+                    return resultado
+
+            profiler = cProfile.Profile()
+            try:
+                resultado = profiler.runcall(func, *args, **kwargs)
+            finally:
+                arquivo = _arquivo_perfil(nome, "prof")
+                profiler.dump_stats(str(arquivo))
+                print(f"[PROFILE] {arquivo} (python -m pstats {arquivo})")
+            _anotar_perfil(resultado, arquivo)
+            return resultado
+        return wrapper
+    return decorador
+
+
+def _anotar_perfil(resultado, arquivo):
+    metricas = getattr(resultado, "metricas", None)
+    if isinstance(metricas, dict):
+        metricas['perfil'] = str(arquivo)
@@ -0,0 +1,176 @@
+from datetime import date, time
+
+import numpy as np
+import pandas as pd
+
+# ==========================================================
+# TEMPO COMO INTEIROS (PARSE VETORIZADO ÚNICO)
+# ==========================================================
+# No pipeline de slots, horário e data viram inteiros UMA vez (segundos desde 00:00 em
+# int32, minutos em int16 e ordinal do dia em int32, -1 = não reconhecido); período e
+# mín/máx usam os minutos, bloqueios e o corte de "agora" usam os segundos (um horário
+# 08:15:30 continua 08:15:30), sem parse linha a linha.
+SEM_VALOR = -1
+ORDINAL_EPOCH = 719163  # date(1970, 1, 1).toordinal()
+MINUTO_MEIO_DIA = 12 * 60
+
+
+def segundos_do_dia(horarios):
+    """
+    Horários ('08:00', '08:00:00', '2025-12-01T08:00:00', '08h30', time, datetime)
+    → array int32 de segundos desde 00:00 (-1 se vazio/inválido).
+    """
+    serie = pd.Series(horarios).reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        dt = serie
+    else:
+        texto = serie.astype(str).str.strip()
+        dt = pd.to_datetime(texto, format="%H:%M:%S", errors="coerce")
+        faltam = dt.isna()
+        if faltam.any():
+            dt[faltam] = pd.to_datetime(texto[faltam], format="%H:%M", errors="coerce")
+    segundos = (dt.dt.hour * 3600 + dt.dt.minute * 60 + dt.dt.second).fillna(SEM_VALOR).astype(np.int32)
+
+    # Fora do padrão: HH:MM[:SS] dentro de um texto maior (datetime) ou '08h30'
+    resto = (segundos == SEM_VALOR) & serie.notna()
+    if resto.any():
+        texto_resto = serie[resto].astype(str)
+        partes = texto_resto.str.extract(r"(\d{1,2}):(\d{2})(?::(\d{2}))?")
+        sem_dois_pontos = partes[0].isna()
+        if sem_dois_pontos.any():
+            partes.loc[sem_dois_pontos, [0, 1]] = (
+                texto_resto[sem_dois_pontos].str.extract(r"(\d{1,2})\s*h\s*(\d{2})").to_numpy()
+            )
+        hh = pd.to_numeric(partes[0], errors="coerce")
+        mm = pd.to_numeric(partes[1], errors="coerce")
+        ss = pd.to_numeric(partes[2], errors="coerce").fillna(0)
+        ok = hh.between(0, 23) & mm.between(0, 59) & ss.between(0, 59)
+        segundos[resto] = np.where(ok, hh.fillna(0) * 3600 + mm.fillna(0) * 60 + ss, SEM_VALOR).astype(np.int32)
+
+    return segundos.to_numpy(dtype=np.int32)
+
+
+def minutos_por_segundo(segundos):
+    """Segundos do dia → minutos (int16), mantendo -1 para não reconhecido."""
+    segundos = np.asarray(segundos, dtype=np.int32)
+    return np.where(segundos >= 0, segundos // 60, SEM_VALOR).astype(np.int16)
+
+
+def minutos_do_dia(horarios):
+    """Como segundos_do_dia, em minutos (int16); os segundos são descartados."""
+    return minutos_por_segundo(segundos_do_dia(horarios))
+
+
+def ordinal_dia(datas):
+    """
+    Datas ('DD-MM-AAAA', 'AAAA-MM-DD', date, datetime) → array int32 com date.toordinal()
+    (-1 se vazia/inválida).
+    """
+    serie = pd.Series(datas).reset_index(drop=True)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        dt = serie
+    else:
+        texto = serie.astype(str).str.strip()
+        dt = pd.to_datetime(texto, format="%d-%m-%Y", errors="coerce")
+        for formato in ("%Y-%m-%d", None):
+            faltam = dt.isna() & serie.notna()
+            if not faltam.any():
+                break
+            if formato is None:  # último recurso (datetimes em texto etc.)
+                dt[faltam] = pd.to_datetime(texto[faltam], dayfirst=True, errors="coerce", format="mixed")
+            else:
+                dt[faltam] = pd.to_datetime(texto[faltam], format=formato, errors="coerce")
+    dias = dt.dt.normalize().to_numpy().astype("datetime64[D]").astype(np.int64) + ORDINAL_EPOCH
+    return np.where(dt.notna().to_numpy(), dias, SEM_VALOR).astype(np.int32)
+
+
+def periodo_por_minuto(minutos):
+    """'Manhã' até 12:00 (inclusive), 'Tarde' depois; None sem horário (mesma regra de periodo_from_time)."""
+    minutos = np.asarray(minutos)
+    return np.where(minutos < 0, None, np.where(minutos <= MINUTO_MEIO_DIA, "Manhã", "Tarde"))
+
+
+def time_por_segundo(segundos):
+    """Array de datetime.time (None para -1) a partir dos segundos, um objeto por valor distinto."""
+    valores, inverso = np.unique(np.asarray(segundos, dtype=np.int64), return_inverse=True)
+    tabela = np.empty(len(valores), dtype=object)
+    tabela[:] = [time(s // 3600, s // 60 % 60, s % 60) if s >= 0 else None for s in valores.tolist()]
+    return tabela[inverso.reshape(-1)]
+
+
+def datas_por_ordinal(ordinais):
+    """Série de datetime.date (NaT para -1) a partir dos ordinais, um objeto por valor distinto."""
+    valores, inverso = np.unique(np.asarray(ordinais, dtype=np.int64), return_inverse=True)
+    tabela = np.empty(len(valores), dtype=object)
+    tabela[:] = [date.fromordinal(o) if o >= 0 else pd.NaT for o in valores.tolist()]
+    return pd.Series(tabela[inverso.reshape(-1)], dtype=object)
+
+
+# Colunas já no tipo final ('data' date, 'horario' time, textos normalizados), coerentes
+# com 'dia_ord'/'segundo': ficam em df.attrs (que o pandas carrega em cópias e filtros) e
+# normalize_and_validate não as refaz.
+ATTR_TIPADAS = "colunas_tipadas"
+
+
+def colunas_tipadas(df):
+    """Colunas marcadas como já tipadas em df.attrs."""
+    return set(df.attrs.get(ATTR_TIPADAS, ()))
+
+
+def marcar_tipadas(df, colunas):
+    """Marca `colunas` como já tipadas (soma às que já estavam marcadas)."""
+    df.attrs[ATTR_TIPADAS] = tuple(sorted(colunas_tipadas(df) | set(colunas)))
+
+
+def adicionar_colunas_tempo(df):
+    """
+    Inclui 'dia_ord' (int32), 'segundo' (int32) e 'minuto' (int16) a partir de 'data'/'horario'
+    — o parse único do pipeline — e já converte 'data' para date e 'horario' para time
+    (NaT/None se não reconhecidos), marcando-as como tipadas para normalize_and_validate.
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    tipadas = []
+    if 'data' in df.columns:
+        df['dia_ord'] = ordinal_dia(df['data'])
+        df['data'] = datas_por_ordinal(df['dia_ord']).to_numpy()
+        tipadas.append('data')
+    else:
+        df['dia_ord'] = np.full(len(df), SEM_VALOR, dtype=np.int32)
+    if 'horario' in df.columns:
+        df['segundo'] = segundos_do_dia(df['horario'])
+        df['horario'] = time_por_segundo(df['segundo'])
+        tipadas.append('horario')
+    else:
+        df['segundo'] = np.full(len(df), SEM_VALOR, dtype=np.int32)
+    df['minuto'] = minutos_por_segundo(df['segundo'])
+    marcar_tipadas(df, tipadas)
+    return df
+
+
+def coluna_minuto(df):
+    """Minutos (int16) do df: coluna 'minuto' se já calculada, senão parse de 'horario'."""
+    if 'minuto' in df.columns:
+        return df['minuto'].to_numpy(dtype=np.int16)
+    return minutos_do_dia(df['horario'])
+
+
+def coluna_segundo(df):
+    """
+    Segundos (int32) do df: coluna 'segundo' se já calculada, senão parse de 'horario';
+    sem nenhum dos dois, a partir de 'minuto' (alinhado ao minuto).
+    """
+    if 'segundo' in df.columns:
+        return df['segundo'].to_numpy(dtype=np.int32)
+    if 'horario' in df.columns or 'minuto' not in df.columns:
+        return segundos_do_dia(df['horario'])
+    minutos = df['minuto'].to_numpy(dtype=np.int32)
+    return np.where(minutos >= 0, minutos * 60, SEM_VALOR).astype(np.int32)
+
+
+def coluna_dia_ord(df):
+    """Ordinais (int32) do df: coluna 'dia_ord' se já calculada, senão parse de 'data'."""
+    if 'dia_ord' in df.columns:
+        return df['dia_ord'].to_numpy(dtype=np.int32)
+    return ordinal_dia(df['data'])
@@ -1,9 +1,21 @@
-from datetime import datetime, timedelta, date, time
+from datetime import datetime, timedelta, time
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import atexit
+import multiprocessing as mp
+import os
+import pickle
+import threading
+from typing import NamedTuple
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from weasyprint import HTML
+import numpy as np
 import pandas as pd
 import re
 
+from core import relogio
+from core.time_columns import coluna_dia_ord, coluna_minuto, periodo_por_minuto
+
 # ---------------- tratamento de dados ----------------
 def format_cell(raw):
     if not raw or not isinstance(raw, str):
@@ -90,53 +102,91 @@ def sort_natural(values):
     """Ordenação natural de uma lista de valores."""
     return sorted(values, key=get_natural_key)
 
-def build_matrices(df, include_taxa=True):
-    df = df.copy()
-    df["data"] = pd.to_datetime(df["data"]).dt.date
-    df["time"] = df["horario"].apply(to_time)
-    df["periodo"] = df["time"].apply(periodo_from_time)
+class CellEntry(NamedTuple):
+    """Um profissional dentro de uma célula (sala × dia) do mapa."""
+    especialidade: str       # já em maiúsculas
+    nome: str
+    horario: str             # "HH:MM-HH:MM"
+    taxa: str = ""           # ocupação em % ("" no mapa semanal)
+    baixa: bool = False      # ocupação abaixo de 50%
+
+def render_cell(cell):
+    """HTML de uma célula: tupla de CellEntry (ou a string codificada antiga, via format_cell)."""
+    if isinstance(cell, str):
+        return format_cell(cell)
+    blocos = []
+    for e in cell:
+        bloco = f"<b>{e.especialidade}</b><br/>{e.nome}<br/><b>{e.horario}</b>"
+        if e.taxa:
+            bloco += f"<br/><span style='font-size: 0.9em; opacity: 0.9;'>Ocupação: {e.taxa}%</span>"
+        blocos.append(bloco)
+    return "<br/><br/>".join(blocos)
+
+def _hhmm(minutos):
+    m = pd.Series(minutos).astype(int)
+    return (m // 60).map("{:02d}".format) + ":" + (m % 60).map("{:02d}".format)
 
+def build_matrices(df, include_taxa=True):
+    """
+    Matrizes sala × dia por período (Manhã/Tarde). Cada célula é uma tupla de
+    CellEntry (vazia = sem atendimento), na ordem (especialidade, profissional).
+    Agregação e montagem são vetorizadas (groupby + unstack), sem iterrows.
+    """
     day_names = ["Segunda-feira", "Terça-feira", "Quarta-feira", "Quinta-feira", "Sexta-feira", "Sábado"]
-    df["dia_pt"] = df["data"].apply(lambda d: day_names[d.weekday()] if d.weekday() < 6 else "")
-    
+
+    minuto = coluna_minuto(df)
+    dia_ord = coluna_dia_ord(df)
+    weekday = np.where(dia_ord > 0, (dia_ord.astype(np.int64) - 1) % 7, -1)  # ordinal 1 = segunda-feira
+    base = pd.DataFrame({
+        "sala": df["sala"].to_numpy(),
+        "dia_pt": pd.Series(weekday).map(dict(enumerate(day_names))).to_numpy(),
+        "especialidade": df["especialidade"].to_numpy(),
+        "nome_profissional": df["nome_profissional"].to_numpy(),
+        "minuto": minuto,
+        "real": (pd.to_numeric(df["agendamento_id"], errors="coerce").fillna(0) > 0).astype(int).to_numpy(),
+        # Período: até 12:00 (inclusive) é Manhã; sem horário não entra em nenhum
+        "periodo": periodo_por_minuto(minuto),
+    })
+
     def montar_matriz(subdf, salas):
         if not salas: return None
-        mat = pd.DataFrame("", index=salas, columns=day_names)
         group_cols = ["sala", "dia_pt", "especialidade", "nome_profissional"]
-        
-        subdf_grouped = (
-            subdf.groupby(group_cols)
-                 .agg(
-                     start=("time", "min"), 
-                     end=("time", "max"),
-                     real_appts=("agendamento_id", lambda x: (x > 0).sum()),
-                     total_slots=("horario", "count")
-                 )
+
+        g = (
+            subdf[subdf["dia_pt"].notna()]
+                 .groupby(group_cols)
+                 .agg(start=("minuto", "min"), end=("minuto", "max"), real_appts=("real", "sum"), total_slots=("minuto", "size"))
                  .reset_index()
         )
 
-        for _, r in subdf_grouped.iterrows():
-            # Define o horário formatado
-            horario_str = f"{fmt_time(r['start'])}-{fmt_time(r['end'])}"
-            
+        if g.empty:
+            cells = pd.Series(dtype=object)
+        else:
+            horario = _hhmm(g["start"]) + "-" + _hhmm(g["end"])
+            esp = g["especialidade"].astype(str).str.strip().str.upper()
+            nome = g["nome_profissional"].astype(str).str.strip()
             if include_taxa:
-                # Lógica para o Mapa Diário (com taxa e flag de cor)
-                taxa_val = (r["real_appts"] / r["total_slots"] * 100) if r["total_slots"] > 0 else 0
-                taxa_str = f"{taxa_val:.0f}"
-                low_flag = "||LOW||" if taxa_val < 50 else ""
-                item = f"{r['especialidade']}||SEP||{r['nome_profissional']}||SEP||{horario_str}||SEP||{taxa_str}{low_flag}"
+                # Mapa Diário: taxa de ocupação e flag de ocupação baixa
+                taxa_val = np.where(g["total_slots"] > 0, g["real_appts"] / g["total_slots"].where(g["total_slots"] > 0, 1) * 100, 0)
+                taxas = [f"{v:.0f}" for v in taxa_val]
+                baixas = (taxa_val < 50).tolist()
             else:
-                # Lógica para o Mapa Semanal (limpo, sem taxa)
-                item = f"{r['especialidade']}||SEP||{r['nome_profissional']}||SEP||{horario_str}"
+                # Mapa Semanal: sem taxa
+                taxas = [""] * len(g)
+                baixas = [False] * len(g)
+            g["cell"] = [CellEntry(*campos) for campos in zip(esp, nome, horario, taxas, baixas)]
+            cells = g.groupby(["sala", "dia_pt"], sort=False)["cell"].agg(tuple)
 
-            prev = mat.at[r["sala"], r["dia_pt"]]
-            mat.at[r["sala"], r["dia_pt"]] = (prev + "||ITEM||" + item) if prev else item
-        return mat
+        mat = cells.unstack("dia_pt") if not cells.empty else pd.DataFrame()
+        mat = mat.reindex(index=salas, columns=day_names)
+        return mat.map(lambda c: c if isinstance(c, tuple) else ())
 
     # Separação Manhã/Tarde
+    manha = base[base["periodo"] == "Manhã"]
+    tarde = base[base["periodo"] == "Tarde"]
     matrices = {
-        "Manhã": montar_matriz(df[df["periodo"] == "Manhã"], sort_natural(df[df["periodo"] == "Manhã"]["sala"].unique())),
-        "Tarde": montar_matriz(df[df["periodo"] == "Tarde"], sort_natural(df[df["periodo"] == "Tarde"]["sala"].unique()))
+        "Manhã": montar_matriz(manha, sort_natural(manha["sala"].unique())),
+        "Tarde": montar_matriz(tarde, sort_natural(tarde["sala"].unique()))
     }
 
     occupancy = {"Manhã": [], "Tarde": []}
@@ -145,14 +195,41 @@ def build_matrices(df, include_taxa=True):
             occupancy[periodo] = [0]*6
             continue
         for dia in day_names:
-            filled = m[dia].apply(lambda v: isinstance(v, str) and v.strip() != "").sum()
+            filled = m[dia].map(len).gt(0).sum()
             occupancy[periodo].append(int(round((filled / len(m.index)) * 100)) if len(m.index) else 0)
 
     return matrices, occupancy, day_names
 
+# ---------------- carimbo de geração ----------------
+# Data/hora da geração, separada das entradas do template: fica fora da chave do
+# cache de PDFs. Os textos de rodapé levam os marcadores {timestamp} e {hora_corte},
+# preenchidos só na hora de montar o HTML.
+def carimbo_geracao(now=None):
+    now = now or relogio.agora()
+    return {
+        "generated": now.strftime("%d/%m/%Y %H:%M"),
+        "timestamp": now.strftime("%d/%m/%Y às %H:%M"),
+        "hora_corte": now.strftime("%H:%M"),
+    }
+
+def aplicar_carimbo(texto, carimbo):
+    if not texto:
+        return texto
+    return texto.replace("{timestamp}", carimbo["timestamp"]).replace("{hora_corte}", carimbo["hora_corte"])
+
+def _como_data(valor):
+    if isinstance(valor, str):
+        return datetime.strptime(valor, "%d-%m-%Y").date()
+    return valor
+
+def hora_corte_se_hoje(inicio, fim, carimbo):
+    """Hora de corte para a chave do cache de PDFs, só se o período [inicio, fim] contém hoje."""
+    if carimbo and _como_data(inicio) <= relogio.hoje() <= _como_data(fim):
+        return carimbo["hora_corte"]
+    return None
 
 # ---------------- render / salvar PDF ----------------
-def render_pdf_from_template(
+def render_html_from_template(
     unidade,
     matrices,
     occupancy,
@@ -160,60 +237,101 @@ def render_pdf_from_template(
     week_start_date,
     week_end_date,
     template_path,
-    out_pdf_path=None,
     cell_font_size_px=10,
-    return_bytes=False,
-    footer_text=""  # Já estava aqui, correto.
+    footer_text="",
+    carimbo=None
 ):
-    from jinja2 import Environment, FileSystemLoader, select_autoescape
-    from weasyprint import HTML
-    from datetime import datetime
-
+    """HTML do mapa semanal (etapa barata; o caro é o write_pdf)."""
+    carimbo = carimbo or carimbo_geracao()
     env = Environment(
         loader=FileSystemLoader('.'),
         autoescape=select_autoescape(['html','xml'])
     )
 
-    # registra format_cell tanto como filtro quanto como global
-    # (Assumindo que format_cell está importado ou definido no escopo deste arquivo)
-    # Se der erro de 'format_cell not defined', certifique-se de importá-lo no topo do arquivo.
-    if 'format_cell' in globals():
-        env.filters["format_cell"] = format_cell
-        env.globals["format_cell"] = format_cell
+    # registra render_cell/format_cell tanto como filtro quanto como global
+    env.filters["render_cell"] = render_cell
+    env.globals["render_cell"] = render_cell
+    env.filters["format_cell"] = format_cell
+    env.globals["format_cell"] = format_cell
 
     tpl = env.get_template(template_path)
 
     # datas
-    if isinstance(week_start_date, str):
-        start = datetime.strptime(week_start_date, "%d-%m-%Y").date()
-    else:
-        start = week_start_date
-
-    if isinstance(week_end_date, str):
-        end = datetime.strptime(week_end_date, "%d-%m-%Y").date()
-    else:
-        end = week_end_date
+    start = _como_data(week_start_date)
+    end = _como_data(week_end_date)
 
     week_label = f"{start.strftime('%d/%m/%Y')} a {end.strftime('%d/%m/%Y')}"
 
-    html = tpl.render(
+    return tpl.render(
         unidade=unidade,
         matrices=matrices,
         occupancy=occupancy,
         week_label=week_label,
-        generated=datetime.now().strftime("%d/%m/%Y %H:%M"),
+        generated=carimbo["generated"],
         day_names=day_names,
         cell_font_size_px=cell_font_size_px,
-        # Se format_cell não estiver no escopo global, remova a linha abaixo
-        format_cell=format_cell if 'format_cell' in globals() else None,
-        footer_text=footer_text  # <--- ADICIONE ESTA LINHA
+        format_cell=format_cell,
+        footer_text=aplicar_carimbo(footer_text, carimbo)
+    )
+
+def _contar_cache_pdf(metricas, acerto):
+    if metricas is not None:
+        chave = 'pdf_cache_hits' if acerto else 'pdf_cache_misses'
+        metricas[chave] = metricas.get(chave, 0) + 1
+
+def pdf_from_html(html, template_path=None, metricas=None, entradas=None, hora_corte=None):
+    """
+    PDF (bytes) do HTML, passando pelo cache endereçado pelo conteúdo (core.pdf_cache).
+    A chave sai de `entradas` (as do template, sem o carimbo de geração) e de `hora_corte`
+    (só quando o período contém hoje); sem `entradas`, do próprio HTML.
+    Conta acertos/erros em metricas['pdf_cache_hits'] / ['pdf_cache_misses'].
+    """
+    from core.api_client import get_pdf_cache
+    from core.pdf_cache import chave_pdf
+
+    cache = get_pdf_cache()
+    chave = None
+    if cache is not None:
+        chave = chave_pdf(template_path, html if entradas is None else entradas, hora_corte)
+    if cache is not None:
+        pdf = cache.get(chave)
+        _contar_cache_pdf(metricas, pdf is not None)
+        if pdf is not None:
+            return pdf
+
+    pdf = HTML(string=html).write_pdf()
+    if cache is not None:
+        cache.set(chave, pdf)
+    return pdf
+
+def render_pdf_from_template(
+    unidade,
+    matrices,
+    occupancy,
+    day_names,
+    week_start_date,
+    week_end_date,
+    template_path,
+    out_pdf_path=None,
+    cell_font_size_px=10,
+    return_bytes=False,
+    footer_text="",
+    metricas=None
+):
+    carimbo = carimbo_geracao()
+    entradas = dict(
+        unidade=unidade, matrices=matrices, occupancy=occupancy, day_names=day_names,
+        week_start_date=week_start_date, week_end_date=week_end_date, template_path=template_path,
+        cell_font_size_px=cell_font_size_px, footer_text=footer_text,
     )
+    html = render_html_from_template(**entradas, carimbo=carimbo)
+    pdf_bytes = pdf_from_html(html, template_path, metricas, entradas=entradas,
+                              hora_corte=hora_corte_se_hoje(week_start_date, week_end_date, carimbo))
 
     # ➖➖➖➖➖➖➖
     # Se quiser PDF em bytes (para o Streamlit)
     # ➖➖➖➖➖➖➖
     if return_bytes:
-        pdf_bytes = HTML(string=html).write_pdf()
         return pdf_bytes
 
     # ➖➖➖➖➖➖➖
@@ -222,10 +340,119 @@ def render_pdf_from_template(
     if out_pdf_path is None:
         raise ValueError("out_pdf_path é obrigatório quando return_bytes=False")
 
-    HTML(string=html).write_pdf(out_pdf_path)
+    with open(out_pdf_path, "wb") as f:
+        f.write(pdf_bytes)
     print(f"PDF salvo em: {out_pdf_path}")
     return out_pdf_path
 
+# ---------------- render em paralelo (pool de processos) ----------------
+# O write_pdf do WeasyPrint é CPU-bound e single-thread: com várias unidades, a
+# renderização em série domina o tempo. O HTML é montado aqui (barato, e é dele que
+# sai a chave do cache de PDFs); só os PDFs que faltam no cache vão para processos
+# filhos, que devolvem bytes. O pool é criado uma vez e reaproveitado.
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def _pdf_em_processo(html):
+    return HTML(string=html).write_pdf()
+
+def _get_render_pool(workers):
+    """
+    Pool compartilhado por todas as sessões do Streamlit. É dimensionado uma única vez
+    (pelo `workers` da primeira chamada, que vem da config ou do nº de CPUs) e nunca é
+    trocado enquanto está em uso: outra sessão pode estar submetendo a ele. Só um pool
+    quebrado (BrokenProcessPool) é substituído, e por _descartar_render_pool.
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # spawn: o processo pai (Streamlit) tem threads; fork nesse cenário não é seguro
+            _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"))
+        return _render_pool
+
+def _descartar_render_pool(pool=None):
+    """
+    Descarta o pool compartilhado. Com `pool`, só se ele ainda for o atual (outra sessão
+    pode já tê-lo trocado). Sem cancelar futuros: os das outras sessões seguem até o fim
+    ou falham sozinhos (e elas caem para o modo em série).
+    """
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None and (pool is None or pool is _render_pool):
+            _render_pool.shutdown(wait=False)
+            _render_pool = None
+
+def _encerrar_render_pool():
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is not None:
+            _render_pool.shutdown(wait=False, cancel_futures=True)
+            _render_pool = None
+
+atexit.register(_encerrar_render_pool)
+
+def render_pdfs(tarefas, max_workers=None, metricas=None):
+    """
+    Renderiza vários PDFs. `tarefas` é {chave: kwargs de render_html_from_template};
+    retorna {chave: pdf_bytes} na mesma ordem. O `carimbo` de cada tarefa fica fora
+    da chave do cache de PDFs (a hora de corte só conta se a semana contém hoje).
+    max_workers None = automático (até 4, limitado por CPUs e tarefas); 1 = em série.
+    Se o pool falhar (processo morto, erro de serialização), cai para o modo em série.
+    """
+    if not tarefas:
+        return {}
+
+    from core.api_client import get_pdf_cache
+    from core.pdf_cache import chave_pdf
+
+    cache = get_pdf_cache()
+    htmls = {chave: render_html_from_template(**kw) for chave, kw in tarefas.items()}
+    chaves_cache = {}
+    prontos = {}
+    for chave, html in htmls.items():
+        if cache is None:
+            continue
+        kw = tarefas[chave]
+        entradas = {k: v for k, v in kw.items() if k != "carimbo"}
+        hora_corte = hora_corte_se_hoje(kw["week_start_date"], kw["week_end_date"], kw.get("carimbo"))
+        chaves_cache[chave] = chave_pdf(kw.get("template_path"), entradas, hora_corte)
+        pdf = cache.get(chaves_cache[chave])
+        _contar_cache_pdf(metricas, pdf is not None)
+        if pdf is not None:
+            prontos[chave] = pdf
+
+    faltantes = [chave for chave in htmls if chave not in prontos]
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+    workers = min(int(max_workers), len(faltantes))
+
+    novos = None
+    if workers > 1:
+        pool = None
+        futuros = {}
+        try:
+            pool = _get_render_pool(int(max_workers))
+            for chave in faltantes:
+                futuros[chave] = pool.submit(_pdf_em_processo, htmls[chave])
+            novos = {chave: f.result() for chave, f in futuros.items()}
+        except (BrokenProcessPool, OSError, pickle.PicklingError, AttributeError, TypeError,
+                RuntimeError, CancelledError) as e:
+            print(f"[RENDER] pool de processos indisponível ({type(e).__name__}: {e}); renderizando em série")
+            # Cancela só os futuros desta chamada; o pool só é trocado se quebrou
+            for f in futuros.values():
+                f.cancel()
+            if isinstance(e, BrokenProcessPool):
+                _descartar_render_pool(pool)
+    if novos is None:
+        novos = {chave: _pdf_em_processo(htmls[chave]) for chave in faltantes}
+
+    if cache is not None:
+        for chave, pdf in novos.items():
+            cache.set(chaves_cache[chave], pdf)
+
+    prontos.update(novos)
+    return {chave: prontos[chave] for chave in tarefas}
+
 # ---------------- helper para input do usuário ----------------
 def ask_week_start():
     """Pede ao usuário a data de início no formato DD-MM-AAAA, valida e retorna date."""
@@ -2,13 +2,8 @@ import io
 import streamlit as st
 import pandas as pd
 from datetime import date, timedelta, datetime
-from core.api_client import (
-    fetch_agendamentos,
-    list_profissionals,
-    list_salas,
-    list_especialidades,
-    list_unidades
-)
+from core.api_client import fetch_agendamentos
+from core.registry import get_registry
 
 st.set_page_config(page_title="Agendamentos", page_icon="📅", layout="wide")
 
@@ -22,10 +17,11 @@ st.write("Use os filtros abaixo para consultar os agendamentos.")
 # ===============================================
 # IMPORTAÇÃO DADOS
 # ===============================================
-df_prof = list_profissionals()
-df_esp = list_especialidades()
-df_salas = list_salas()
-df_unid = list_unidades()
+reg = get_registry()
+df_prof = reg.df_prof
+df_esp = reg.df_esp
+df_salas = reg.df_loc
+df_unid = reg.df_unid
 
 # ===============================================
 # FILTROS
@@ -95,7 +91,7 @@ if data_fim < data_inicio:
 if st.button("🔍 Buscar agendamentos"):
     with st.spinner("Carregandos dados do Feegow..."):      
         if unidade_sel != 'Todas':
-            unidade_id = df_unid.loc[df_unid['nome_fantasia'] == unidade_sel, 'unidade_id'].iloc[0]
+            unidade_id = reg.unidade_id_por_nome[unidade_sel]
         else:
             unidade_id = None
 
@@ -126,17 +122,11 @@ if st.button("🔍 Buscar agendamentos"):
         if unidade_sel != "Todas":
             df = df[df['unidade_id'] == unidade_id]
 
-        # Junta nome do profissional
-        df = df.merge(df_prof[['profissional_id', 'nome']], on='profissional_id', how='left')
-        df.rename(columns={'nome': 'nome_profissional'}, inplace=True)
-        
-        # Junta especialidade
-        df = df.merge(df_esp[['especialidade_id', 'nome']], on='especialidade_id', how='left')
-        df.rename(columns={'nome': 'especialidade'}, inplace=True)
-
-        # Junta local (sala)
-        df = df.merge(df_salas[['id', 'local']], left_on='local_id', right_on='id', how='left')
-        df.rename(columns={'local': 'sala', 'nome_fantasia': 'unidade'}, inplace=True)
+        # Nomes de profissional, especialidade e sala (consultas O(1) no registro)
+        df['nome_profissional'] = df['profissional_id'].map(reg.prof_nome)
+        df['especialidade'] = df['especialidade_id'].map(reg.especialidade_nome)
+        df['sala'] = df['local_id'].map(reg.sala_nome)
+        df.rename(columns={'nome_fantasia': 'unidade'}, inplace=True)
 
         # Junta status
         df['status'] = df['status_id'].map(status)
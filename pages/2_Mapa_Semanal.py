@@ -1,9 +1,7 @@
 import streamlit as st
 from datetime import date, timedelta
 from core.gerar_mapas_wrapper import gerar_mapas_wrapper
-from core.api_client import (
-    list_unidades
-)
+from core.registry import get_registry
 
 if not st.session_state.get("logged_in", False):
     st.switch_page("Home.py")   # Redireciona para login
@@ -30,8 +28,7 @@ with col1:
     start_date = week_start.strftime("%d-%m-%Y")
 
 with col2:
-    df_unid = list_unidades()
-    unidades_opcoes = list(df_unid['nome_fantasia'])
+    unidades_opcoes = list(get_registry().unidade_id_por_nome)
     unidade_sel = st.selectbox("Gerar mapa para qual unidade?", unidades_opcoes)
 
 if not is_monday(week_start):
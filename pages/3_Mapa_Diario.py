@@ -1,7 +1,7 @@
 import streamlit as st
 from datetime import date
 from core.gerar_mapas_wrapper import gerar_mapas_wrapper
-from core.api_client import list_unidades
+from core.registry import get_registry
 
 # 1. Verificação de Login
 if not st.session_state.get("logged_in", False):
@@ -22,9 +22,8 @@ with col1:
     target_date_str = target_date_dt.strftime("%d-%m-%Y")
 
 with col2:
-    df_unid = list_unidades()
     # Removida a opção "Todas" conforme solicitado
-    unidades_opcoes = list(df_unid['nome_fantasia'])
+    unidades_opcoes = list(get_registry().unidade_id_por_nome)
     unidade_sel = st.selectbox("Unidade", unidades_opcoes)
 
 if target_date_dt == date.today():
@@ -6,13 +6,13 @@ import io
 
 from core.api_client import (
     fetch_agendamentos,
-    list_profissionals,
-    list_unidades,
-    list_especialidades,
     fetch_horarios_disponiveis,
+    fetch_horarios_disponiveis_lote,
     get_main_specialty_id,
     list_blocks
 )
+from core.schedule_templates import calcular_moda_intervalos
+from core.registry import get_registry
 
 st.set_page_config(page_title="Relatório de Intervalos", page_icon="⏱️", layout="wide")
 
@@ -25,64 +25,6 @@ Este relatório analisa a grade dos médicos para identificar o tempo de consult
 3.  **Resultado:** Exibe **TODOS** os profissionais cadastrados.
 """)
 
-# ==============================================================================
-# FUNÇÕES AUXILIARES DE CÁLCULO
-# ==============================================================================
-def calcular_moda_intervalos(df_dados):
-    """
-    Recebe um DataFrame com colunas 'profissional_id', 'especialidade_id', 'horario_full'
-    Retorna um dicionário com os resultados processados.
-    """
-    resultados_dict = {}
-    
-    # Unificação de Especialidades "Não Definidas"
-    df_valid_specs = df_dados[df_dados['especialidade_id'] > 0]
-    if not df_valid_specs.empty:
-        # Mapa: Médico -> Especialidade Mais Frequente
-        mapa_espec_dominante = df_valid_specs.groupby('profissional_id')['especialidade_id'].agg(
-            lambda x: x.mode()[0] if not x.mode().empty else 0
-        ).to_dict()
-        
-        # Aplica correção
-        def corrigir(row):
-            if row['especialidade_id'] > 0: return row['especialidade_id']
-            return mapa_espec_dominante.get(row['profissional_id'], 0)
-            
-        df_dados['especialidade_id'] = df_dados.apply(corrigir, axis=1)
-
-    # Agrupamento e Cálculo
-    grupos = df_dados.groupby(['profissional_id', 'especialidade_id'])
-    
-    for (pid, sid), group in grupos:
-        if pid == 0: continue
-        
-        # Remove horários duplicados e ordena
-        group = group.drop_duplicates(subset=['horario_full']).sort_values('horario_full')
-        
-        if len(group) < 2: continue
-            
-        # Diferença entre horários
-        group['diff'] = (group['horario_full'].shift(-1) - group['horario_full']).dt.total_seconds() / 60
-        
-        # Filtra intervalos válidos (5 a 120 min)
-        valid_diffs = group[(group['diff'] >= 5) & (group['diff'] <= 120)]['diff']
-        
-        if not valid_diffs.empty:
-            intervalo = valid_diffs.mode()[0]
-            confianca = (valid_diffs == intervalo).sum()
-            total = len(valid_diffs)
-            
-            # Chave única para o dicionário
-            key = (pid, sid)
-            resultados_dict[key] = {
-                'intervalo': int(intervalo),
-                'amostras': confianca,
-                'total_amostras': total,
-                'origem': 'Calculado'
-            }
-            
-    return resultados_dict
-
 # ==============================================================================
 # INTERFACE E FILTROS
 # ==============================================================================
@@ -93,11 +35,11 @@ with col1:
     dias_historico = 180 # Fixo ou configurável
 
 with col2:
-    df_unid = list_unidades()
-    opcoes_unid = ["Todas"] + list(df_unid['nome_fantasia'])
+    reg = get_registry()
+    opcoes_unid = ["Todas"] + list(reg.unidade_id_por_nome)
     unidade_sel = st.selectbox("Unidade", options=opcoes_unid)
 
-map_unidades = dict(zip(df_unid['nome_fantasia'], df_unid['unidade_id']))
+map_unidades = reg.unidade_id_por_nome
 
 if st.button("🚀 Gerar Relatório Completo"):
     
@@ -118,14 +60,11 @@ if st.button("🚀 Gerar Relatório Completo"):
     else:
         unidade_id_busca = 12 # Fallback
     
-    df_profs = list_profissionals()
-    df_esp = list_especialidades()
-    
-    map_prof = dict(zip(df_profs['profissional_id'], df_profs['nome']))
-    map_esp = dict(zip(df_esp['especialidade_id'], df_esp['nome']))
+    map_prof = reg.prof_nome
+    map_esp = reg.especialidade_nome
     
     # Lista Mestra de Todos os Profissionais (Meta: Preencher todos)
-    todos_profs_ids = set(df_profs['profissional_id'].unique())
+    todos_profs_ids = set(reg.profissional_ids)
     todos_profs_ids.discard(0) # Remove ID 0 se existir
     
     resultados_finais = {} # Chave: (pid, sid) -> Valor: dict dados
@@ -160,31 +99,43 @@ if st.button("🚀 Gerar Relatório Completo"):
             prog = st.progress(0)
             status = st.empty()
             
-            for i, pid in enumerate(profs_sem_agendamento):
-                prog.progress((i+1)/len(profs_sem_agendamento))
-                # status.text(f"Buscando grade: {map_prof.get(pid, pid)}") # Opcional: Descomente para debug visual
-                
+            pedidos = []
+            for pid in profs_sem_agendamento:
                 sid = get_main_specialty_id(pid)
                 if not sid: continue
                 sid = int(sid)
                 
-                try:
-                    df_vagas = fetch_horarios_disponiveis(
-                        unidade_id=unidade_id_busca, 
-                        data_start=start_future, 
-                        data_end=end_future, 
-                        profissional_id=pid, 
-                        especialidade_id=sid
-                    )
-                    if not df_vagas.empty:
-                         for _, row in df_vagas.iterrows():
-                            slots_futuros.append({
-                                'profissional_id': pid,
-                                'especialidade_id': sid,
-                                'horario_full': pd.to_datetime(f"{row['data']} {row['horario']}", dayfirst=True)
-                            })
-                            medicos_com_dados_futuros.add(pid)
-                except: pass
+                pedidos.append({
+                    'unidade_id': unidade_id_busca,
+                    'data_start': start_future,
+                    'data_end': end_future,
+                    'profissional_id': pid,
+                    'especialidade_id': sid,
+                    'extras': {'especialidade_id': sid},
+                })
+
+            # Busca em lote (paralelo); a barra avança conforme as respostas chegam
+            df_vagas = fetch_horarios_disponiveis_lote(
+                pedidos,
+                on_progress=lambda feitos, total: prog.progress(feitos / total)
+            )
+
+            if not df_vagas.empty:
+                # Linha com data/horário malformado vira NaT e é descartada (antes o try/except
+                # por médico isolava a falha; agora ela não derruba o lote inteiro)
+                horarios = pd.to_datetime(df_vagas['data'].astype(str) + ' ' + df_vagas['horario'].astype(str), format='mixed', dayfirst=True, errors='coerce')
+                validos = horarios.notna()
+                if not validos.all():
+                    st.warning(f"{int((~validos).sum())} horário(s) com data/hora inválida foram ignorados.")
+                df_vagas = df_vagas[validos]
+                horarios = horarios[validos]
+                for pid, sid, horario_full in zip(df_vagas['profissional_id'], df_vagas['especialidade_id'], horarios):
+                    slots_futuros.append({
+                        'profissional_id': int(pid),
+                        'especialidade_id': int(sid),
+                        'horario_full': horario_full
+                    })
+                    medicos_com_dados_futuros.add(int(pid))
             
             prog.empty()
             status.empty()
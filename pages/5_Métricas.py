@@ -0,0 +1,117 @@
+import json
+
+import pandas as pd
+import streamlit as st
+
+from core.api_client import (
+    get_disk_cache,
+    get_pdf_cache,
+    get_rate_limiter,
+    get_roster,
+    single_flight_stats
+)
+from core.metrics import config_exportacao, get_api_metrics
+
+if not st.session_state.get("logged_in", False):
+    st.switch_page("Home.py")   # Redireciona para login
+    st.stop()
+
+st.set_page_config(page_title="Métricas da API", page_icon="📊", layout="wide")
+
+# Papel vindo de core.auth.authenticate (gravado no login)
+if st.session_state.get("role") != "admin":
+    st.error("Acesso restrito a administradores.")
+    st.stop()
+
+st.title("📊 Métricas da API Feegow")
+st.write("Contadores deste processo (todas as sessões) desde o início ou o último reset.")
+
+metricas = get_api_metrics()
+snap = metricas.snapshot()
+
+# ================================================
+# Resumo por endpoint
+# ================================================
+linhas = []
+for nome, ep in sorted(snap["endpoints"].items()):
+    linhas.append({
+        "Endpoint": nome,
+        "Chamadas": ep["chamadas"],
+        "Erros": ep["erros"],
+        "Repetições": ep["repeticoes"],
+        "Latência média (s)": round(ep["latencia_media_s"], 3),
+        "p50 ≤ (s)": ep["latencia_p50_s"],
+        "p95 ≤ (s)": ep["latencia_p95_s"],
+        "Máx (s)": round(ep["latencia_max_s"], 3),
+        "KB recebidos": round(ep["bytes"] / 1024, 1),
+        "Cache hits": ep["cache_hits"],
+        "Cache misses": ep["cache_misses"],
+        "Acerto cache": f"{ep['cache_taxa_acerto']:.0%}",
+        "Coalescidas": ep["coalescidas"],
+    })
+
+if not linhas:
+    st.info("Nenhuma chamada registrada ainda neste processo.")
+else:
+    st.subheader("Por endpoint")
+    st.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.subheader("Status HTTP")
+        status = pd.DataFrame(
+            [{"Endpoint": nome, "Status": s, "Respostas": n}
+             for nome, ep in snap["endpoints"].items() for s, n in ep["status"].items()]
+        )
+        st.dataframe(status.pivot_table(index="Endpoint", columns="Status", values="Respostas", fill_value=0),
+                     use_container_width=True)
+    with col2:
+        st.subheader("Histograma de latência")
+        ep_sel = st.selectbox("Endpoint", sorted(snap["endpoints"]))
+        rotulos = [f"≤ {b:g}s" for b in snap["buckets_latencia_s"]] + ["> último"]
+        hist = pd.DataFrame({"Faixa": rotulos, "Chamadas": snap["endpoints"][ep_sel]["latencia_buckets"]})
+        st.bar_chart(hist.set_index("Faixa"))
+
+# ================================================
+# Limitador, single-flight e caches
+# ================================================
+st.subheader("Limitador, coalescência e caches")
+col1, col2 = st.columns(2)
+with col1:
+    limiter = get_rate_limiter()
+    st.write("**Limitador de requisições**")
+    st.json(limiter.stats() if limiter is not None else {"ativo": False})
+    st.write("**Single-flight**")
+    st.json(single_flight_stats())
+with col2:
+    disk_cache = get_disk_cache()
+    st.write("**Cache em disco (respostas)**")
+    st.json(disk_cache.stats() if disk_cache is not None else {"ativo": False})
+    pdf_cache = get_pdf_cache()
+    st.write("**Cache de PDFs**")
+    st.json(pdf_cache.stats() if pdf_cache is not None else {"ativo": False})
+    roster = get_roster()
+    st.write("**Elenco por unidade (profissionais)**")
+    st.json(roster.stats() if roster is not None else {"ativo": False})
+
+# ================================================
+# Exportação
+# ================================================
+st.subheader("Exportação")
+pasta, intervalo = config_exportacao()
+st.caption(f"Exportação automática: {pasta or 'desativada'}" + (f" (a cada {intervalo:.0f}s)" if pasta else ""))
+
+col1, col2, col3, col4 = st.columns(4)
+with col1:
+    st.download_button("⬇️ JSON", json.dumps(snap, ensure_ascii=False, indent=2, default=str),
+                       file_name="api_metrics.json", mime="application/json")
+with col2:
+    st.download_button("⬇️ Prometheus", metricas.para_prometheus(snap),
+                       file_name="api_metrics.prom", mime="text/plain")
+with col3:
+    if pasta and st.button("💾 Exportar agora"):
+        st.success("Gravado: " + ", ".join(str(p) for p in metricas.exportar(pasta)))
+with col4:
+    if st.button("🔄 Zerar contadores"):
+        metricas.limpar()
+        st.rerun()